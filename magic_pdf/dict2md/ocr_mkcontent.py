@@ -4,7 +4,7 @@ import wordninja
 from loguru import logger
 
 from magic_pdf.libs.commons import join_path
-from magic_pdf.libs.language import detect_lang
+from magic_pdf.libs.language import detect_line_lang
 from magic_pdf.libs.MakeContentConfig import DropMode, MakeMode
 from magic_pdf.libs.markdown_utils import ocr_escape_special_markdown_char
 from magic_pdf.libs.ocr_content_type import BlockType, ContentType
@@ -87,7 +87,7 @@ def ocr_mk_markdown_with_para_core(paras_of_layout, mode, img_buket_path=''):
                     language = ''
                     if span_type == ContentType.Text:
                         content = span['content']
-                        language = detect_lang(content)
+                        language = detect_line_lang(content)
                         if (language == 'en'):  # 只对英文长词进行分词处理，中文分词会丢失文本
                             content = ocr_escape_special_markdown_char(
                                 split_long_words(content))
@@ -197,7 +197,7 @@ def merge_para_with_text(para_block):
             if span_type == ContentType.Text:
                 line_text += span['content'].strip()
         if line_text != '':
-            line_lang = detect_lang(line_text)
+            line_lang = detect_line_lang(line_text)
         for span in line['spans']:
             span_type = span['type']
             content = ''
@@ -244,7 +244,7 @@ def para_to_standard_format(para, img_buket_path):
                 content = ''
                 if span_type == ContentType.Text:
                     content = span['content']
-                    language = detect_lang(content)
+                    language = detect_line_lang(content)
                     if language == 'en':  # 只对英文长词进行分词处理，中文分词会丢失文本
                         content = ocr_escape_special_markdown_char(
                             split_long_words(content))
@@ -391,11 +391,8 @@ def ocr_mk_mm_standard_format(pdf_info_dict: list):
     return content_list
 
 
-def union_make(pdf_info_dict: list,
-               make_mode: str,
-               drop_mode: str,
-               img_buket_path: str = ''):
-    output_content = []
+def __iter_pages_to_make(pdf_info_dict: list, drop_mode: str):
+    """按drop_mode过滤页面，返回需要输出内容的页面的(paras_of_layout, page_idx)"""
     for page_info in pdf_info_dict:
         if page_info.get('need_drop', False):
             drop_reason = page_info.get('drop_reason')
@@ -415,13 +412,27 @@ def union_make(pdf_info_dict: list,
         page_idx = page_info.get('page_idx')
         if not paras_of_layout:
             continue
-        if make_mode == MakeMode.MM_MD:
-            page_markdown = ocr_mk_markdown_with_para_core_v2(
-                paras_of_layout, 'mm', img_buket_path)
-            output_content.extend(page_markdown)
-        elif make_mode == MakeMode.NLP_MD:
-            page_markdown = ocr_mk_markdown_with_para_core_v2(
-                paras_of_layout, 'nlp')
+        yield paras_of_layout, page_idx
+
+
+def __page_markdown(paras_of_layout, md_make_mode: str, img_buket_path: str):
+    if md_make_mode == MakeMode.MM_MD:
+        return ocr_mk_markdown_with_para_core_v2(
+            paras_of_layout, 'mm', img_buket_path)
+    elif md_make_mode == MakeMode.NLP_MD:
+        return ocr_mk_markdown_with_para_core_v2(
+            paras_of_layout, 'nlp')
+    return []
+
+
+def union_make(pdf_info_dict: list,
+               make_mode: str,
+               drop_mode: str,
+               img_buket_path: str = ''):
+    output_content = []
+    for paras_of_layout, page_idx in __iter_pages_to_make(pdf_info_dict, drop_mode):
+        if make_mode in [MakeMode.MM_MD, MakeMode.NLP_MD]:
+            page_markdown = __page_markdown(paras_of_layout, make_mode, img_buket_path)
             output_content.extend(page_markdown)
         elif make_mode == MakeMode.STANDARD_FORMAT:
             for para_block in paras_of_layout:
@@ -432,3 +443,20 @@ def union_make(pdf_info_dict: list,
         return '\n\n'.join(output_content)
     elif make_mode == MakeMode.STANDARD_FORMAT:
         return output_content
+
+
+def union_make_markdown_and_content_list(pdf_info_dict: list,
+                                         md_make_mode: str,
+                                         drop_mode: str,
+                                         img_buket_path: str = ''):
+    """
+    一次遍历同时生成markdown和content_list，结果与分别用md_make_mode和MakeMode.STANDARD_FORMAT调用union_make一致
+    """
+    markdown_content = []
+    content_list = []
+    for paras_of_layout, page_idx in __iter_pages_to_make(pdf_info_dict, drop_mode):
+        markdown_content.extend(__page_markdown(paras_of_layout, md_make_mode, img_buket_path))
+        for para_block in paras_of_layout:
+            content_list.append(para_to_standard_format_v2(
+                para_block, img_buket_path, page_idx))
+    return '\n\n'.join(markdown_content), content_list
@@ -13,6 +13,7 @@ from collections import Counter
 from magic_pdf.libs.drop_reason import DropReason
 from magic_pdf.libs.language import detect_lang
 from magic_pdf.libs.pdf_check import detect_invalid_chars
+from magic_pdf.libs.pdf_textpage import TextPageCache
 
 scan_max_page = 50
 junk_limit_min = 10
@@ -144,7 +145,9 @@ def get_pdf_page_size_pts(doc: fitz.Document):
     return median_width, median_height
 
 
-def get_pdf_textlen_per_page(doc: fitz.Document):
+def get_pdf_textlen_per_page(doc: fitz.Document, text_pages: TextPageCache = None):
+    if text_pages is None:
+        text_pages = TextPageCache()
     text_len_lst = []
     for page in doc:
         # 拿包含img和text的所有blocks
@@ -153,7 +156,7 @@ def get_pdf_textlen_per_page(doc: fitz.Document):
         # text_block = page.get_text("words")
         # text_block_len = sum([len(t[4]) for t in text_block])
         #拿所有text的str
-        text_block = page.get_text("text")
+        text_block = text_pages.get_text(page, "text")
         text_block_len = len(text_block)
         # logger.info(f"page {page.number} text_block_len: {text_block_len}")
         text_len_lst.append(text_block_len)
@@ -161,17 +164,20 @@ def get_pdf_textlen_per_page(doc: fitz.Document):
     return text_len_lst
 
 
-def get_pdf_text_layout_per_page(doc: fitz.Document):
+def get_pdf_text_layout_per_page(doc: fitz.Document, text_pages: TextPageCache = None):
     """
     根据PDF文档的每一页文本布局，判断该页的文本布局是横向、纵向还是未知。
 
     Args:
         doc (fitz.Document): PDF文档对象。
+        text_pages (TextPageCache): 可选，与其他扫描函数共用的TextPage缓存。
 
     Returns:
         List[str]: 每一页的文本布局（横向、纵向、未知）。
 
     """
+    if text_pages is None:
+        text_pages = TextPageCache()
     text_layout_list = []
 
     for page_id, page in enumerate(doc):
@@ -180,7 +186,8 @@ def get_pdf_text_layout_per_page(doc: fitz.Document):
         # 创建每一页的纵向和横向的文本行数计数器
         vertical_count = 0
         horizontal_count = 0
-        text_dict = page.get_text("dict")
+        # 只统计文本行，不需要图片块
+        text_dict = text_pages.get_text(page, "dict")
         if "blocks" in text_dict:
             for block in text_dict["blocks"]:
                 if 'lines' in block:
@@ -272,7 +279,7 @@ def get_imgs_per_page(doc: fitz.Document):
     return imgs_len_list
 
 
-def get_language(doc: fitz.Document):
+def get_language(doc: fitz.Document, text_pages: TextPageCache = None):
     """
     获取PDF文档的语言。
     Args:
@@ -280,12 +287,14 @@ def get_language(doc: fitz.Document):
     Returns:
         str: 文档语言，如 "en-US"。
     """
+    if text_pages is None:
+        text_pages = TextPageCache()
     language_lst = []
     for page_id, page in enumerate(doc):
         if page_id >= scan_max_page:
             break
         # 拿所有text的str
-        text_block = page.get_text("text")
+        text_block = text_pages.get_text(page, "text")
         page_language = detect_lang(text_block)
         language_lst.append(page_language)
 
@@ -330,11 +339,13 @@ def pdf_meta_scan(pdf_bytes: bytes):
 
         image_info_per_page, junk_img_bojids = get_image_info(doc, page_width_pts, page_height_pts)
         # logger.info(f"image_info_per_page: {image_info_per_page}, junk_img_bojids: {junk_img_bojids}")
-        text_len_per_page = get_pdf_textlen_per_page(doc)
+        # 前scan_max_page页的文本层会被下面几个函数反复读取，共用同一份TextPage
+        text_pages = TextPageCache(max_cached_pages=scan_max_page)
+        text_len_per_page = get_pdf_textlen_per_page(doc, text_pages)
         # logger.info(f"text_len_per_page: {text_len_per_page}")
-        text_layout_per_page = get_pdf_text_layout_per_page(doc)
+        text_layout_per_page = get_pdf_text_layout_per_page(doc, text_pages)
         # logger.info(f"text_layout_per_page: {text_layout_per_page}")
-        text_language = get_language(doc)
+        text_language = get_language(doc, text_pages)
         # logger.info(f"text_language: {text_language}")
         invalid_chars = check_invalid_chars(pdf_bytes)
         # logger.info(f"invalid_chars: {invalid_chars}")
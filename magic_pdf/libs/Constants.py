@@ -16,6 +16,9 @@ STRUCT_EQTABLE = "struct_eqtable"
 # table recognition max time default value
 TABLE_MAX_TIME_VALUE = 400
 
+# 表格识别超过 max_time 被中止，写入 layout_res 和 table span，表格只保留截图
+TABLE_TIMEOUT = "table_timeout"
+
 # pp_table_result_max_length
 TABLE_MAX_LEN = 480
 
@@ -0,0 +1,135 @@
+"""boxbase 中几何函数的批量(numpy)版本.
+
+batch_* 函数的输入为 N 个和 M 个 bbox(list 或 Nx4 数组，格式为 [x0, y0, x1, y1])，输出为 NxM 的矩阵，
+矩阵中 [i, j] 位置的值与对 bboxes1[i]、bboxes2[j] 调用对应的标量函数的结果一致。
+paired_* 函数的输入为两组等长的 bbox，输出长度为 N 的数组，第 i 个值对应 bboxes1[i] 和 bboxes2[i]。
+"""
+import numpy as np
+
+
+def bboxes_to_array(bboxes) -> np.ndarray:
+    """把 bbox 列表转换成 Nx4 的 float64 数组，空列表返回 0x4 数组."""
+    return np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+
+
+def _area(boxes):
+    return (boxes[..., 2] - boxes[..., 0]) * (boxes[..., 3] - boxes[..., 1])
+
+
+def _intersection(boxes1, boxes2):
+    x_left = np.maximum(boxes1[..., 0], boxes2[..., 0])
+    y_top = np.maximum(boxes1[..., 1], boxes2[..., 1])
+    x_right = np.minimum(boxes1[..., 2], boxes2[..., 2])
+    y_bottom = np.minimum(boxes1[..., 3], boxes2[..., 3])
+    width = x_right - x_left
+    height = y_bottom - y_top
+    no_overlap = (width < 0) | (height < 0)
+    intersection_area = np.where(no_overlap, 0.0, width * height)
+    return intersection_area, no_overlap
+
+
+def _safe_divide(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = numerator / denominator
+    return np.where(denominator == 0, 0.0, ratio)
+
+
+def _iou(boxes1, boxes2):
+    intersection_area, no_overlap = _intersection(boxes1, boxes2)
+    union_area = _area(boxes1) + _area(boxes2) - intersection_area
+    iou = _safe_divide(intersection_area, union_area)
+    return np.where(no_overlap, 0.0, iou)
+
+
+def _overlap_area_in_bbox1_area_ratio(boxes1, boxes2):
+    intersection_area, no_overlap = _intersection(boxes1, boxes2)
+    area1 = np.broadcast_to(_area(boxes1), intersection_area.shape)
+    ratio = _safe_divide(intersection_area, area1)
+    return np.where(no_overlap, 0.0, ratio)
+
+
+def _overlap_area_2_minbox_area_ratio(boxes1, boxes2):
+    intersection_area, no_overlap = _intersection(boxes1, boxes2)
+    min_box_area = np.minimum(_area(boxes1), _area(boxes2))
+    ratio = _safe_divide(intersection_area, min_box_area)
+    return np.where(no_overlap, 0.0, ratio)
+
+
+def _minbox_if_overlap_by_ratio(boxes1, boxes2, ratio):
+    overlap_mask = _overlap_area_2_minbox_area_ratio(boxes1, boxes2) > ratio
+    bbox1_is_min = _area(boxes1) <= _area(boxes2)
+    return overlap_mask, bbox1_is_min
+
+
+def _is_in(boxes1, boxes2):
+    return ((boxes1[..., 0] >= boxes2[..., 0]) &
+            (boxes1[..., 1] >= boxes2[..., 1]) &
+            (boxes1[..., 2] <= boxes2[..., 2]) &
+            (boxes1[..., 3] <= boxes2[..., 3]))
+
+
+def _as_matrix_operands(bboxes1, bboxes2):
+    return bboxes_to_array(bboxes1)[:, None, :], bboxes_to_array(bboxes2)[None, :, :]
+
+
+def _as_paired_operands(bboxes1, bboxes2):
+    boxes1 = bboxes_to_array(bboxes1)
+    boxes2 = bboxes_to_array(bboxes2)
+    assert len(boxes1) == len(boxes2), 'paired bboxes must have the same length'
+    return boxes1, boxes2
+
+
+def batch_box_area(bboxes) -> np.ndarray:
+    """对应 box_area."""
+    return _area(bboxes_to_array(bboxes))
+
+
+def batch_overlap_area(bboxes1, bboxes2) -> np.ndarray:
+    """对应 get_overlap_area，返回 NxM 的重叠面积矩阵."""
+    intersection_area, _ = _intersection(*_as_matrix_operands(bboxes1, bboxes2))
+    return intersection_area
+
+
+def batch_iou(bboxes1, bboxes2) -> np.ndarray:
+    """对应 calculate_iou，返回 NxM 的 IOU 矩阵."""
+    return _iou(*_as_matrix_operands(bboxes1, bboxes2))
+
+
+def batch_overlap_area_in_bbox1_area_ratio(bboxes1, bboxes2) -> np.ndarray:
+    """对应 calculate_overlap_area_in_bbox1_area_ratio，返回 NxM 的重叠面积占 bboxes1[i] 面积的比例."""
+    return _overlap_area_in_bbox1_area_ratio(*_as_matrix_operands(bboxes1, bboxes2))
+
+
+def batch_overlap_area_2_minbox_area_ratio(bboxes1, bboxes2) -> np.ndarray:
+    """对应 calculate_overlap_area_2_minbox_area_ratio，返回 NxM 的重叠面积占较小 bbox 面积的比例."""
+    return _overlap_area_2_minbox_area_ratio(*_as_matrix_operands(bboxes1, bboxes2))
+
+
+def batch_minbox_if_overlap_by_ratio(bboxes1, bboxes2, ratio):
+    """对应 get_minbox_if_overlap_by_ratio.
+
+    Returns:
+        overlap_mask: NxM bool 矩阵，重叠面积占较小 bbox 面积的比例大于 ratio 的位置为 True
+        bbox1_is_min: NxM bool 矩阵，为 True 时标量函数返回 bboxes1[i]，否则返回 bboxes2[j]
+    """
+    return _minbox_if_overlap_by_ratio(*_as_matrix_operands(bboxes1, bboxes2), ratio)
+
+
+def batch_is_in(bboxes1, bboxes2) -> np.ndarray:
+    """对应 _is_in，返回 NxM 的 bool 矩阵，bboxes1[i] 完全在 bboxes2[j] 里面时为 True."""
+    return _is_in(*_as_matrix_operands(bboxes1, bboxes2))
+
+
+def paired_iou(bboxes1, bboxes2) -> np.ndarray:
+    """对应 calculate_iou，逐对计算."""
+    return _iou(*_as_paired_operands(bboxes1, bboxes2))
+
+
+def paired_overlap_area_in_bbox1_area_ratio(bboxes1, bboxes2) -> np.ndarray:
+    """对应 calculate_overlap_area_in_bbox1_area_ratio，逐对计算."""
+    return _overlap_area_in_bbox1_area_ratio(*_as_paired_operands(bboxes1, bboxes2))
+
+
+def paired_minbox_if_overlap_by_ratio(bboxes1, bboxes2, ratio):
+    """对应 get_minbox_if_overlap_by_ratio，逐对计算，返回值含义同 batch_minbox_if_overlap_by_ratio."""
+    return _minbox_if_overlap_by_ratio(*_as_paired_operands(bboxes1, bboxes2), ratio)
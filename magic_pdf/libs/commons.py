@@ -2,6 +2,7 @@ import datetime
 import json
 import os, re, configparser
 import subprocess
+import threading
 import time
 
 import boto3
@@ -12,6 +13,10 @@ from botocore.config import Config
 import fitz # 1.23.9中已经切换到rebase
 # import fitz_old as fitz  # 使用1.23.9之前的pymupdf库
 
+# PyMuPDF不是线程安全的，不同的Document也共享MuPDF的全局context，
+# 多个线程同时使用fitz时(如流水线模式下后台线程渲染、主线程解析)，每次调用都要持有这把锁
+fitz_lock = threading.RLock()
+
 
 def get_delta_time(input_time):
     return round(time.time() - input_time, 2)
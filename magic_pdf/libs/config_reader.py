@@ -82,10 +82,69 @@ def get_table_recog_config():
     table_config = config.get("table-config")
     if table_config is None:
         logger.warning(f"'table-config' not found in {CONFIG_FILE_NAME}, use 'False' as default")
-        return json.loads('{"is_table_recog_enable": false, "max_time": 400}')
+        return json.loads('{"is_table_recog_enable": false, "max_time": 400, "enforce_max_time": true, '
+                          '"batch_size": 1}')
     else:
         return table_config
 
 
+def get_ocr_config():
+    config = read_config()
+    ocr_config = config.get("ocr-config")
+    if ocr_config is None:
+        logger.warning(f"'ocr-config' not found in {CONFIG_FILE_NAME}, use 'page_batch_rec: false, page_det: false, "
+                       f"tesseract_workers: 0, torrone_batch_size: 10' as default")
+        return json.loads('{"page_batch_rec": false, "page_det": false, "tesseract_workers": 0, '
+                          '"torrone_batch_size": 10}')
+    else:
+        return ocr_config
+
+
+def get_render_config():
+    config = read_config()
+    render_config = config.get("render-config")
+    if render_config is None:
+        logger.warning(f"'render-config' not found in {CONFIG_FILE_NAME}, "
+                       f"use 'prefetch_pages: 2, buffer_pool_size: 0, render_workers: 0' as default")
+        return json.loads('{"prefetch_pages": 2, "buffer_pool_size": 0, "render_workers": 0}')
+    else:
+        return render_config
+
+
+def get_analyze_config():
+    config = read_config()
+    analyze_config = config.get("analyze-config")
+    if analyze_config is None:
+        logger.warning(f"'analyze-config' not found in {CONFIG_FILE_NAME}, use 'batch_size: 1' as default")
+        return json.loads('{"batch_size": 1}')
+    else:
+        return analyze_config
+
+
+def get_mfr_cache_config():
+    config = read_config()
+    mfr_cache_config = config.get("mfr-cache-config")
+    if mfr_cache_config is None:
+        logger.warning(f"'mfr-cache-config' not found in {CONFIG_FILE_NAME}, use 'max_items: 10000' as default")
+        return json.loads('{"max_items": 10000, "cache_dir": ""}')
+    else:
+        return mfr_cache_config
+
+
+def get_parse_config():
+    try:
+        config = read_config()
+    except FileNotFoundError:
+        # 只用已有的模型结果做解析时不要求有配置文件
+        config = {}
+    parse_config = config.get("parse-config")
+    if parse_config is None:
+        logger.warning(f"'parse-config' not found in {CONFIG_FILE_NAME}, "
+                       f"use 'parse_workers: 0, pipeline: false' as default")
+        return json.loads('{"parse_workers": 0, "pipeline": false}')
+    else:
+        return parse_config
+
+
 if __name__ == "__main__":
     ak, sk, endpoint = get_s3_config("llm-raw")
@@ -1,7 +1,8 @@
 def get_scale_ratio(model_page_info, page):
-    pix = page.get_pixmap(dpi=72)
-    pymu_width = int(pix.w)
-    pymu_height = int(pix.h)
+    # 72dpi下渲染出的pixmap尺寸就是页面rect取整后的尺寸，不需要真的渲染一次页面
+    page_irect = page.rect.irect
+    pymu_width = int(page_irect.width)
+    pymu_height = int(page_irect.height)
     width_from_json = model_page_info['page_info']['width']
     height_from_json = model_page_info['page_info']['height']
     horizontal_scale_ratio = width_from_json / pymu_width
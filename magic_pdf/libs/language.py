@@ -1,5 +1,6 @@
 import os
 import unicodedata
+from functools import lru_cache
 
 if not os.getenv("FTLANG_CACHE"):
     current_file_path = os.path.abspath(__file__)
@@ -28,6 +29,19 @@ def detect_lang(text: str) -> str:
     return lang
 
 
+# 一篇500页的文档大约有几万行，缓存要能放下整篇文档的行，
+# markdown、content_list、rag等对同一文档的多次遍历才能都命中
+LINE_LANG_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=LINE_LANG_CACHE_SIZE)
+def detect_line_lang(text: str) -> str:
+    """
+    带缓存的detect_lang，用于逐行判断语言的场景。同一行文本在一个文档中会被多次判断，结果只算一次
+    """
+    return detect_lang(text)
+
+
 if __name__ == '__main__':
     print(os.getenv("FTLANG_CACHE"))
     print(detect_lang("This is a test."))
@@ -0,0 +1,25 @@
+from magic_pdf.libs.commons import fitz
+
+
+class TextPageCache:
+    """按页缓存同一个文档的 fitz.TextPage，同一页多次取文本(text/dict/rawdict)时文本层只分析一次.
+
+    只缓存页码小于 max_cached_pages 的页面，避免长文档把所有页面的文本层都留在内存里。
+    """
+
+    def __init__(self, flags=fitz.TEXTFLAGS_TEXT, max_cached_pages=None):
+        self.__flags = flags
+        self.__max_cached_pages = max_cached_pages
+        self.__text_pages = {}
+
+    def get_text(self, page: fitz.Page, option="text"):
+        """等价于 page.get_text(option, flags=flags)."""
+        # TextPage 只能交给创建它的那个 Page 对象使用(且只弱引用它)，遍历文档时每次拿到的 Page 对象并不相同，
+        # 所以把创建 TextPage 的 Page 对象一起缓存下来
+        cached = self.__text_pages.get(page.number)
+        if cached is None:
+            cached = (page, page.get_textpage(flags=self.__flags))
+            if self.__max_cached_pages is None or page.number < self.__max_cached_pages:
+                self.__text_pages[page.number] = cached
+        owner_page, text_page = cached
+        return owner_page.get_text(option, textpage=text_page)
@@ -0,0 +1,62 @@
+import queue
+import threading
+
+_SENTINEL = object()
+
+
+def prefetch_iter(iterable, depth: int = 2):
+    """在后台线程中提前消费 iterable，最多缓存 depth 个元素.
+
+    用于让生产者(如页面渲染)和消费者(如模型推理)并行执行，同时把内存占用限制在 O(depth)。
+    depth <= 0 时不启动线程，直接按顺序迭代。生产者抛出的异常会在消费端原样抛出。
+    消费端提前退出(或关闭本生成器)时等生产者线程结束后关闭 iterable，上游生成器的清理逻辑立即执行，不依赖GC。
+    """
+    if depth <= 0:
+        yield from iterable
+        return
+
+    buffer = queue.Queue(maxsize=depth)
+    stop_event = threading.Event()
+
+    def _put(item):
+        while not stop_event.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in iterable:
+                if not _put((item, None)):
+                    return
+        except BaseException as e:  # noqa: B036 异常需要转交给消费端
+            _put((_SENTINEL, e))
+            return
+        _put((_SENTINEL, None))
+
+    producer = threading.Thread(target=_produce, name='prefetch_iter', daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _SENTINEL:
+                if error is not None:
+                    raise error
+                break
+            yield item
+    finally:
+        # 消费端提前退出时通知生产者停止，并释放已缓存的元素
+        stop_event.set()
+        while not buffer.empty():
+            try:
+                buffer.get_nowait()
+            except queue.Empty:
+                break
+        producer.join()
+        # 生产者线程已经退出，在当前线程中关闭上游生成器
+        close = getattr(iterable, 'close', None)
+        if close is not None:
+            close()
@@ -0,0 +1,164 @@
+"""页面内 bbox 的空间索引，用于只对几何上相邻的 bbox 做比较."""
+import numpy as np
+
+from magic_pdf.libs.boxbase_batch import (bboxes_to_array,
+                                          paired_overlap_area_in_bbox1_area_ratio)
+
+
+def overlapping_bbox_pairs(bboxes):
+    """用 x 方向的扫描线找出所有在 x、y 方向上都有交集(含边界相接)的 bbox 对.
+
+    Returns:
+        (first_idx, second_idx): 两个等长的 int 数组，first_idx[k] < second_idx[k]，
+        按 (first_idx, second_idx) 字典序排列。未返回的 bbox 对之间重叠面积一定为 0。
+    """
+    boxes = bboxes_to_array(bboxes)
+    n = len(boxes)
+    if n < 2:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    order = np.argsort(boxes[:, 0], kind='stable')
+    sorted_x0 = boxes[order, 0]
+    # 扫描线: 按 x0 排序后，排在 k 后面且 x0 <= x1[k] 的 bbox 才可能和 k 在 x 方向上相交
+    end = np.searchsorted(sorted_x0, boxes[order, 2], side='right')
+    start = np.arange(1, n + 1)
+    counts = np.maximum(end - start, 0)
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    sorted_first = np.repeat(np.arange(n), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    sorted_second = np.repeat(start, counts) + offsets
+
+    first_idx = order[sorted_first]
+    second_idx = order[sorted_second]
+    # 再过滤掉 y 方向上不相交的
+    y_overlap = (np.maximum(boxes[first_idx, 1], boxes[second_idx, 1]) <=
+                 np.minimum(boxes[first_idx, 3], boxes[second_idx, 3]))
+    first_idx, second_idx = first_idx[y_overlap], second_idx[y_overlap]
+
+    lo = np.minimum(first_idx, second_idx)
+    hi = np.maximum(first_idx, second_idx)
+    pair_order = np.lexsort((hi, lo))
+    return lo[pair_order], hi[pair_order]
+
+
+def ordered_overlapping_bbox_pairs(first_idx, second_idx):
+    """把无序的 bbox 对展开成 (i, j) 和 (j, i) 两个方向，并按 (i, j) 字典序排列.
+
+    与 `for a in bboxes: for b in bboxes: if a is not b` 双重循环中可能重叠的那些 bbox 对的访问顺序一致。
+    """
+    i = np.concatenate([first_idx, second_idx])
+    j = np.concatenate([second_idx, first_idx])
+    pair_order = np.lexsort((j, i))
+    return i[pair_order], j[pair_order]
+
+
+class BboxGridIndex:
+    """把一组 bbox 放进均匀网格中，查询时只取出与查询框所在网格相交的 bbox.
+
+    适合"少量大框(block/layout) x 大量小框(span)"的归属判断：建索引 O(n)，每次查询只和附近的若干个框比较。
+    """
+
+    def __init__(self, bboxes, cells_per_axis=None):
+        self.__boxes = bboxes_to_array(bboxes)
+        self.__cells = {}
+        n = len(self.__boxes)
+        # 反向(x1<x0 或 y1<y0)的 bbox 和任何框都不会有交集，不放进网格
+        valid = (self.__boxes[:, 2] >= self.__boxes[:, 0]) & (self.__boxes[:, 3] >= self.__boxes[:, 1])
+        if not valid.any():
+            self.__origin = np.zeros(2)
+            self.__cell_size = np.ones(2)
+            self.__shape = (1, 1)
+            return
+
+        valid_boxes = self.__boxes[valid]
+        self.__origin = valid_boxes[:, :2].min(axis=0)
+        extent = valid_boxes[:, 2:].max(axis=0) - self.__origin
+        if cells_per_axis is None:
+            cells_per_axis = max(1, int(np.ceil(np.sqrt(n))))
+        self.__shape = (cells_per_axis, cells_per_axis)
+        self.__cell_size = np.where(extent > 0, extent / cells_per_axis, 1.0)
+
+        cell_ranges = self.__cell_ranges(self.__boxes)
+        for box_idx in np.flatnonzero(valid):
+            cx0, cy0, cx1, cy1 = cell_ranges[box_idx]
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    self.__cells.setdefault((cx, cy), []).append(int(box_idx))
+
+    def __len__(self):
+        return len(self.__boxes)
+
+    def __cell_ranges(self, boxes):
+        """返回每个 bbox 覆盖的网格范围 [cx0, cy0, cx1, cy1]，超出网格的部分截断到边界上."""
+        x_cells = np.floor((boxes[:, [0, 2]] - self.__origin[0]) / self.__cell_size[0])
+        y_cells = np.floor((boxes[:, [1, 3]] - self.__origin[1]) / self.__cell_size[1])
+        x_cells = np.clip(x_cells, 0, self.__shape[0] - 1)
+        y_cells = np.clip(y_cells, 0, self.__shape[1] - 1)
+        return np.stack([x_cells[:, 0], y_cells[:, 0], x_cells[:, 1], y_cells[:, 1]], axis=1).astype(np.intp)
+
+    def query_pairs(self, bboxes):
+        """找出查询框与索引中 bbox 在 x、y 方向上都有交集(含边界相接)的所有组合.
+
+        Returns:
+            (query_idx, box_idx): 两个等长的 int 数组，按 (query_idx, box_idx) 字典序排列。
+            未返回的组合之间重叠面积一定为 0。
+        """
+        queries = bboxes_to_array(bboxes)
+        if len(queries) == 0 or not self.__cells:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+        query_idx = []
+        box_idx = []
+        for q, (cx0, cy0, cx1, cy1) in enumerate(self.__cell_ranges(queries)):
+            candidates = set()
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    candidates.update(self.__cells.get((cx, cy), ()))
+            query_idx.extend([q] * len(candidates))
+            box_idx.extend(candidates)
+        query_idx = np.asarray(query_idx, dtype=np.intp)
+        box_idx = np.asarray(box_idx, dtype=np.intp)
+
+        # 同一个网格里的 bbox 不一定和查询框相交，再精确过滤一次
+        first, second = queries[query_idx], self.__boxes[box_idx]
+        overlap = ((np.maximum(first[:, 0], second[:, 0]) <= np.minimum(first[:, 2], second[:, 2])) &
+                   (np.maximum(first[:, 1], second[:, 1]) <= np.minimum(first[:, 3], second[:, 3])))
+        query_idx, box_idx = query_idx[overlap], box_idx[overlap]
+        pair_order = np.lexsort((box_idx, query_idx))
+        return query_idx[pair_order], box_idx[pair_order]
+
+    def first_containers_by_overlap_ratio(self, bboxes, ratio):
+        """对每个查询框，返回按索引顺序第一个满足 重叠面积占查询框面积的比例 > ratio 的 bbox 序号，没有则为 -1.
+
+        与"按顺序遍历每个容器框，把命中的查询框分给它并从候选中移除"的写法结果一致。
+        """
+        queries = bboxes_to_array(bboxes)
+        first_container = np.full(len(queries), -1, dtype=np.intp)
+        query_idx, box_idx = self.query_pairs(queries)
+        if len(query_idx) == 0:
+            return first_container
+        hit = paired_overlap_area_in_bbox1_area_ratio(queries[query_idx], self.__boxes[box_idx]) > ratio
+        query_idx, box_idx = query_idx[hit], box_idx[hit]
+        # 组合按 (query_idx, box_idx) 排好序，每个查询框第一次出现的位置就是序号最小的容器
+        hit_queries, first_pos = np.unique(query_idx, return_index=True)
+        first_container[hit_queries] = box_idx[first_pos]
+        return first_container
+
+    def best_containers_by_overlap_ratio(self, bboxes, ratio):
+        """对每个查询框，返回 重叠面积占查询框面积的比例 最大且 > ratio 的 bbox 序号，比例相同时取序号小的，没有则为 -1."""
+        queries = bboxes_to_array(bboxes)
+        best_container = np.full(len(queries), -1, dtype=np.intp)
+        query_idx, box_idx = self.query_pairs(queries)
+        if len(query_idx) == 0:
+            return best_container
+        overlap_ratio = paired_overlap_area_in_bbox1_area_ratio(queries[query_idx], self.__boxes[box_idx])
+        hit = overlap_ratio > ratio
+        query_idx, box_idx, overlap_ratio = query_idx[hit], box_idx[hit], overlap_ratio[hit]
+        pair_order = np.lexsort((box_idx, -overlap_ratio, query_idx))
+        query_idx, box_idx = query_idx[pair_order], box_idx[pair_order]
+        hit_queries, first_pos = np.unique(query_idx, return_index=True)
+        best_container[hit_queries] = box_idx[first_pos]
+        return best_container
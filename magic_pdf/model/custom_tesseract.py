@@ -2,9 +2,14 @@ from loguru import logger
 import os
 import time
 from magic_pdf.libs.Constants import *
+from magic_pdf.model.mfr_cache import FormulaRecognitionCache
+from magic_pdf.model.mfr_queue import FormulaRecognitionQueue
+from magic_pdf.model.table_recognizer import (TABLE_BATCH_SIZE,
+                                              TableRecognitionQueue,
+                                              TableRecognizer)
+from magic_pdf.model.tesseract_ocr import TesseractOCR, ocr_lines_to_layout_res
 
 try:
-    import cv2
     import yaml
     import argparse
     import numpy as np
@@ -13,20 +18,18 @@ try:
     from paddleocr import draw_ocr
     from PIL import Image
     from torchvision import transforms
-    from torch.utils.data import Dataset, DataLoader
+    from torch.utils.data import Dataset
     from ultralytics import YOLO
     from unimernet.common.config import Config
     import unimernet.tasks as tasks
     from unimernet.processors import load_processor
 
     from magic_pdf.model.pek_sub_modules.layoutlmv3.model_init import Layoutlmv3_Predictor
-    from magic_pdf.model.pek_sub_modules.post_process import get_croped_image, latex_rm_whitespace
+    from magic_pdf.model.pek_sub_modules.post_process import crop_ndarray, latex_rm_whitespace, pad_crop_ndarray
     from magic_pdf.model.pek_sub_modules.self_modify import ModifiedPaddleOCR
     from magic_pdf.model.pek_sub_modules.structeqtable.StructTableModel import StructTableModel
     from magic_pdf.model.ppTableModel import ppTableModel
 
-    import pytesseract
-
 except ImportError as e:
     logger.exception(e)
     logger.error('Required dependency not installed, please install by \n"pip install magic-pdf[full-cpu] detectron2 --extra-index-url https://myhloli.github.io/wheels/"')
@@ -109,7 +112,11 @@ class CustomTesseractModel:
         self.apply_formula = kwargs.get("apply_formula", self.configs["config"]["formula"])
         self.table_config = kwargs.get("table_config", self.configs["config"]["table_config"])
         self.apply_table = self.table_config.get("is_table_recog_enable", False)
+        self.table_max_time = self.table_config.get("max_time", TABLE_MAX_TIME_VALUE)
+        self.table_model_type = self.table_config.get("model", TABLE_MASTER)
+        self.table_enforce_max_time = self.table_config.get("enforce_max_time", True)
         self.apply_ocr = ocr
+        self.ocr_config = kwargs.get("ocr_config", {})
         logger.info(
             "DocAnalysis init, this may take some times. apply_layout: {}, apply_formula: {}, apply_ocr: {}, apply_table: {}".format(
                 self.apply_layout, self.apply_formula, self.apply_ocr, self.apply_table
@@ -132,6 +139,9 @@ class CustomTesseractModel:
             mfr_cfg_path = str(os.path.join(model_config_dir, "UniMERNet", "demo.yaml"))
             self.mfr_model, mfr_vis_processors = mfr_model_init(mfr_weight_dir, mfr_cfg_path, _device_=self.device)
             self.mfr_transform = transforms.Compose([mfr_vis_processors, ])
+            # 文档级公式识别队列，内容相同的公式截图直接复用缓存的识别结果
+            self.mfr_queue = FormulaRecognitionQueue(self.__mfr_predict,
+                                                     cache=FormulaRecognitionCache.from_config(mfr_weight_dir))
 
         # 初始化layout模型
         self.layout_model = Layoutlmv3_Predictor(
@@ -142,28 +152,123 @@ class CustomTesseractModel:
         # 初始化ocr
         if self.apply_ocr:
             self.ocr_model = ModifiedPaddleOCR(show_log=show_log)
-
-        # init structeqtable
+            # 常驻的tesseract引擎，区域OCR不再每次启动tesseract子进程；
+            # 一页内的各区域在线程池中并行识别，tesseract_workers为0时使用cpu核数，
+            # 每个tesseract引擎只用一个OpenMP线程(OMP_THREAD_LIMIT=1)，避免和线程池叠加超额占用CPU
+            tesseract_workers = self.ocr_config.get("tesseract_workers", 0) or os.cpu_count() or 1
+            self.tesseract_ocr = TesseractOCR(lang="por", workers=tesseract_workers)
+            logger.info(f"tesseract ocr workers: {tesseract_workers}")
+
+        # init table model
         if self.apply_table:
-            max_time = self.table_config.get("max_time", 400)
-            self.table_model = table_model_init(str(os.path.join(models_dir, self.configs["weights"]["table"])),
-                                                max_time=max_time, _device_=self.device)
+            table_model_path = str(os.path.join(models_dir, self.configs["weights"][self.table_model_type]))
+            if self.table_enforce_max_time:
+                # 表格模型加载在子进程中，单张表格超过max_time时终止子进程
+                self.table_recognizer = TableRecognizer(
+                    self.table_model_type, self.table_max_time, init_fn=table_model_init,
+                    init_args=(self.table_model_type, table_model_path, self.table_max_time, self.device)
+                )
+            else:
+                self.table_model = table_model_init(self.table_model_type, table_model_path,
+                                                    max_time=self.table_max_time, _device_=self.device)
+                self.table_recognizer = TableRecognizer(self.table_model_type, self.table_max_time,
+                                                        table_model=self.table_model)
+            # 文档级表格识别队列，每batch_size张表格识别一次
+            self.table_queue = TableRecognitionQueue(self.table_recognizer,
+                                                     batch_size=self.table_config.get("batch_size", TABLE_BATCH_SIZE))
         logger.info('DocAnalysis init done!')
 
-    def __call__(self, image):
+    def __mfr_predict(self, mf_image_list):
+        mf_img = torch.stack([self.mfr_transform(raw_image) for raw_image in mf_image_list]).to(self.device)
+        output = self.mfr_model.generate({'image': mf_img})
+        return [latex_rm_whitespace(latex) for latex in output['pred_str']]
 
-        latex_filling_list = []
-        mf_image_list = []
+    def flush_mfr(self):
+        """
+        识别公式队列中积压的所有公式，结果写回对应的layout_res条目
+        """
+        if not self.apply_formula:
+            return
+        mfr_start = time.time()
+        formula_nums = self.mfr_queue.flush()
+        if formula_nums > 0:
+            mfr_cost = round(time.time() - mfr_start, 2)
+            logger.info(f"formula nums: {formula_nums}, mfr time: {mfr_cost}")
+
+    def clear_mfr(self):
+        """
+        丢弃公式队列中积压的公式，文档处理失败时调用，避免被下一篇文档的flush_mfr识别
+        """
+        if not self.apply_formula:
+            return
+        formula_nums = self.mfr_queue.clear()
+        if formula_nums > 0:
+            logger.warning(f"drop {formula_nums} pending formulas")
+
+    def flush_table(self):
+        """
+        识别表格队列中积压的所有表格，结果写回对应的layout_res条目
+        """
+        if not self.apply_table:
+            return
+        table_start = time.time()
+        table_nums = self.table_queue.flush()
+        if table_nums > 0:
+            table_cost = round(time.time() - table_start, 2)
+            logger.info(f"table nums: {table_nums}, table time: {table_cost}")
+
+    def clear_table(self):
+        """
+        丢弃表格队列中积压的表格，文档处理失败时调用，避免被下一篇文档的flush_table识别
+        """
+        if not self.apply_table:
+            return
+        table_nums = self.table_queue.clear()
+        if table_nums > 0:
+            logger.warning(f"drop {table_nums} pending tables")
 
-        # layout检测
+    def batch(self, images, defer_mfr=False, defer_table=False):
+        """
+        多页图片一起做layout检测和公式检测(各一次前向推理)，其余步骤仍逐页处理，返回与images顺序一致的结果
+        defer_mfr/defer_table为True时公式识别/表格识别留在队列中，由调用方在合适的时机调用flush_mfr/flush_table
+        """
         layout_start = time.time()
-        layout_res = self.layout_model(image, ignore_catids=[])
+        layout_res_list = self.layout_model.batch(images, ignore_catids=[])
         layout_cost = round(time.time() - layout_start, 2)
-        logger.info(f"layout detection cost: {layout_cost}")
+        logger.info(f"layout detection batch size: {len(images)}, cost: {layout_cost}")
+
+        # 公式检测，ultralytics对图片列表一次推理，返回逐页的结果
+        mfd_res_list = [None] * len(images)
+        if self.apply_formula:
+            mfd_start = time.time()
+            mfd_res_list = self.mfd_model.predict(images, imgsz=1888, conf=0.25, iou=0.45, verbose=True)
+            mfd_cost = round(time.time() - mfd_start, 2)
+            logger.info(f"formula detection batch size: {len(images)}, cost: {mfd_cost}")
+
+        results = [self(image, layout_res=layout_res, mfd_res=mfd_res, defer_mfr=True, defer_table=True)
+                   for image, layout_res, mfd_res in zip(images, layout_res_list, mfd_res_list)]
+        if not defer_mfr:
+            self.flush_mfr()
+        if not defer_table:
+            self.flush_table()
+        return results
+
+    def __call__(self, image, layout_res=None, mfd_res=None, defer_mfr=False, defer_table=False):
+
+        latex_filling_list = []
+        mf_image_list = []
+
+        # layout检测，batch模式下已经提前算好
+        if layout_res is None:
+            layout_start = time.time()
+            layout_res = self.layout_model(image, ignore_catids=[])
+            layout_cost = round(time.time() - layout_start, 2)
+            logger.info(f"layout detection cost: {layout_cost}")
 
         if self.apply_formula:
-            # 公式检测
-            mfd_res = self.mfd_model.predict(image, imgsz=1888, conf=0.25, iou=0.45, verbose=True)[0]
+            # 公式检测，batch模式下已经提前算好
+            if mfd_res is None:
+                mfd_res = self.mfd_model.predict(image, imgsz=1888, conf=0.25, iou=0.45, verbose=True)[0]
             for xyxy, conf, cla in zip(mfd_res.boxes.xyxy.cpu(), mfd_res.boxes.conf.cpu(), mfd_res.boxes.cls.cpu()):
                 xmin, ymin, xmax, ymax = [int(p.item()) for p in xyxy]
                 new_item = {
@@ -174,22 +279,15 @@ class CustomTesseractModel:
                 }
                 layout_res.append(new_item)
                 latex_filling_list.append(new_item)
-                bbox_img = get_croped_image(Image.fromarray(image), [xmin, ymin, xmax, ymax])
+                # 公式截图要在队列中保留到整篇文档识别完，所以复制一份，不持有整页数组
+                bbox_img = Image.fromarray(crop_ndarray(image, [xmin, ymin, xmax, ymax]))
                 mf_image_list.append(bbox_img)
 
-            # 公式识别
-            mfr_start = time.time()
-            dataset = MathDataset(mf_image_list, transform=self.mfr_transform)
-            dataloader = DataLoader(dataset, batch_size=64, num_workers=0)
-            mfr_res = []
-            for mf_img in dataloader:
-                mf_img = mf_img.to(self.device)
-                output = self.mfr_model.generate({'image': mf_img})
-                mfr_res.extend(output['pred_str'])
-            for res, latex in zip(latex_filling_list, mfr_res):
-                res['latex'] = latex_rm_whitespace(latex)
-            mfr_cost = round(time.time() - mfr_start, 2)
-            logger.info(f"formula nums: {len(mf_image_list)}, mfr time: {mfr_cost}")
+            # 公式识别，公式截图放入文档级队列，按尺寸分桶后批量识别，结果写回latex_filling_list中的条目
+            for res, bbox_img in zip(latex_filling_list, mf_image_list):
+                self.mfr_queue.put(bbox_img, res)
+            if not defer_mfr:
+                self.flush_mfr()
 
          # 筛选出需要OCR的区域和公式区域
         ocr_res_list = []
@@ -207,124 +305,46 @@ class CustomTesseractModel:
                 table_res_list.append(res)
 
         #  Unified crop img logic
-        def crop_img(input_res, input_pil_img, crop_paste_x=0, crop_paste_y=0):
+        def crop_img(input_res, input_image, crop_paste_x=0, crop_paste_y=0):
             crop_xmin, crop_ymin = int(input_res['poly'][0]), int(input_res['poly'][1])
             crop_xmax, crop_ymax = int(input_res['poly'][4]), int(input_res['poly'][5])
-            # Create a white background with an additional width and height of 50
-            crop_new_width = crop_xmax - crop_xmin + crop_paste_x * 2
-            crop_new_height = crop_ymax - crop_ymin + crop_paste_y * 2
-            return_image = Image.new('RGB', (crop_new_width, crop_new_height), 'white')
-
-            # Crop image
             crop_box = (crop_xmin, crop_ymin, crop_xmax, crop_ymax)
-            cropped_img = input_pil_img.crop(crop_box)
-            return_image.paste(cropped_img, (crop_paste_x, crop_paste_y))
+            if crop_paste_x or crop_paste_y:
+                # Crop into a white background with an additional width and height of 50
+                return_image = pad_crop_ndarray(input_image, crop_box, crop_paste_x, crop_paste_y)
+            else:
+                # 不留白时直接返回页面数组的视图
+                return_image = crop_ndarray(input_image, crop_box)
+            crop_new_height, crop_new_width = return_image.shape[:2]
             return_list = [crop_paste_x, crop_paste_y, crop_xmin, crop_ymin, crop_xmax, crop_ymax, crop_new_width, crop_new_height]
-            return return_image, return_list
-        
-        pil_img = Image.fromarray(image)
-        
+            return Image.fromarray(return_image), return_list
+
          # ocr识别
         if self.apply_ocr:
             ocr_start = time.time()
             # Process each area that requires OCR processing
+            ocr_image_list = []
+            ocr_useful_list = []
             for res in ocr_res_list:
-                new_image, useful_list = crop_img(res, pil_img, crop_paste_x=50, crop_paste_y=50)
+                new_image, useful_list = crop_img(res, image, crop_paste_x=50, crop_paste_y=50)
+                ocr_image_list.append(new_image)
+                ocr_useful_list.append(useful_list)
+
+            # OCR识别，返回文本行级别的检测框和置信度，结果顺序与ocr_res_list一致，保证layout_res的顺序确定
+            page_ocr_res = self.tesseract_ocr.ocr_regions(ocr_image_list)
+            for ocr_res, useful_list in zip(page_ocr_res, ocr_useful_list):
                 paste_x, paste_y, xmin, ymin, xmax, ymax, new_width, new_height = useful_list
-                # Adjust the coordinates of the formula area
-                adjusted_mfdetrec_res = []
-                for mf_res in single_page_mfdetrec_res:
-                    mf_xmin, mf_ymin, mf_xmax, mf_ymax = mf_res["bbox"]
-                    # Adjust the coordinates of the formula area to the coordinates relative to the cropping area
-                    x0 = mf_xmin - xmin + paste_x
-                    y0 = mf_ymin - ymin + paste_y
-                    x1 = mf_xmax - xmin + paste_x
-                    y1 = mf_ymax - ymin + paste_y
-                    # Filter formula blocks outside the graph
-                    if any([x1 < 0, y1 < 0]) or any([x0 > new_width, y0 > new_height]):
-                        continue
-                    else:
-                        adjusted_mfdetrec_res.append({
-                            "bbox": [x0, y0, x1, y1],
-                        })
-
-                # OCR识别
-                new_image = cv2.cvtColor(np.asarray(new_image), cv2.COLOR_RGB2BGR)
-                # ocr_res = pytesseract.image_to_data(cropped_img,lang="por",output_type="dict")
-                # if ocr_res:
-                #     for i in range(len(ocr_res["text"])):
-                #         if ocr_res["conf"][i] == -1 or len(ocr_res["text"][i])==0:
-                #             continue
-
-                #         top = ocr_res["top"][i]
-                #         left = ocr_res["left"][i]
-                #         width = ocr_res["width"][i]
-                #         height = ocr_res["height"][i]
-
-                #         p1 = [left,top]
-                #         p2 = [left+width,top]
-                #         p3 = [left+width,top+height]
-                #         p4 = [left,top+height]
-                        
-
-                #         layout_res.append({
-                #             'category_id': 15,
-                #             'poly': p1 + p2 + p3 + p4,
-                #             'score': round(ocr_res["conf"][i]/100, 2),
-                #             'text': ocr_res["text"][i],
-                #         })
-                ocr_res = pytesseract.image_to_string(new_image,lang="por")
-                if ocr_res:
-                    if ocr_res=="":
-                        continue
-                    p1 = [xmin,ymin]
-                    p2 = [xmax,ymin]
-                    p3 = [xmax,ymax]
-                    p4 = [xmin,ymax]
-                    
-
-                    layout_res.append({
-                        'category_id': 15,
-                        'poly': p1 + p2 + p3 + p4,
-                        'score': round(1, 2),
-                        'text': ocr_res,
-                    })
+                # 转换回整页坐标
+                layout_res.extend(ocr_lines_to_layout_res(ocr_res, xmin - paste_x, ymin - paste_y))
             ocr_cost = round(time.time() - ocr_start, 2)
             logger.info(f"ocr cost: {ocr_cost}")
             
-        # 表格识别 table recognition
+        # 表格识别 table recognition，表格截图放入文档级队列批量识别，结果写回table_res_list中的条目
         if self.apply_table:
-            table_start = time.time()
             for res in table_res_list:
-                new_image, _ = crop_img(res, pil_img)
-                single_table_start_time = time.time()
-                logger.info("------------------table recognition processing begins-----------------")
-                latex_code = None
-                html_code = None
-                if self.table_model_type == STRUCT_EQTABLE:
-                    with torch.no_grad():
-                        latex_code = self.table_model.image2latex(new_image)[0]
-                else:
-                    html_code = self.table_model.img2html(new_image)
-
-                run_time = time.time() - single_table_start_time
-                logger.info(f"------------table recognition processing ends within {run_time}s-----")
-                if run_time > self.table_max_time:
-                    logger.warning(f"------------table recognition processing exceeds max time {self.table_max_time}s----------")
-                # 判断是否返回正常
-
-                if latex_code:
-                    expected_ending = latex_code.strip().endswith('end{tabular}') or latex_code.strip().endswith(
-                        'end{table}')
-                    if expected_ending:
-                        res["latex"] = latex_code
-                    else:
-                        logger.warning(f"------------table recognition processing fails----------")
-                elif html_code:
-                    res["html"] = html_code
-                else:
-                    logger.warning(f"------------table recognition processing fails----------")
-            table_cost = round(time.time() - table_start, 2)
-            logger.info(f"table cost: {table_cost}")
+                new_image, _ = crop_img(res, image)
+                self.table_queue.put(new_image, res)
+            if not defer_table:
+                self.flush_table()
 
         return layout_res
@@ -1,11 +1,14 @@
+import threading
 import time
 
 import fitz
 import numpy as np
 from loguru import logger
 
-from magic_pdf.libs.config_reader import get_local_models_dir, get_device, get_table_recog_config
-from magic_pdf.libs.config_reader import get_local_models_dir, get_device, get_table_recog_config
+from magic_pdf.libs.commons import fitz_lock
+from magic_pdf.libs.config_reader import get_local_models_dir, get_device, get_table_recog_config, \
+    get_render_config, get_analyze_config, get_ocr_config
+from magic_pdf.libs.prefetch_utils import prefetch_iter
 from magic_pdf.model.model_list import MODEL
 import magic_pdf.model as model_config
 
@@ -26,33 +29,128 @@ def remove_duplicates_dicts(lst):
     return unique_dicts
 
 
-def load_images_from_pdf(pdf_bytes: bytes, dpi=200) -> list:
+def get_page_render_rect(page, dpi=200):
+    """返回 (渲染矩阵, 渲染后的整数rect)，宽高超过9000时退回不缩放，rect只计算一次"""
+    mat = fitz.Matrix(dpi / 72, dpi / 72)
+    # If the width or height exceeds 9000 after scaling, do not scale further.
+    render_rect = (page.rect * mat).irect
+    if render_rect.width > 9000 or render_rect.height > 9000:
+        mat = fitz.Matrix(1, 1)
+        render_rect = page.rect.irect
+    return mat, render_rect
+
+
+def get_page_render_matrix(page, dpi=200):
+    return get_page_render_rect(page, dpi)[0]
+
+
+class _PixmapArray:
+    """通过 __array_interface__ 把pixmap的像素缓冲区暴露给numpy，数组的base持有pixmap，保证缓冲区不被提前释放"""
+
+    def __init__(self, pm):
+        self.pixmap = pm
+        self.__array_interface__ = {
+            "shape": (pm.height, pm.width, pm.n),
+            "typestr": "|u1",
+            "data": (pm.samples_ptr, False),
+            "strides": (pm.stride, pm.n, 1),
+            "version": 3,
+        }
+
+    def __del__(self):
+        # 数组可能在任意线程中被释放，pixmap要在fitz_lock内释放
+        with fitz_lock:
+            self.pixmap = None
+
+
+def pixmap_to_ndarray(pm) -> np.ndarray:
+    """不复制像素数据，直接把pixmap包装成 HxWxN 的uint8数组"""
+    return np.asarray(_PixmapArray(pm))
+
+
+class RenderBufferPool:
+    """按页面尺寸复用的渲染缓冲区.
+
+    同一文档的页面尺寸大多相同，渲染后把pixmap拷贝到空闲的同尺寸缓冲区中并立即释放pixmap，
+    页面用完后调用 release 归还，避免每页都重新申请几十MB的内存。最多保留 max_buffers 个空闲缓冲区。
+    acquire 和 release 可以在不同线程中调用。
+    """
+
+    def __init__(self, max_buffers=4):
+        self.__max_buffers = max_buffers
+        self.__free = {}
+        self.__free_count = 0
+        self.__lock = threading.Lock()
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self, shape):
+        shape = tuple(shape)
+        with self.__lock:
+            buffers = self.__free.get(shape)
+            if buffers:
+                self.__free_count -= 1
+                self.reused += 1
+                return buffers.pop()
+            self.allocated += 1
+        return np.empty(shape, dtype=np.uint8)
+
+    def release(self, img):
+        """归还一页的图像，调用方之后不能再使用该数组"""
+        if img is None or not img.flags.owndata:
+            return
+        with self.__lock:
+            if self.__free_count >= self.__max_buffers:
+                return
+            self.__free.setdefault(img.shape, []).append(img)
+            self.__free_count += 1
+
+
+def iter_images_from_pdf(pdf_bytes: bytes, dpi=200, start_page_id=0, end_page_id=None, buffer_pool=None):
+    """逐页渲染pdf，每次只产出一页图像，避免一次性把整本文档渲染到内存中.
+
+    [start_page_id, end_page_id] 之外的页面不渲染，只根据页面rect计算出渲染后的宽高，img为None。
+    没有 buffer_pool 时img直接引用pixmap的像素缓冲区，不做复制；
+    传入 buffer_pool 时img是从池中取出的缓冲区，调用方用完后应 buffer_pool.release(img)。
+    所有fitz调用都在fitz_lock内进行，可以和其他线程中的fitz调用同时使用。
+    """
+    with fitz_lock:
+        doc = fitz.open("pdf", pdf_bytes)
     try:
-        from PIL import Image
-    except ImportError:
-        logger.error("Pillow not installed, please install by pip.")
-        exit(1)
-
-    images = []
-    with fitz.open("pdf", pdf_bytes) as doc:
+        end_page_id = end_page_id if end_page_id is not None and end_page_id >= 0 else doc.page_count - 1
         for index in range(0, doc.page_count):
-            page = doc[index]
-            mat = fitz.Matrix(dpi / 72, dpi / 72)
-            pm = page.get_pixmap(matrix=mat, alpha=False)
-
-            # If the width or height exceeds 9000 after scaling, do not scale further.
-            if pm.width > 9000 or pm.height > 9000:
-                pm = page.get_pixmap(matrix=fitz.Matrix(1, 1), alpha=False)
+            with fitz_lock:
+                page = doc[index]
+                mat, render_rect = get_page_render_rect(page, dpi)
+                if not start_page_id <= index <= end_page_id:
+                    img = None
+                else:
+                    pm = page.get_pixmap(matrix=mat, alpha=False)
+                    img = pixmap_to_ndarray(pm)
+                    if buffer_pool is not None:
+                        buffer = buffer_pool.acquire(img.shape)
+                        np.copyto(buffer, img)
+                        img = buffer
+                    del pm
+                del page
+
+            if img is None:
+                yield {"img": None, "width": render_rect.width, "height": render_rect.height}
+                continue
 
-            img = Image.frombytes("RGB", (pm.width, pm.height), pm.samples)
-            img = np.array(img)
             # try: #sometimes Hough doesn't work if there is too little content on image
             #     img = align_image(img)
             # except:
             #     pass
-            img_dict = {"img": img, "width": pm.width, "height": pm.height}
-            images.append(img_dict)
-    return images
+            img_dict = {"img": img, "width": render_rect.width, "height": render_rect.height}
+            yield img_dict
+    finally:
+        with fitz_lock:
+            doc.close()
+
+
+def load_images_from_pdf(pdf_bytes: bytes, dpi=200) -> list:
+    return list(iter_images_from_pdf(pdf_bytes, dpi=dpi))
 
 
 class ModelSingleton:
@@ -99,11 +197,13 @@ def custom_model_init(ocr: bool = False, show_log: bool = False):
             local_models_dir = get_local_models_dir()
             device = get_device()
             table_config = get_table_recog_config()
+            ocr_config = get_ocr_config()
             model_input = {"ocr": ocr,
                            "show_log": show_log,
                            "models_dir": local_models_dir,
                            "device": device,
-                           "table_config": table_config}
+                           "table_config": table_config,
+                           "ocr_config": ocr_config}
             custom_model = CustomPEKModel(**model_input)
         elif model == MODEL.Torrone:
             from magic_pdf.model.torrone_custom import CustomTorroneModel
@@ -111,11 +211,13 @@ def custom_model_init(ocr: bool = False, show_log: bool = False):
             local_models_dir = get_local_models_dir()
             device = get_device()
             table_config = get_table_recog_config()
+            ocr_config = get_ocr_config()
             model_input = {"ocr": ocr,
                            "show_log": show_log,
                            "models_dir": local_models_dir,
                            "device": device,
-                           "table_config": table_config}
+                           "table_config": table_config,
+                           "ocr_config": ocr_config}
             custom_model = CustomTorroneModel(**model_input)
         elif model == MODEL.Tesseract:
             from magic_pdf.model.custom_tesseract import CustomTesseractModel
@@ -123,11 +225,13 @@ def custom_model_init(ocr: bool = False, show_log: bool = False):
             local_models_dir = get_local_models_dir()
             device = get_device()
             table_config = get_table_recog_config()
+            ocr_config = get_ocr_config()
             model_input = {"ocr": ocr,
                            "show_log": show_log,
                            "models_dir": local_models_dir,
                            "device": device,
-                           "table_config": table_config}
+                           "table_config": table_config,
+                           "ocr_config": ocr_config}
             custom_model = CustomTesseractModel(**model_input)
         else:
             logger.error("Not allow model_name!")
@@ -141,39 +245,138 @@ def custom_model_init(ocr: bool = False, show_log: bool = False):
     return custom_model
 
 
-def doc_analyze(pdf_bytes: bytes, ocr: bool = False, show_log: bool = False,
-                start_page_id=0, end_page_id=None):
+def iter_doc_analyze(pdf_bytes: bytes, ocr: bool = False, show_log: bool = False,
+                     start_page_id=0, end_page_id=None, prefetch_pages: int = None, batch_size: int = None,
+                     buffer_pool_size: int = None, render_workers: int = None, flush_per_batch: bool = False):
+    """按页码顺序逐页产出模型结果 {"layout_dets": ..., "page_info": ...}.
 
+    flush_per_batch 为 False 时公式识别和表格识别推迟到整篇文档结束时统一进行，结果原地写回已产出的page_dict，
+    所以要等迭代结束后结果才完整；为 True 时每处理完一页(batch模式下一批)就清空识别队列再产出，
+    产出的page_dict即为最终结果，可以直接交给后续的解析流程。
+    """
     model_manager = ModelSingleton()
     custom_model = model_manager.get_model(ocr, show_log)
 
-    images = load_images_from_pdf(pdf_bytes)
-
-    # end_page_id = end_page_id if end_page_id else len(images) - 1
-    end_page_id = end_page_id if end_page_id is not None and end_page_id >= 0 else len(images) - 1
-
-    if end_page_id > len(images) - 1:
+    # 配置文件只读取一次，参数都显式传入时不读取
+    render_config = get_render_config() if None in (prefetch_pages, buffer_pool_size, render_workers) else {}
+    if prefetch_pages is None:
+        prefetch_pages = render_config.get("prefetch_pages", 2)
+    if buffer_pool_size is None:
+        buffer_pool_size = render_config.get("buffer_pool_size", 0)
+    if render_workers is None:
+        render_workers = render_config.get("render_workers", 0)
+    # 模型只在调用期间使用页面图像(进入队列的截图都是复制出来的)，处理完的页面缓冲区可以给后面同尺寸的页面复用
+    buffer_pool = RenderBufferPool(buffer_pool_size) if buffer_pool_size > 0 else None
+    if batch_size is None:
+        batch_size = get_analyze_config().get("batch_size", 1)
+    # 模型支持batch时，每batch_size页一起做layout检测和公式检测的前向推理
+    use_batch = batch_size > 1 and hasattr(custom_model, "batch")
+    # 模型支持文档级公式识别/表格识别队列时，公式和表格统一在最后(或每批页面之后)识别，结果原地写回page_dict
+    defer_mfr = hasattr(custom_model, "flush_mfr")
+    defer_table = hasattr(custom_model, "flush_table")
+    model_kwargs = {}
+    if defer_mfr:
+        model_kwargs["defer_mfr"] = True
+    if defer_table:
+        model_kwargs["defer_table"] = True
+
+    with fitz_lock, fitz.open("pdf", pdf_bytes) as doc:
+        page_count = doc.page_count
+
+    # end_page_id = end_page_id if end_page_id else page_count - 1
+    end_page_id = end_page_id if end_page_id is not None and end_page_id >= 0 else page_count - 1
+
+    if end_page_id > page_count - 1:
         logger.warning("end_page_id is out of range, use images length")
-        end_page_id = len(images) - 1
+        end_page_id = page_count - 1
+
+    # 渲染在后台线程中提前进行，最多领先模型 prefetch_pages 页
+    # 只渲染需要分析的页面，范围外的页面只输出宽高占位
+    if render_workers > 1:
+        # 推理很快时渲染会成为瓶颈，用多个进程并行渲染
+        from magic_pdf.model.parallel_render import iter_images_from_pdf_parallel
+        page_images = iter_images_from_pdf_parallel(pdf_bytes, render_workers, start_page_id=start_page_id,
+                                                    end_page_id=end_page_id, buffer_pool=buffer_pool)
+    else:
+        page_images = iter_images_from_pdf(pdf_bytes, start_page_id=start_page_id, end_page_id=end_page_id,
+                                           buffer_pool=buffer_pool)
+    images = prefetch_iter(page_images, prefetch_pages)
 
-    model_json = []
+    # 已经推理完、等待产出的页面
+    finished_pages = []
     doc_analyze_start = time.time()
 
-    for index, img_dict in enumerate(images):
-        img = img_dict["img"]
-        page_width = img_dict["width"]
-        page_height = img_dict["height"]
-        if start_page_id <= index <= end_page_id:
-            result = custom_model(img)
-        else:
-            result = []
-        page_info = {"page_no": index, "height": page_height, "width": page_width}
+    def append_page(index, img_dict, result):
+        if buffer_pool is not None:
+            buffer_pool.release(img_dict["img"])
+        page_info = {"page_no": index, "height": img_dict["height"], "width": img_dict["width"]}
         page_dict = {"layout_dets": result, "page_info": page_info}
-        model_json.append(page_dict)
+        finished_pages.append(page_dict)
+
+    def flush_queues():
+        if defer_mfr:
+            custom_model.flush_mfr()
+        if defer_table:
+            custom_model.flush_table()
+
+    def pop_finished_pages():
+        pages = finished_pages.copy()
+        finished_pages.clear()
+        return pages
+
+    pending_pages = []
+
+    def flush_pending_pages():
+        if len(pending_pages) == 0:
+            return
+        results = custom_model.batch([img_dict["img"] for _, img_dict in pending_pages], **model_kwargs)
+        for (index, img_dict), result in zip(pending_pages, results):
+            append_page(index, img_dict, result)
+        pending_pages.clear()
+
+    def clear_queues():
+        # 队列在模型单例上，文档处理失败时丢弃本文档积压的截图，避免在下一篇文档flush时被识别
+        if defer_mfr:
+            custom_model.clear_mfr()
+        if defer_table:
+            custom_model.clear_table()
+
+    try:
+        for index, img_dict in enumerate(images):
+            if start_page_id <= index <= end_page_id:
+                if use_batch:
+                    pending_pages.append((index, img_dict))
+                    if len(pending_pages) >= batch_size:
+                        flush_pending_pages()
+                else:
+                    append_page(index, img_dict, custom_model(img_dict["img"], **model_kwargs))
+            else:
+                # 保证输出按页码顺序
+                flush_pending_pages()
+                append_page(index, img_dict, [])
+            if flush_per_batch and finished_pages:
+                flush_queues()
+                yield from pop_finished_pages()
+        flush_pending_pages()
+        flush_queues()
+    except BaseException:
+        clear_queues()
+        raise
+    finally:
+        # 提前退出时立即停止渲染线程并关闭渲染器(结束渲染子进程、释放共享内存)
+        images.close()
     doc_analyze_cost = time.time() - doc_analyze_start
     logger.info(f"doc analyze cost: {doc_analyze_cost}")
+    yield from pop_finished_pages()
 
-    return model_json
+
+def doc_analyze(pdf_bytes: bytes, ocr: bool = False, show_log: bool = False,
+                start_page_id=0, end_page_id=None, prefetch_pages: int = None, batch_size: int = None,
+                buffer_pool_size: int = None, render_workers: int = None):
+    return list(iter_doc_analyze(pdf_bytes, ocr=ocr, show_log=show_log,
+                                 start_page_id=start_page_id, end_page_id=end_page_id,
+                                 prefetch_pages=prefetch_pages, batch_size=batch_size,
+                                 buffer_pool_size=buffer_pool_size, render_workers=render_workers))
 
 def get_angle(x1, y1, x2, y2) -> float:
     """Get the angle of this line with the horizontal axis."""
@@ -1,10 +1,14 @@
 import json
 
+import numpy as np
+
 from magic_pdf.libs.boxbase import (_is_in, _is_part_overlap, bbox_distance,
-                                    bbox_relative_pos, box_area, calculate_iou,
+                                    bbox_relative_pos, box_area,
                                     calculate_overlap_area_in_bbox1_area_ratio,
                                     get_overlap_area)
+from magic_pdf.libs.boxbase_batch import batch_iou
 from magic_pdf.libs.commons import fitz, join_path
+from magic_pdf.libs.Constants import TABLE_TIMEOUT
 from magic_pdf.libs.coordinate_transform import get_scale_ratio
 from magic_pdf.libs.local_math import float_gt
 from magic_pdf.libs.ModelBlockTypeEnum import ModelBlockTypeEnum
@@ -65,37 +69,25 @@ class MagicModel:
         for model_page_info in self.__model_list:
             need_remove_list = []
             layout_dets = model_page_info['layout_dets']
-            for layout_det1 in layout_dets:
-                for layout_det2 in layout_dets:
-                    if layout_det1 == layout_det2:
-                        continue
-                    if layout_det1['category_id'] in [
-                        0,
-                        1,
-                        2,
-                        3,
-                        4,
-                        5,
-                        6,
-                        7,
-                        8,
-                        9,
-                    ] and layout_det2['category_id'] in [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]:
-                        if (
-                            calculate_iou(layout_det1['bbox'], layout_det2['bbox'])
-                            > 0.9
-                        ):
-                            if layout_det1['score'] < layout_det2['score']:
-                                layout_det_need_remove = layout_det1
-                            else:
-                                layout_det_need_remove = layout_det2
-
-                            if layout_det_need_remove not in need_remove_list:
-                                need_remove_list.append(layout_det_need_remove)
-                        else:
-                            continue
-                    else:
-                        continue
+            # 只比较 category_id 在 0~9 之间的区块，先批量算出两两之间的iou，再按原顺序处理iou>0.9的区块对
+            candidate_dets = [
+                layout_det
+                for layout_det in layout_dets
+                if layout_det['category_id'] in [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]
+            ]
+            candidate_bboxes = [layout_det['bbox'] for layout_det in candidate_dets]
+            iou_matrix = batch_iou(candidate_bboxes, candidate_bboxes)
+            for i, j in zip(*np.nonzero(iou_matrix > 0.9)):
+                layout_det1, layout_det2 = candidate_dets[i], candidate_dets[j]
+                if layout_det1 == layout_det2:
+                    continue
+                if layout_det1['score'] < layout_det2['score']:
+                    layout_det_need_remove = layout_det1
+                else:
+                    layout_det_need_remove = layout_det2
+
+                if layout_det_need_remove not in need_remove_list:
+                    need_remove_list.append(layout_det_need_remove)
             for need_remove in need_remove_list:
                 layout_dets.remove(need_remove)
 
@@ -109,6 +101,27 @@ class MagicModel:
         """删除高iou(>0.9)数据中置信度较低的那个"""
         self.__fix_by_remove_high_iou_and_low_confidence()
         self.__fix_footnote()
+        """建立 page_no -> category_id -> layout_dets 的索引，所有getter都从索引中取数据"""
+        self.__build_page_index()
+
+    def __build_page_index(self):
+        self.__page_index = {}
+        self.__page_dets = {}
+        for page_dict in self.__model_list:
+            page_info = page_dict.get('page_info', {})
+            page_number = page_info.get('page_no', -1)
+            layout_dets = page_dict.get('layout_dets', [])
+            self.__page_dets.setdefault(page_number, []).extend(layout_dets)
+            category_index = self.__page_index.setdefault(page_number, {})
+            for item in layout_dets:
+                category_id = item.get('category_id', -1)
+                category_index.setdefault(category_id, []).append(item)
+
+    def __get_page_dets(self, page_no: int) -> list:
+        return self.__page_dets.get(page_no, [])
+
+    def __get_page_dets_by_category(self, page_no: int, category_id) -> list:
+        return self.__page_index.get(page_no, {}).get(category_id, [])
 
     def __fix_footnote(self):
         # 3: figure, 5: table, 7: footnote
@@ -212,16 +225,6 @@ class MagicModel:
             ]
             ratio = 0
 
-            other_objects = list(
-                map(
-                    lambda x: {'bbox': x['bbox'], 'score': x['score']},
-                    filter(
-                        lambda x: x['category_id']
-                        not in (object_category_id, subject_category_id),
-                        self.__model_list[page_no]['layout_dets'],
-                    ),
-                )
-            )
             for other_object in other_objects:
                 ratio = max(
                     ratio,
@@ -285,10 +288,7 @@ class MagicModel:
             list(
                 map(
                     lambda x: {'bbox': x['bbox'], 'score': x['score']},
-                    filter(
-                        lambda x: x['category_id'] == subject_category_id,
-                        self.__model_list[page_no]['layout_dets'],
-                    ),
+                    self.__get_page_dets_by_category(page_no, subject_category_id),
                 )
             )
         )
@@ -297,13 +297,22 @@ class MagicModel:
             list(
                 map(
                     lambda x: {'bbox': x['bbox'], 'score': x['score']},
-                    filter(
-                        lambda x: x['category_id'] == object_category_id,
-                        self.__model_list[page_no]['layout_dets'],
-                    ),
+                    self.__get_page_dets_by_category(page_no, object_category_id),
                 )
             )
         )
+
+        # 与 subject/object 类别不同的其它区块，用于判断合并后的 bbox 是否压住了其它区块
+        other_objects = list(
+            map(
+                lambda x: {'bbox': x['bbox'], 'score': x['score']},
+                filter(
+                    lambda x: x['category_id']
+                    not in (object_category_id, subject_category_id),
+                    self.__get_page_dets(page_no),
+                ),
+            )
+        )
         subject_object_relation_map = {}
 
         subjects.sort(
@@ -640,8 +649,7 @@ class MagicModel:
 
     def get_ocr_text(self, page_no: int) -> list:  # paddle 搞的，有字也有坐标
         text_spans = []
-        model_page_info = self.__model_list[page_no]
-        layout_dets = model_page_info['layout_dets']
+        layout_dets = self.__get_page_dets(page_no)
         for layout_det in layout_dets:
             if layout_det['category_id'] == '15':
                 span = {
@@ -661,8 +669,7 @@ class MagicModel:
             return new_spans
 
         all_spans = []
-        model_page_info = self.__model_list[page_no]
-        layout_dets = model_page_info['layout_dets']
+        layout_dets = self.__get_page_dets(page_no)
         allow_category_id_list = [3, 5, 13, 14, 15]
         """当成span拼接的"""
         #  3: 'image', # 图片
@@ -684,6 +691,8 @@ class MagicModel:
                         span['latex'] = latex
                     elif html:
                         span['html'] = html
+                    if layout_det.get(TABLE_TIMEOUT, False):
+                        span[TABLE_TIMEOUT] = True
                     span['type'] = ContentType.Table
                 elif category_id == 13:
                     span['content'] = layout_det['latex']
@@ -709,24 +718,14 @@ class MagicModel:
         self, type: int, page_no: int, extra_col: list[str] = []
     ) -> list:
         blocks = []
-        for page_dict in self.__model_list:
-            layout_dets = page_dict.get('layout_dets', [])
-            page_info = page_dict.get('page_info', {})
-            page_number = page_info.get('page_no', -1)
-            if page_no != page_number:
-                continue
-            for item in layout_dets:
-                category_id = item.get('category_id', -1)
-                bbox = item.get('bbox', None)
-
-                if category_id == type:
-                    block = {
-                        'bbox': bbox,
-                        'score': item.get('score'),
-                    }
-                    for col in extra_col:
-                        block[col] = item.get(col, None)
-                    blocks.append(block)
+        for item in self.__get_page_dets_by_category(page_no, type):
+            block = {
+                'bbox': item.get('bbox', None),
+                'score': item.get('score'),
+            }
+            for col in extra_col:
+                block[col] = item.get(col, None)
+            blocks.append(block)
         return blocks
 
     def get_model_list(self, page_no):
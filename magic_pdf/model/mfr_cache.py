@@ -0,0 +1,100 @@
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
+from loguru import logger
+
+from magic_pdf.libs.config_reader import get_mfr_cache_config
+
+MFR_CACHE_MAX_ITEMS = 10000
+
+
+def mfr_model_version(mfr_weight_dir):
+    """用权重目录下的文件名和大小作为模型版本，权重更换后旧的缓存结果自然失效"""
+    hasher = hashlib.sha256()
+    for dir_path, _, file_names in sorted(os.walk(mfr_weight_dir)):
+        for file_name in sorted(file_names):
+            file_path = os.path.join(dir_path, file_name)
+            rel_path = os.path.relpath(file_path, mfr_weight_dir)
+            hasher.update(f"{rel_path}:{os.path.getsize(file_path)};".encode('utf-8'))
+    return hasher.hexdigest()[:16]
+
+
+class FormulaRecognitionCache:
+    """按公式截图内容寻址的公式识别(MFR)结果缓存.
+
+    key 为 模型版本 + 截图尺寸 + 截图RGB像素 的sha256，内存中保留最近使用的 max_items 条，
+    配置了 cache_dir 时结果同时写入磁盘，可以在多个文档、多个进程之间共用。
+    """
+
+    def __init__(self, model_version, max_items=MFR_CACHE_MAX_ITEMS, cache_dir=None):
+        self.model_version = model_version
+        self.max_items = max_items
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self.__memory = OrderedDict()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, mfr_weight_dir):
+        """按 magic-pdf.json 中的 mfr-cache-config 构建缓存，max_items为0且未配置cache_dir时不使用缓存"""
+        mfr_cache_config = get_mfr_cache_config()
+        max_items = mfr_cache_config.get("max_items", MFR_CACHE_MAX_ITEMS)
+        cache_dir = mfr_cache_config.get("cache_dir", "")
+        if max_items <= 0 and not cache_dir:
+            return None
+        return cls(mfr_model_version(mfr_weight_dir), max_items=max_items, cache_dir=cache_dir)
+
+    def key(self, image):
+        rgb_image = image.convert('RGB')
+        hasher = hashlib.sha256()
+        hasher.update(f"{self.model_version}:{rgb_image.width}x{rgb_image.height}:".encode('utf-8'))
+        hasher.update(rgb_image.tobytes())
+        return hasher.hexdigest()
+
+    def __disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.tex")
+
+    def get(self, key):
+        """返回缓存的latex，未命中返回None，同时更新命中计数"""
+        latex = self.__memory.get(key)
+        if latex is not None:
+            self.__memory.move_to_end(key)
+        elif self.cache_dir:
+            disk_path = self.__disk_path(key)
+            if os.path.exists(disk_path):
+                with open(disk_path, 'r', encoding='utf-8') as f:
+                    latex = f.read()
+                self.__put_memory(key, latex)
+        if latex is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return latex
+
+    def put(self, key, latex):
+        self.__put_memory(key, latex)
+        if self.cache_dir:
+            disk_path = self.__disk_path(key)
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            # 先写临时文件再改名，多进程共用cache_dir时不会读到写了一半的文件
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(disk_path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(latex)
+                os.replace(tmp_path, disk_path)
+            except OSError as e:
+                logger.warning(f"write mfr cache failed: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def __put_memory(self, key, latex):
+        if self.max_items <= 0:
+            return
+        self.__memory[key] = latex
+        self.__memory.move_to_end(key)
+        while len(self.__memory) > self.max_items:
+            self.__memory.popitem(last=False)
@@ -0,0 +1,84 @@
+from loguru import logger
+
+MFR_BATCH_SIZE = 64
+# 队列中最多积压的公式截图数，超过后立即识别一次，控制长文档的内存占用
+MFR_MAX_PENDING = 4096
+
+
+class FormulaRecognitionQueue:
+    """文档级的公式识别(MFR)队列.
+
+    各页检测出的公式截图先放进队列，统一识别时按宽高比和宽度排序后切成满批次，
+    让同一批里的公式尺寸(和生成的latex长度)接近，减少padding和自回归生成时被最长公式拖慢的开销。
+    识别结果直接写回放入队列时传入的 layout_res 条目的 'latex' 字段。
+    """
+
+    def __init__(self, recognize_fn, batch_size=MFR_BATCH_SIZE, max_pending=MFR_MAX_PENDING, cache=None):
+        """
+        Args:
+            recognize_fn: 输入一批PIL图片，返回等长的latex字符串列表
+            cache: 可选的FormulaRecognitionCache，命中的公式不再送入模型
+        """
+        self.__recognize_fn = recognize_fn
+        self.__batch_size = batch_size
+        self.__max_pending = max_pending
+        self.__cache = cache
+        self.__pending = []
+
+    def __len__(self):
+        return len(self.__pending)
+
+    def put(self, image, res):
+        self.__pending.append((image, res))
+        if len(self.__pending) >= self.__max_pending:
+            logger.info(f"mfr queue reaches max pending {self.__max_pending}, flush")
+            self.flush()
+
+    def clear(self):
+        """丢弃队列中所有未识别的公式，返回丢弃的数量"""
+        pending, self.__pending = self.__pending, []
+        return len(pending)
+
+    def __group_pending(self, pending):
+        """
+        查缓存并把内容相同的截图合并，返回需要识别的 [(key, image, [res, ...]), ...]
+        """
+        if self.__cache is None:
+            return [(None, image, [res]) for image, res in pending]
+        hits, misses = self.__cache.hits, self.__cache.misses
+        groups = {}
+        for image, res in pending:
+            key = self.__cache.key(image)
+            if key in groups:
+                # 同一次flush中重复出现的公式只识别一次
+                groups[key][2].append(res)
+                continue
+            latex = self.__cache.get(key)
+            if latex is not None:
+                res['latex'] = latex
+            else:
+                groups[key] = (key, image, [res])
+        logger.info(f"mfr cache hits: {self.__cache.hits - hits}, misses: {self.__cache.misses - misses}, "
+                    f"total hits: {self.__cache.hits}, total misses: {self.__cache.misses}")
+        return list(groups.values())
+
+    def flush(self):
+        """识别队列中所有公式并写回结果，返回本次处理的公式数量(包括命中缓存的)"""
+        pending, self.__pending = self.__pending, []
+        if len(pending) == 0:
+            return 0
+
+        def bucket_key(group):
+            width, height = group[1].size
+            return width / max(height, 1), width
+
+        groups = sorted(self.__group_pending(pending), key=bucket_key)
+        for batch_start in range(0, len(groups), self.__batch_size):
+            batch = groups[batch_start: batch_start + self.__batch_size]
+            latex_list = self.__recognize_fn([image for _, image, _ in batch])
+            for (key, _, res_list), latex in zip(batch, latex_list):
+                for res in res_list:
+                    res['latex'] = latex
+                if self.__cache is not None:
+                    self.__cache.put(key, latex)
+        return len(pending)
@@ -0,0 +1,129 @@
+import multiprocessing
+import queue
+import traceback
+from multiprocessing import shared_memory
+
+import fitz
+import numpy as np
+from loguru import logger
+
+from magic_pdf.libs.commons import fitz_lock
+from magic_pdf.model.doc_analyze_by_custom_model import (get_page_render_rect,
+                                                         pixmap_to_ndarray)
+
+# 每个worker可以领先消费端渲染的页数，也是每个worker共享内存中的槽位数
+RENDER_SLOTS_PER_WORKER = 2
+
+
+def _slot_view(shm, slot, slot_size, shape):
+    return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_size)
+
+
+def _render_worker_main(worker_id, pdf_bytes, dpi, page_ids, shm_name, slot_size, free_slots, results):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        with fitz.open("pdf", pdf_bytes) as doc:
+            for page_id in page_ids:
+                slot = free_slots.get()
+                if slot is None:
+                    break
+                page = doc[page_id]
+                mat, _ = get_page_render_rect(page, dpi)
+                pm = page.get_pixmap(matrix=mat, alpha=False)
+                np.copyto(_slot_view(shm, slot, slot_size, (pm.height, pm.width, 3)), pixmap_to_ndarray(pm))
+                results.put((worker_id, page_id, slot, None))
+    except Exception:
+        results.put((worker_id, None, None, traceback.format_exc()))
+    finally:
+        shm.close()
+
+
+class ParallelPageRenderer:
+    """多进程页面渲染.
+
+    需要渲染的页面按页码轮流分给 workers 个子进程，每个子进程只打开一次pdf_bytes。
+    每个子进程有一块由父进程创建的共享内存，分成 RENDER_SLOTS_PER_WORKER 个槽位，
+    子进程把渲染结果写入空闲槽位后只通过队列传回槽位号，父进程按页码顺序把槽位中的像素拷贝出来后归还槽位，
+    页面数据不经过pickle，内存占用也不随文档页数增长。
+    """
+
+    def __init__(self, pdf_bytes: bytes, workers, dpi=200, slots_per_worker=RENDER_SLOTS_PER_WORKER):
+        self.__pdf_bytes = pdf_bytes
+        self.workers = workers
+        self.dpi = dpi
+        self.slots_per_worker = slots_per_worker
+
+    def iter_images(self, start_page_id=0, end_page_id=None, buffer_pool=None):
+        """与 iter_images_from_pdf 的输出一致，范围外的页面只输出宽高占位"""
+        with fitz_lock, fitz.open("pdf", self.__pdf_bytes) as doc:
+            end_page_id = end_page_id if end_page_id is not None and end_page_id >= 0 else doc.page_count - 1
+            render_sizes = []
+            for page in doc:
+                _, render_rect = get_page_render_rect(page, self.dpi)
+                render_sizes.append((render_rect.width, render_rect.height))
+        render_page_ids = [page_id for page_id in range(len(render_sizes)) if start_page_id <= page_id <= end_page_id]
+        if len(render_page_ids) == 0:
+            for width, height in render_sizes:
+                yield {"img": None, "width": width, "height": height}
+            return
+
+        workers = min(self.workers, len(render_page_ids))
+        slot_size = max(render_sizes[page_id][0] * render_sizes[page_id][1] * 3 for page_id in render_page_ids)
+        mp_context = multiprocessing.get_context("spawn")
+        results = mp_context.Queue()
+        shms, free_slots, processes = [], [], []
+        try:
+            for worker_id in range(workers):
+                shm = shared_memory.SharedMemory(create=True, size=slot_size * self.slots_per_worker)
+                shms.append(shm)
+                worker_free_slots = mp_context.Queue()
+                for slot in range(self.slots_per_worker):
+                    worker_free_slots.put(slot)
+                free_slots.append(worker_free_slots)
+                process = mp_context.Process(target=_render_worker_main,
+                                             args=(worker_id, self.__pdf_bytes, self.dpi,
+                                                   render_page_ids[worker_id::workers], shm.name, slot_size,
+                                                   worker_free_slots, results),
+                                             daemon=True)
+                process.start()
+                processes.append(process)
+            logger.info(f"render {len(render_page_ids)} pages with {workers} workers")
+
+            rendered = {}
+            for page_id, (width, height) in enumerate(render_sizes):
+                if not start_page_id <= page_id <= end_page_id:
+                    yield {"img": None, "width": width, "height": height}
+                    continue
+                while page_id not in rendered:
+                    try:
+                        worker_id, rendered_page_id, slot, error = results.get(timeout=1)
+                    except queue.Empty:
+                        dead = [process.pid for process in processes if process.exitcode not in (None, 0)]
+                        if dead:
+                            raise RuntimeError(f"render worker exited unexpectedly, pid: {dead}")
+                        continue
+                    if error is not None:
+                        raise RuntimeError(f"render worker failed:\n{error}")
+                    rendered[rendered_page_id] = (worker_id, slot)
+                worker_id, slot = rendered.pop(page_id)
+                shape = (height, width, 3)
+                img = buffer_pool.acquire(shape) if buffer_pool is not None else np.empty(shape, dtype=np.uint8)
+                np.copyto(img, _slot_view(shms[worker_id], slot, slot_size, shape))
+                free_slots[worker_id].put(slot)
+                yield {"img": img, "width": width, "height": height}
+        finally:
+            for worker_free_slots in free_slots:
+                worker_free_slots.put(None)
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+            for shm in shms:
+                shm.close()
+                shm.unlink()
+
+
+def iter_images_from_pdf_parallel(pdf_bytes: bytes, workers, dpi=200, start_page_id=0, end_page_id=None,
+                                  buffer_pool=None):
+    return ParallelPageRenderer(pdf_bytes, workers, dpi=dpi).iter_images(start_page_id, end_page_id, buffer_pool)
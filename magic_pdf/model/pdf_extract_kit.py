@@ -4,10 +4,14 @@ import time
 
 from magic_pdf.libs.Constants import *
 from magic_pdf.model.model_list import AtomicModel
+from magic_pdf.model.mfr_cache import FormulaRecognitionCache
+from magic_pdf.model.mfr_queue import FormulaRecognitionQueue
+from magic_pdf.model.table_recognizer import (TABLE_BATCH_SIZE,
+                                              TableRecognitionQueue,
+                                              TableRecognizer)
 
 os.environ['NO_ALBUMENTATIONS_UPDATE'] = '1'  # 禁止albumentations检查更新
 try:
-    import cv2
     import yaml
     import argparse
     import numpy as np
@@ -18,7 +22,7 @@ try:
         torchtext.disable_torchtext_deprecation_warning()
     from PIL import Image
     from torchvision import transforms
-    from torch.utils.data import Dataset, DataLoader
+    from torch.utils.data import Dataset
     from ultralytics import YOLO
     from unimernet.common.config import Config
     import unimernet.tasks as tasks
@@ -32,7 +36,8 @@ except ImportError as e:
     exit(1)
 
 from magic_pdf.model.pek_sub_modules.layoutlmv3.model_init import Layoutlmv3_Predictor
-from magic_pdf.model.pek_sub_modules.post_process import get_croped_image, latex_rm_whitespace
+from magic_pdf.model.pek_sub_modules.post_process import (crop_ndarray, latex_rm_whitespace, ocr_layout_regions,
+                                                          pad_crop_ndarray)
 from magic_pdf.model.pek_sub_modules.self_modify import ModifiedPaddleOCR
 from magic_pdf.model.pek_sub_modules.structeqtable.StructTableModel import StructTableModel
 from magic_pdf.model.ppTableModel import ppTableModel
@@ -176,7 +181,13 @@ class CustomPEKModel:
         self.apply_table = self.table_config.get("is_table_recog_enable", False)
         self.table_max_time = self.table_config.get("max_time", TABLE_MAX_TIME_VALUE)
         self.table_model_type = self.table_config.get("model", TABLE_MASTER)
+        self.table_enforce_max_time = self.table_config.get("enforce_max_time", True)
         self.apply_ocr = ocr
+        # ocr config，page_batch_rec为True时一页内所有区域的文本行合并成一次识别，
+        # page_det为True时整页只做一次文本检测(同时也是整页一起识别)
+        self.ocr_config = kwargs.get("ocr_config", {})
+        self.ocr_page_batch_rec = self.ocr_config.get("page_batch_rec", False)
+        self.ocr_page_det = self.ocr_config.get("page_det", False)
         logger.info(
             "DocAnalysis init, this may take some times. apply_layout: {}, apply_formula: {}, apply_ocr: {}, apply_table: {}".format(
                 self.apply_layout, self.apply_formula, self.apply_ocr, self.apply_table
@@ -210,6 +221,9 @@ class CustomPEKModel:
                 mfr_cfg_path=mfr_cfg_path,
                 device=self.device
             )
+            # 文档级公式识别队列，内容相同的公式截图直接复用缓存的识别结果
+            self.mfr_queue = FormulaRecognitionQueue(self.__mfr_predict,
+                                                     cache=FormulaRecognitionCache.from_config(mfr_weight_dir))
 
         # 初始化layout模型
         # self.layout_model = Layoutlmv3_Predictor(
@@ -237,30 +251,120 @@ class CustomPEKModel:
             table_model_dir = self.configs["weights"][self.table_model_type]
             # self.table_model = table_model_init(self.table_model_type, str(os.path.join(models_dir, table_model_dir)),
             #                                     max_time=self.table_max_time, _device_=self.device)
-            self.table_model = atom_model_manager.get_atom_model(
-                atom_model_name=AtomicModel.Table,
-                table_model_type=self.table_model_type,
-                table_model_path=str(os.path.join(models_dir, table_model_dir)),
-                table_max_time=self.table_max_time,
-                device=self.device
-            )
+            table_model_path = str(os.path.join(models_dir, table_model_dir))
+            if self.table_enforce_max_time:
+                # 表格模型加载在子进程中，单张表格超过max_time时终止子进程
+                self.table_recognizer = TableRecognizer(
+                    self.table_model_type, self.table_max_time, init_fn=table_model_init,
+                    init_args=(self.table_model_type, table_model_path, self.table_max_time, self.device)
+                )
+            else:
+                self.table_model = atom_model_manager.get_atom_model(
+                    atom_model_name=AtomicModel.Table,
+                    table_model_type=self.table_model_type,
+                    table_model_path=table_model_path,
+                    table_max_time=self.table_max_time,
+                    device=self.device
+                )
+                self.table_recognizer = TableRecognizer(self.table_model_type, self.table_max_time,
+                                                        table_model=self.table_model)
+            # 文档级表格识别队列，每batch_size张表格识别一次
+            self.table_queue = TableRecognitionQueue(self.table_recognizer,
+                                                     batch_size=self.table_config.get("batch_size", TABLE_BATCH_SIZE))
 
         logger.info('DocAnalysis init done!')
 
-    def __call__(self, image):
+    def __mfr_predict(self, mf_image_list):
+        mf_img = torch.stack([self.mfr_transform(raw_image) for raw_image in mf_image_list]).to(self.device)
+        output = self.mfr_model.generate({'image': mf_img})
+        return [latex_rm_whitespace(latex) for latex in output['pred_str']]
 
-        latex_filling_list = []
-        mf_image_list = []
+    def flush_mfr(self):
+        """
+        识别公式队列中积压的所有公式，结果写回对应的layout_res条目
+        """
+        if not self.apply_formula:
+            return
+        mfr_start = time.time()
+        formula_nums = self.mfr_queue.flush()
+        if formula_nums > 0:
+            mfr_cost = round(time.time() - mfr_start, 2)
+            logger.info(f"formula nums: {formula_nums}, mfr time: {mfr_cost}")
+
+    def clear_mfr(self):
+        """
+        丢弃公式队列中积压的公式，文档处理失败时调用，避免被下一篇文档的flush_mfr识别
+        """
+        if not self.apply_formula:
+            return
+        formula_nums = self.mfr_queue.clear()
+        if formula_nums > 0:
+            logger.warning(f"drop {formula_nums} pending formulas")
+
+    def flush_table(self):
+        """
+        识别表格队列中积压的所有表格，结果写回对应的layout_res条目
+        """
+        if not self.apply_table:
+            return
+        table_start = time.time()
+        table_nums = self.table_queue.flush()
+        if table_nums > 0:
+            table_cost = round(time.time() - table_start, 2)
+            logger.info(f"table nums: {table_nums}, table time: {table_cost}")
+
+    def clear_table(self):
+        """
+        丢弃表格队列中积压的表格，文档处理失败时调用，避免被下一篇文档的flush_table识别
+        """
+        if not self.apply_table:
+            return
+        table_nums = self.table_queue.clear()
+        if table_nums > 0:
+            logger.warning(f"drop {table_nums} pending tables")
 
-        # layout检测
+    def batch(self, images, defer_mfr=False, defer_table=False):
+        """
+        多页图片一起做layout检测和公式检测(各一次前向推理)，其余步骤仍逐页处理，返回与images顺序一致的结果
+        defer_mfr/defer_table为True时公式识别/表格识别留在队列中，由调用方在合适的时机调用flush_mfr/flush_table
+        """
         layout_start = time.time()
-        layout_res = self.layout_model(image, ignore_catids=[])
+        layout_res_list = self.layout_model.batch(images, ignore_catids=[])
         layout_cost = round(time.time() - layout_start, 2)
-        logger.info(f"layout detection cost: {layout_cost}")
+        logger.info(f"layout detection batch size: {len(images)}, cost: {layout_cost}")
 
+        # 公式检测，ultralytics对图片列表一次推理，返回逐页的结果
+        mfd_res_list = [None] * len(images)
         if self.apply_formula:
-            # 公式检测
-            mfd_res = self.mfd_model.predict(image, imgsz=1888, conf=0.25, iou=0.45, verbose=True)[0]
+            mfd_start = time.time()
+            mfd_res_list = self.mfd_model.predict(images, imgsz=1888, conf=0.25, iou=0.45, verbose=True)
+            mfd_cost = round(time.time() - mfd_start, 2)
+            logger.info(f"formula detection batch size: {len(images)}, cost: {mfd_cost}")
+
+        results = [self(image, layout_res=layout_res, mfd_res=mfd_res, defer_mfr=True, defer_table=True)
+                   for image, layout_res, mfd_res in zip(images, layout_res_list, mfd_res_list)]
+        if not defer_mfr:
+            self.flush_mfr()
+        if not defer_table:
+            self.flush_table()
+        return results
+
+    def __call__(self, image, layout_res=None, mfd_res=None, defer_mfr=False, defer_table=False):
+
+        latex_filling_list = []
+        mf_image_list = []
+
+        # layout检测，batch模式下已经提前算好
+        if layout_res is None:
+            layout_start = time.time()
+            layout_res = self.layout_model(image, ignore_catids=[])
+            layout_cost = round(time.time() - layout_start, 2)
+            logger.info(f"layout detection cost: {layout_cost}")
+
+        if self.apply_formula:
+            # 公式检测，batch模式下已经提前算好
+            if mfd_res is None:
+                mfd_res = self.mfd_model.predict(image, imgsz=1888, conf=0.25, iou=0.45, verbose=True)[0]
             for xyxy, conf, cla in zip(mfd_res.boxes.xyxy.cpu(), mfd_res.boxes.conf.cpu(), mfd_res.boxes.cls.cpu()):
                 xmin, ymin, xmax, ymax = [int(p.item()) for p in xyxy]
                 new_item = {
@@ -271,22 +375,15 @@ class CustomPEKModel:
                 }
                 layout_res.append(new_item)
                 latex_filling_list.append(new_item)
-                bbox_img = get_croped_image(Image.fromarray(image), [xmin, ymin, xmax, ymax])
+                # 公式截图要在队列中保留到整篇文档识别完，所以复制一份，不持有整页数组
+                bbox_img = Image.fromarray(crop_ndarray(image, [xmin, ymin, xmax, ymax]))
                 mf_image_list.append(bbox_img)
 
-            # 公式识别
-            mfr_start = time.time()
-            dataset = MathDataset(mf_image_list, transform=self.mfr_transform)
-            dataloader = DataLoader(dataset, batch_size=64, num_workers=0)
-            mfr_res = []
-            for mf_img in dataloader:
-                mf_img = mf_img.to(self.device)
-                output = self.mfr_model.generate({'image': mf_img})
-                mfr_res.extend(output['pred_str'])
-            for res, latex in zip(latex_filling_list, mfr_res):
-                res['latex'] = latex_rm_whitespace(latex)
-            mfr_cost = round(time.time() - mfr_start, 2)
-            logger.info(f"formula nums: {len(mf_image_list)}, mfr time: {mfr_cost}")
+            # 公式识别，公式截图放入文档级队列，按尺寸分桶后批量识别，结果写回latex_filling_list中的条目
+            for res, bbox_img in zip(latex_filling_list, mf_image_list):
+                self.mfr_queue.put(bbox_img, res)
+            if not defer_mfr:
+                self.flush_mfr()
 
         # Select regions for OCR / formula regions / table regions
         ocr_res_list = []
@@ -304,51 +401,29 @@ class CustomPEKModel:
                 table_res_list.append(res)
 
         #  Unified crop img logic
-        def crop_img(input_res, input_pil_img, crop_paste_x=0, crop_paste_y=0):
+        def crop_img(input_res, input_image, crop_paste_x=0, crop_paste_y=0):
             crop_xmin, crop_ymin = int(input_res['poly'][0]), int(input_res['poly'][1])
             crop_xmax, crop_ymax = int(input_res['poly'][4]), int(input_res['poly'][5])
-            # Create a white background with an additional width and height of 50
-            crop_new_width = crop_xmax - crop_xmin + crop_paste_x * 2
-            crop_new_height = crop_ymax - crop_ymin + crop_paste_y * 2
-            return_image = Image.new('RGB', (crop_new_width, crop_new_height), 'white')
-
-            # Crop image
             crop_box = (crop_xmin, crop_ymin, crop_xmax, crop_ymax)
-            cropped_img = input_pil_img.crop(crop_box)
-            return_image.paste(cropped_img, (crop_paste_x, crop_paste_y))
+            if crop_paste_x or crop_paste_y:
+                # Crop into a white background with an additional width and height of 50
+                return_image = pad_crop_ndarray(input_image, crop_box, crop_paste_x, crop_paste_y)
+            else:
+                # 不留白时直接返回页面数组的视图
+                return_image = crop_ndarray(input_image, crop_box)
+            crop_new_height, crop_new_width = return_image.shape[:2]
             return_list = [crop_paste_x, crop_paste_y, crop_xmin, crop_ymin, crop_xmax, crop_ymax, crop_new_width, crop_new_height]
             return return_image, return_list
 
-        pil_img = Image.fromarray(image)
-
         # ocr识别
         if self.apply_ocr:
             ocr_start = time.time()
-            # Process each area that requires OCR processing
-            for res in ocr_res_list:
-                new_image, useful_list = crop_img(res, pil_img, crop_paste_x=50, crop_paste_y=50)
-                paste_x, paste_y, xmin, ymin, xmax, ymax, new_width, new_height = useful_list
-                # Adjust the coordinates of the formula area
-                adjusted_mfdetrec_res = []
-                for mf_res in single_page_mfdetrec_res:
-                    mf_xmin, mf_ymin, mf_xmax, mf_ymax = mf_res["bbox"]
-                    # Adjust the coordinates of the formula area to the coordinates relative to the cropping area
-                    x0 = mf_xmin - xmin + paste_x
-                    y0 = mf_ymin - ymin + paste_y
-                    x1 = mf_xmax - xmin + paste_x
-                    y1 = mf_ymax - ymin + paste_y
-                    # Filter formula blocks outside the graph
-                    if any([x1 < 0, y1 < 0]) or any([x0 > new_width, y0 > new_height]):
-                        continue
-                    else:
-                        adjusted_mfdetrec_res.append({
-                            "bbox": [x0, y0, x1, y1],
-                        })
-
-                # OCR recognition
-                new_image = cv2.cvtColor(np.asarray(new_image), cv2.COLOR_RGB2BGR)
-                ocr_res = self.ocr_model.ocr(new_image, mfd_res=adjusted_mfdetrec_res)[0]
-
+            # 整页只做一次通道翻转(视图)，各区域留白截图时直接得到连续的BGR数组，不再逐区域转换颜色
+            image_bgr = image[:, :, ::-1]
+            page_ocr_res, ocr_offset_list = ocr_layout_regions(self.ocr_model, image_bgr, ocr_res_list,
+                                                               single_page_mfdetrec_res, page_det=self.ocr_page_det,
+                                                               batch_rec=self.ocr_page_batch_rec)
+            for ocr_res, (offset_x, offset_y) in zip(page_ocr_res, ocr_offset_list):
                 # Integration results
                 if ocr_res:
                     for box_ocr_res in ocr_res:
@@ -356,10 +431,10 @@ class CustomPEKModel:
                         text, score = box_ocr_res[1]
 
                         # Convert the coordinates back to the original coordinate system
-                        p1 = [p1[0] - paste_x + xmin, p1[1] - paste_y + ymin]
-                        p2 = [p2[0] - paste_x + xmin, p2[1] - paste_y + ymin]
-                        p3 = [p3[0] - paste_x + xmin, p3[1] - paste_y + ymin]
-                        p4 = [p4[0] - paste_x + xmin, p4[1] - paste_y + ymin]
+                        p1 = [p1[0] + offset_x, p1[1] + offset_y]
+                        p2 = [p2[0] + offset_x, p2[1] + offset_y]
+                        p3 = [p3[0] + offset_x, p3[1] + offset_y]
+                        p4 = [p4[0] + offset_x, p4[1] + offset_y]
 
                         print(p1+p2+p3+p4)
                         layout_res.append({
@@ -372,39 +447,13 @@ class CustomPEKModel:
             ocr_cost = round(time.time() - ocr_start, 2)
             logger.info(f"ocr cost: {ocr_cost}")
 
-        # 表格识别 table recognition
+        # 表格识别 table recognition，表格截图放入文档级队列批量识别，结果写回table_res_list中的条目
         if self.apply_table:
-            table_start = time.time()
             for res in table_res_list:
-                new_image, _ = crop_img(res, pil_img)
-                single_table_start_time = time.time()
-                logger.info("------------------table recognition processing begins-----------------")
-                latex_code = None
-                html_code = None
-                if self.table_model_type == STRUCT_EQTABLE:
-                    with torch.no_grad():
-                        latex_code = self.table_model.image2latex(new_image)[0]
-                else:
-                    html_code = self.table_model.img2html(new_image)
-
-                run_time = time.time() - single_table_start_time
-                logger.info(f"------------table recognition processing ends within {run_time}s-----")
-                if run_time > self.table_max_time:
-                    logger.warning(f"------------table recognition processing exceeds max time {self.table_max_time}s----------")
-                # 判断是否返回正常
-
-                if latex_code:
-                    expected_ending = latex_code.strip().endswith('end{tabular}') or latex_code.strip().endswith(
-                        'end{table}')
-                    if expected_ending:
-                        res["latex"] = latex_code
-                    else:
-                        logger.warning(f"------------table recognition processing fails----------")
-                elif html_code:
-                    res["html"] = html_code
-                else:
-                    logger.warning(f"------------table recognition processing fails----------")
-            table_cost = round(time.time() - table_start, 2)
-            logger.info(f"table cost: {table_cost}")
+                new_image, _ = crop_img(res, image)
+                # 表格截图同样在队列中等待批量识别，复制成独立的图片
+                self.table_queue.put(Image.fromarray(new_image), res)
+            if not defer_table:
+                self.flush_table()
 
         return layout_res
@@ -1,3 +1,5 @@
+import torch
+
 from .visualizer import Visualizer
 from .rcnn_vl import *
 from .backbone import *
@@ -130,11 +132,34 @@ class Layoutlmv3_Predictor(object):
         # page_layout_result = {
         #     "layout_dets": []
         # }
-        layout_dets = []
         outputs = self.predictor(image)
-        boxes = outputs["instances"].to("cpu")._fields["pred_boxes"].tensor.tolist()
-        labels = outputs["instances"].to("cpu")._fields["pred_classes"].tolist()
-        scores = outputs["instances"].to("cpu")._fields["scores"].tolist()
+        return self.__outputs_to_layout_dets(outputs, ignore_catids)
+
+    def batch(self, images, ignore_catids=[]):
+        """
+        多页图片一次前向推理，返回与images顺序一致的layout_dets列表
+        预处理与DefaultPredictor.__call__一致，只是把多张图片组成一个batch交给model
+        """
+        if len(images) == 0:
+            return []
+        inputs = []
+        for original_image in images:
+            if self.predictor.input_format == "RGB":
+                original_image = original_image[:, :, ::-1]
+            height, width = original_image.shape[:2]
+            image = self.predictor.aug.get_transform(original_image).apply_image(original_image)
+            image = torch.as_tensor(image.astype("float32").transpose(2, 0, 1))
+            inputs.append({"image": image, "height": height, "width": width})
+        with torch.no_grad():
+            outputs_list = self.predictor.model(inputs)
+        return [self.__outputs_to_layout_dets(outputs, ignore_catids) for outputs in outputs_list]
+
+    def __outputs_to_layout_dets(self, outputs, ignore_catids):
+        layout_dets = []
+        instances = outputs["instances"].to("cpu")
+        boxes = instances._fields["pred_boxes"].tensor.tolist()
+        labels = instances._fields["pred_classes"].tolist()
+        scores = instances._fields["scores"].tolist()
         for bbox_idx in range(len(boxes)):
             if labels[bbox_idx] in ignore_catids:
                 continue
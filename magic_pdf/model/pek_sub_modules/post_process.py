@@ -1,5 +1,9 @@
 import re
 
+import numpy as np
+
+from magic_pdf.libs.spatial_index import BboxGridIndex
+
 def layout_rm_equation(layout_res):
     rm_idxs = []
     for idx, ele in enumerate(layout_res['layout_dets']):
@@ -17,6 +21,129 @@ def get_croped_image(image_pil, bbox):
     return croped_img
 
 
+def crop_ndarray(image, bbox):
+    """
+    从 HxWxC 的页面数组中截取 bbox 区域，bbox 在页面内时返回视图不复制数据；
+    超出页面的部分与 PIL crop 一致用0填充(此时会复制)
+    """
+    x_min, y_min, x_max, y_max = [int(v) for v in bbox]
+    height, width = image.shape[:2]
+    if 0 <= x_min <= x_max <= width and 0 <= y_min <= y_max <= height:
+        return image[y_min:y_max, x_min:x_max]
+    croped_img = np.zeros((max(y_max - y_min, 0), max(x_max - x_min, 0)) + image.shape[2:], dtype=image.dtype)
+    src_x0, src_y0 = max(x_min, 0), max(y_min, 0)
+    src_x1, src_y1 = min(x_max, width), min(y_max, height)
+    if src_x0 < src_x1 and src_y0 < src_y1:
+        croped_img[src_y0 - y_min:src_y1 - y_min, src_x0 - x_min:src_x1 - x_min] = image[src_y0:src_y1, src_x0:src_x1]
+    return croped_img
+
+
+def pad_crop_ndarray(image, bbox, pad_x=0, pad_y=0, fill=255):
+    """
+    截取 bbox 区域并在四周留白 pad_x/pad_y，只分配一次输出数组，
+    与 Image.new('RGB', ..., 'white') 后 paste 截图的结果一致
+    """
+    croped_img = crop_ndarray(image, bbox)
+    crop_height, crop_width = croped_img.shape[:2]
+    padded_img = np.full((crop_height + pad_y * 2, crop_width + pad_x * 2) + image.shape[2:], fill, dtype=image.dtype)
+    padded_img[pad_y:pad_y + crop_height, pad_x:pad_x + crop_width] = croped_img
+    return padded_img
+
+
+def split_region_rec_res(region_dt_boxes, rec_res):
+    """
+    多个区域的文本行合并识别后，按每个区域的文本行数把 rec_res 切分回各个区域，
+    没有检测结果(dt_boxes为None)的区域不占用 rec_res，对应的结果为None
+    """
+    region_rec_res = []
+    rec_start = 0
+    for dt_boxes in region_dt_boxes:
+        if dt_boxes is None:
+            region_rec_res.append(None)
+            continue
+        region_rec_res.append(rec_res[rec_start: rec_start + len(dt_boxes)])
+        rec_start += len(dt_boxes)
+    return region_rec_res
+
+
+def det_boxes_union_poly(dt_boxes, offset_x=0, offset_y=0):
+    """
+    返回多个文本检测框(N x 4 x 2)的外接矩形，加上偏移转换成整页坐标，格式为 [x0, y0, x1, y0, x1, y1, x0, y1]
+    """
+    points = np.asarray(dt_boxes, dtype=np.float64).reshape(-1, 2)
+    x0, y0 = points.min(axis=0) + (offset_x, offset_y)
+    x1, y1 = points.max(axis=0) + (offset_x, offset_y)
+    return [float(v) for v in (x0, y0, x1, y0, x1, y1, x0, y1)]
+
+
+def assign_det_boxes_to_regions(dt_boxes, region_bboxes, overlap_ratio=0.5):
+    """
+    整页的文本检测框(N x 4 x 2)分给与它重叠面积占检测框面积比例最大(且超过overlap_ratio)的区域，每个检测框最多属于一个区域，
+    不属于任何区域的检测框丢弃；返回与region_bboxes等长的列表，没有检测框的区域为None
+    """
+    dt_boxes = np.asarray(dt_boxes)
+    det_bboxes = [[box[:, 0].min(), box[:, 1].min(), box[:, 0].max(), box[:, 1].max()] for box in dt_boxes]
+    region_idx = BboxGridIndex(region_bboxes).best_containers_by_overlap_ratio(det_bboxes, overlap_ratio)
+    region_dt_boxes = []
+    for index in range(len(region_bboxes)):
+        region_boxes = dt_boxes[region_idx == index]
+        region_dt_boxes.append(region_boxes if len(region_boxes) > 0 else None)
+    return region_dt_boxes
+
+
+def ocr_layout_regions(ocr_model, image_bgr, ocr_res_list, mfd_res, page_det=False, batch_rec=False, paste=50):
+    """
+    对layout中需要OCR的区域做OCR，返回 (与ocr_res_list等长的OCR结果, 每个结果的坐标到整页坐标的偏移)
+    page_det为True时整页只做一次文本检测，检测框按重叠面积分给各区域，结果已经是整页坐标，偏移为0；
+    否则各区域四周留白paste后截图分别检测，公式区域转换到截图坐标，batch_rec为True时所有区域的文本行一起识别
+    """
+    if page_det:
+        region_bboxes = [[int(res['poly'][0]), int(res['poly'][1]), int(res['poly'][4]), int(res['poly'][5])]
+                         for res in ocr_res_list]
+        page_ocr_res = ocr_model.ocr_page(np.ascontiguousarray(image_bgr), region_bboxes, mfd_res=mfd_res)
+        return page_ocr_res, [(0, 0)] * len(ocr_res_list)
+
+    # Process each area that requires OCR processing
+    ocr_image_list = []
+    ocr_mfd_res_list = []
+    ocr_offset_list = []
+    for res in ocr_res_list:
+        xmin, ymin = int(res['poly'][0]), int(res['poly'][1])
+        xmax, ymax = int(res['poly'][4]), int(res['poly'][5])
+        # Crop into a white background with an additional width and height of paste
+        new_image = pad_crop_ndarray(image_bgr, (xmin, ymin, xmax, ymax), paste, paste)
+        new_height, new_width = new_image.shape[:2]
+        # Adjust the coordinates of the formula area
+        adjusted_mfdetrec_res = []
+        for mf_res in mfd_res:
+            mf_xmin, mf_ymin, mf_xmax, mf_ymax = mf_res["bbox"]
+            # Adjust the coordinates of the formula area to the coordinates relative to the cropping area
+            x0 = mf_xmin - xmin + paste
+            y0 = mf_ymin - ymin + paste
+            x1 = mf_xmax - xmin + paste
+            y1 = mf_ymax - ymin + paste
+            # Filter formula blocks outside the graph
+            if any([x1 < 0, y1 < 0]) or any([x0 > new_width, y0 > new_height]):
+                continue
+            else:
+                adjusted_mfdetrec_res.append({
+                    "bbox": [x0, y0, x1, y1],
+                })
+
+        ocr_image_list.append(new_image)
+        ocr_mfd_res_list.append(adjusted_mfdetrec_res)
+        ocr_offset_list.append((xmin - paste, ymin - paste))
+
+    # OCR recognition
+    if batch_rec:
+        # 各区域分别做文本检测，整页的文本行一起识别
+        page_ocr_res = ocr_model.ocr_regions(ocr_image_list, ocr_mfd_res_list)
+    else:
+        page_ocr_res = [ocr_model.ocr(new_image, mfd_res=adjusted_mfdetrec_res)[0]
+                        for new_image, adjusted_mfdetrec_res in zip(ocr_image_list, ocr_mfd_res_list)]
+    return page_ocr_res, ocr_offset_list
+
+
 def latex_rm_whitespace(s: str):
     """Remove unnecessary whitespace from LaTeX code.
     """
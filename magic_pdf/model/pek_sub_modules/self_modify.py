@@ -12,6 +12,7 @@ from paddleocr.ppocr.utils.utility import check_and_read, alpha_to_color, binari
 from paddleocr.tools.infer.utility import draw_ocr_box_txt, get_rotate_crop_image, get_minarea_rect_crop
 
 from magic_pdf.libs.boxbase import __is_overlaps_y_exceeds_threshold
+from magic_pdf.model.pek_sub_modules.post_process import assign_det_boxes_to_regions, split_region_rec_res
 from magic_pdf.pre_proc.ocr_dict_merge import merge_spans_to_line
 
 logger = get_logger()
@@ -243,6 +244,15 @@ def merge_det_boxes(dt_boxes):
     return new_dt_boxes
 
 
+def preprocess_ocr_image(img, bin=False, inv=False, alpha_color=(255, 255, 255)):
+    img = alpha_to_color(img, alpha_color)
+    if inv:
+        img = cv2.bitwise_not(img)
+    if bin:
+        img = binarize_img(img)
+    return img
+
+
 class ModifiedPaddleOCR(PaddleOCR):
     def ocr(self, img, det=True, rec=True, cls=True, bin=False, inv=False, mfd_res=None, alpha_color=(255, 255, 255)):
         """
@@ -276,12 +286,7 @@ class ModifiedPaddleOCR(PaddleOCR):
             imgs = [img]
 
         def preprocess_image(_image):
-            _image = alpha_to_color(_image, alpha_color)
-            if inv:
-                _image = cv2.bitwise_not(_image)
-            if bin:
-                _image = binarize_img(_image)
-            return _image
+            return preprocess_ocr_image(_image, bin=bin, inv=inv, alpha_color=alpha_color)
 
         if det and rec:
             ocr_res = []
@@ -323,26 +328,84 @@ class ModifiedPaddleOCR(PaddleOCR):
                 return cls_res
             return ocr_res
 
-    def __call__(self, img, cls=True, mfd_res=None):
-        time_dict = {'det': 0, 'rec': 0, 'cls': 0, 'all': 0}
-
-        if img is None:
-            logger.debug("no valid image provided")
-            return None, None, time_dict
+    def ocr_regions(self, imgs, mfd_res_list, cls=True, bin=False, inv=False, alpha_color=(255, 255, 255)):
+        """
+        对同一页的多个区域分别做文本检测，所有区域检测出的文本行截图合并后只做一次方向分类和文本识别
+        返回与imgs等长的列表，每一项与 self.ocr(img, mfd_res=mfd_res)[0] 的格式相同
+        """
+        region_dt_boxes = []
+        img_crop_list = []
+        for img, mfd_res in zip(imgs, mfd_res_list):
+            img = preprocess_ocr_image(check_img(img), bin=bin, inv=inv, alpha_color=alpha_color)
+            dt_boxes, region_crop_list = self.__detect_and_crop(img, mfd_res=mfd_res)
+            region_dt_boxes.append(dt_boxes)
+            img_crop_list.extend(region_crop_list)
+        return self.__recognize_regions(region_dt_boxes, img_crop_list, cls=cls)
+
+    def ocr_page(self, img, region_bboxes, mfd_res=None, cls=True, bin=False, inv=False, alpha_color=(255, 255, 255),
+                 overlap_ratio=0.5):
+        """
+        整页只做一次文本检测，每个文本检测框分给与它重叠面积占比最大(且超过overlap_ratio)的区域，
+        之后在各区域内合并、按公式切分检测框，所有文本行一起识别
+        返回与region_bboxes等长的列表，每一项与 self.ocr(img, mfd_res=mfd_res)[0] 的格式相同，坐标为整页坐标
+        """
+        if len(region_bboxes) == 0:
+            return []
+        img = preprocess_ocr_image(check_img(img), bin=bin, inv=inv, alpha_color=alpha_color)
+        ori_im = img.copy()
+        dt_boxes, elapse = self.text_detector(img)
+        if dt_boxes is None or len(dt_boxes) == 0:
+            logger.debug("no dt_boxes found, elapsed : {}".format(elapse))
+            return [None] * len(region_bboxes)
+        logger.debug("page dt_boxes num : {}, elapsed : {}".format(len(dt_boxes), elapse))
 
-        start = time.time()
+        region_dt_boxes = []
+        img_crop_list = []
+        for region_boxes in assign_det_boxes_to_regions(dt_boxes, region_bboxes, overlap_ratio):
+            if region_boxes is None:
+                region_dt_boxes.append(None)
+                continue
+            region_boxes, region_crop_list = self.__merge_and_crop(ori_im, region_boxes, mfd_res=mfd_res)
+            region_dt_boxes.append(region_boxes)
+            img_crop_list.extend(region_crop_list)
+        return self.__recognize_regions(region_dt_boxes, img_crop_list, cls=cls)
+
+    def __recognize_regions(self, region_dt_boxes, img_crop_list, cls=True):
+        """对多个区域的文本行截图做一次方向分类和文本识别，再按每个区域的文本行数切分回各个区域"""
+        if self.use_angle_cls and cls and img_crop_list:
+            img_crop_list, angle_list, elapse = self.text_classifier(img_crop_list)
+            logger.debug("cls num  : {}, elapsed : {}".format(len(img_crop_list), elapse))
+
+        rec_res, elapse = self.text_recognizer(img_crop_list) if img_crop_list else ([], 0)
+        logger.debug("page rec_res num  : {}, regions: {}, elapsed : {}".format(
+            len(rec_res), len(region_dt_boxes), elapse))
+
+        ocr_res = []
+        for dt_boxes, region_rec_res in zip(region_dt_boxes, split_region_rec_res(region_dt_boxes, rec_res)):
+            if dt_boxes is None:
+                ocr_res.append(None)
+                continue
+            filter_boxes, filter_rec_res = self.__filter_rec_res(dt_boxes, region_rec_res)
+            if not filter_boxes and not filter_rec_res:
+                ocr_res.append(None)
+                continue
+            ocr_res.append([[box.tolist(), res] for box, res in zip(filter_boxes, filter_rec_res)])
+        return ocr_res
+
+    def __detect_and_crop(self, img, mfd_res=None):
+        """文本检测并按公式区域切分检测框，返回(dt_boxes, 文本行截图)，没有检测结果时dt_boxes为None"""
         ori_im = img.copy()
         dt_boxes, elapse = self.text_detector(img)
-        time_dict['det'] = elapse
 
         if dt_boxes is None:
             logger.debug("no dt_boxes found, elapsed : {}".format(elapse))
-            end = time.time()
-            time_dict['all'] = end - start
-            return None, None, time_dict
+            return None, []
         else:
             logger.debug("dt_boxes num : {}, elapsed : {}".format(
                 len(dt_boxes), elapse))
+        return self.__merge_and_crop(ori_im, dt_boxes, mfd_res=mfd_res)
+
+    def __merge_and_crop(self, ori_im, dt_boxes, mfd_res=None):
         img_crop_list = []
 
         dt_boxes = sorted_boxes(dt_boxes)
@@ -363,6 +426,34 @@ class ModifiedPaddleOCR(PaddleOCR):
             else:
                 img_crop = get_minarea_rect_crop(ori_im, tmp_box)
             img_crop_list.append(img_crop)
+        return dt_boxes, img_crop_list
+
+    def __filter_rec_res(self, dt_boxes, rec_res):
+        filter_boxes, filter_rec_res = [], []
+        for box, rec_result in zip(dt_boxes, rec_res):
+            text, score = rec_result
+            if score >= self.drop_score:
+                filter_boxes.append(box)
+                filter_rec_res.append(rec_result)
+        return filter_boxes, filter_rec_res
+
+    def __call__(self, img, cls=True, mfd_res=None):
+        time_dict = {'det': 0, 'rec': 0, 'cls': 0, 'all': 0}
+
+        if img is None:
+            logger.debug("no valid image provided")
+            return None, None, time_dict
+
+        start = time.time()
+        det_start = time.time()
+        dt_boxes, img_crop_list = self.__detect_and_crop(img, mfd_res=mfd_res)
+        time_dict['det'] = time.time() - det_start
+
+        if dt_boxes is None:
+            end = time.time()
+            time_dict['all'] = end - start
+            return None, None, time_dict
+
         if self.use_angle_cls and cls:
             img_crop_list, angle_list, elapse = self.text_classifier(
                 img_crop_list)
@@ -377,12 +468,7 @@ class ModifiedPaddleOCR(PaddleOCR):
         if self.args.save_crop_res:
             self.draw_crop_rec_res(self.args.crop_res_save_dir, img_crop_list,
                                    rec_res)
-        filter_boxes, filter_rec_res = [], []
-        for box, rec_result in zip(dt_boxes, rec_res):
-            text, score = rec_result
-            if score >= self.drop_score:
-                filter_boxes.append(box)
-                filter_rec_res.append(rec_result)
+        filter_boxes, filter_rec_res = self.__filter_rec_res(dt_boxes, rec_res)
         end = time.time()
         time_dict['all'] = end - start
-        return filter_boxes, filter_rec_res, time_dict
\ No newline at end of file
+        return filter_boxes, filter_rec_res, time_dict
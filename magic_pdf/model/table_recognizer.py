@@ -0,0 +1,188 @@
+import multiprocessing
+import time
+
+from loguru import logger
+
+from magic_pdf.libs.Constants import STRUCT_EQTABLE, TABLE_TIMEOUT
+
+TABLE_BATCH_SIZE = 1
+# 队列中最多积压的表格截图数，超过后立即识别一次，控制长文档的内存占用
+TABLE_MAX_PENDING = 256
+# 子进程加载表格模型的最长时间(秒)，超时或加载失败时本批表格只保留截图
+TABLE_WORKER_LOAD_TIMEOUT = 600
+
+
+def recognize_tables(table_model, table_model_type, images):
+    """返回与images等长的 [(latex_code, html_code), ...]，按模型类型只有一个有值"""
+    if table_model_type == STRUCT_EQTABLE:
+        import torch
+        with torch.no_grad():
+            latex_codes = table_model.image2latex(images)
+        return [(latex_code, None) for latex_code in latex_codes]
+    # ppTableModel 不支持batch，逐张识别
+    return [(None, table_model.img2html(image)) for image in images]
+
+
+def _table_worker_main(conn, table_model_type, init_fn, init_args):
+    table_model = init_fn(*init_args)
+    conn.send("ready")
+    while True:
+        images = conn.recv()
+        if images is None:
+            break
+        try:
+            conn.send(("ok", recognize_tables(table_model, table_model_type, images)))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+
+class TableRecognizer:
+    """带硬性时限的表格识别.
+
+    传入 init_fn 时表格模型加载在独立的子进程中，一批表格识别超过 max_time * 表格数 秒就终止子进程，
+    整批返回超时，下一批识别时重新拉起子进程；传入 table_model 时在当前进程内识别，max_time 只用于记录日志。
+    """
+
+    def __init__(self, table_model_type, max_time, table_model=None, init_fn=None, init_args=(),
+                 load_timeout=TABLE_WORKER_LOAD_TIMEOUT):
+        self.table_model_type = table_model_type
+        self.max_time = max_time
+        self.load_timeout = load_timeout
+        self.__table_model = table_model
+        self.__init_fn = init_fn
+        self.__init_args = init_args
+        self.__process = None
+        self.__conn = None
+
+    def __start_worker(self):
+        """拉起子进程并等待模型加载完成，返回是否成功"""
+        mp_context = multiprocessing.get_context("spawn")
+        self.__conn, child_conn = mp_context.Pipe()
+        self.__process = mp_context.Process(target=_table_worker_main,
+                                            args=(child_conn, self.table_model_type, self.__init_fn,
+                                                  self.__init_args),
+                                            daemon=True)
+        self.__process.start()
+        child_conn.close()
+        # 模型加载时间不计入识别时限，但不能无限等待
+        if not self.__conn.poll(self.load_timeout):
+            logger.warning(f"table recognition worker not ready in {self.load_timeout}s, "
+                           f"kill worker and fall back to image")
+            self.__stop_worker(kill=True)
+            return False
+        try:
+            self.__conn.recv()
+        except EOFError:
+            logger.warning("table recognition worker exited while loading model, fall back to image")
+            self.__stop_worker(kill=True)
+            return False
+        logger.info(f"table recognition worker started, pid: {self.__process.pid}")
+        return True
+
+    def __stop_worker(self, kill=False):
+        if self.__process is None:
+            return
+        if kill:
+            self.__process.kill()
+        else:
+            try:
+                self.__conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.__process.join()
+        self.__conn.close()
+        self.__process = None
+        self.__conn = None
+
+    def recognize(self, image):
+        """返回 (latex_code, html_code, timed_out)"""
+        return self.recognize_batch([image])[0]
+
+    def recognize_batch(self, images):
+        """返回与images等长的 [(latex_code, html_code, timed_out), ...]"""
+        deadline = self.max_time * len(images)
+        if self.__init_fn is None:
+            start = time.time()
+            results = recognize_tables(self.__table_model, self.table_model_type, images)
+            if time.time() - start > deadline:
+                logger.warning(f"table recognition exceeds max time {self.max_time}s")
+            return [(latex_code, html_code, False) for latex_code, html_code in results]
+
+        failed = [(None, None, False)] * len(images)
+        if self.__process is None or not self.__process.is_alive():
+            self.__stop_worker(kill=True)
+            if not self.__start_worker():
+                return failed
+        self.__conn.send(images)
+        if not self.__conn.poll(deadline):
+            logger.warning(f"table recognition exceeds max time {self.max_time}s, kill worker and fall back to image")
+            self.__stop_worker(kill=True)
+            return [(None, None, True)] * len(images)
+        try:
+            status, results = self.__conn.recv()
+        except EOFError:
+            logger.warning("table recognition worker exited unexpectedly")
+            self.__stop_worker(kill=True)
+            return failed
+        if status == "error":
+            logger.warning(f"table recognition failed: {results}")
+            return failed
+        return [(latex_code, html_code, False) for latex_code, html_code in results]
+
+    def close(self):
+        self.__stop_worker()
+
+
+def apply_table_result(res, latex_code, html_code, timed_out):
+    """把一张表格的识别结果写回 layout_res 条目"""
+    if timed_out:
+        # 超时的表格只保留截图，记录下来供后续处理
+        res[TABLE_TIMEOUT] = True
+    elif latex_code:
+        expected_ending = latex_code.strip().endswith('end{tabular}') or latex_code.strip().endswith(
+            'end{table}')
+        if expected_ending:
+            res["latex"] = latex_code
+        else:
+            logger.warning(f"------------table recognition processing fails----------")
+    elif html_code:
+        res["html"] = html_code
+    else:
+        logger.warning(f"------------table recognition processing fails----------")
+
+
+class TableRecognitionQueue:
+    """文档级的表格识别队列.
+
+    各页的表格截图先放进队列，统一识别时每 batch_size 张送入模型一次，结果写回放入队列时传入的 layout_res 条目。
+    """
+
+    def __init__(self, table_recognizer, batch_size=TABLE_BATCH_SIZE, max_pending=TABLE_MAX_PENDING):
+        self.__table_recognizer = table_recognizer
+        self.__batch_size = max(1, batch_size)
+        self.__max_pending = max_pending
+        self.__pending = []
+
+    def __len__(self):
+        return len(self.__pending)
+
+    def put(self, image, res):
+        self.__pending.append((image, res))
+        if len(self.__pending) >= self.__max_pending:
+            logger.info(f"table queue reaches max pending {self.__max_pending}, flush")
+            self.flush()
+
+    def flush(self):
+        """识别队列中所有表格并写回结果，返回本次识别的表格数量"""
+        pending, self.__pending = self.__pending, []
+        for batch_start in range(0, len(pending), self.__batch_size):
+            batch = pending[batch_start: batch_start + self.__batch_size]
+            results = self.__table_recognizer.recognize_batch([image for image, _ in batch])
+            for (_, res), (latex_code, html_code, timed_out) in zip(batch, results):
+                apply_table_result(res, latex_code, html_code, timed_out)
+        return len(pending)
+
+    def clear(self):
+        """丢弃队列中所有未识别的表格，返回丢弃的数量"""
+        pending, self.__pending = self.__pending, []
+        return len(pending)
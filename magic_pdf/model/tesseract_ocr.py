@@ -0,0 +1,157 @@
+import atexit
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+
+def _import_tesserocr():
+    """
+    tesseract 内部的 OpenMP 线程和区域线程池叠加会让CPU超额订阅，libgomp 只在加载时读取 OMP_THREAD_LIMIT，
+    所以只在导入 tesserocr 时设置一次，之后加载的 torch 等库(自带的libgomp)不受影响；用户已经设置时不覆盖
+    """
+    if "OMP_THREAD_LIMIT" in os.environ:
+        import tesserocr
+        return tesserocr
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    try:
+        import tesserocr
+    finally:
+        del os.environ["OMP_THREAD_LIMIT"]
+    return tesserocr
+
+
+try:
+    tesserocr = _import_tesserocr()
+except ImportError:
+    tesserocr = None
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+
+class TesseractOCR:
+    """Tesseract 区域OCR.
+
+    安装了 tesserocr 时每个工作线程持有一个常驻的 PyTessBaseAPI，traineddata 只在线程第一次识别时加载一次，
+    识别过程在 C 层释放 GIL，多个区域可以在线程池中并行识别；
+    只有 pytesseract 时退化为每个区域调用一次 tesseract 子进程。
+    识别结果为文本行级别: [{'bbox': [x0, y0, x1, y1], 'text': str, 'score': float}, ...]，坐标为输入图片的坐标。
+    """
+
+    def __init__(self, lang="por", workers=1):
+        if tesserocr is None and pytesseract is None:
+            logger.error('tesseract binding not installed, please install by "pip install tesserocr"')
+            exit(1)
+        if tesserocr is None:
+            logger.warning("tesserocr not installed, fall back to pytesseract, "
+                           "which forks a tesseract process per region")
+        self.lang = lang
+        self.workers = max(1, workers)
+        self.__local = threading.local()
+        self.__apis = []
+        self.__apis_lock = threading.Lock()
+        self.__executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tesseract") \
+            if self.workers > 1 else None
+        if tesserocr is None and self.workers > 1:
+            # pytesseract 的 tesseract 子进程继承进程的环境变量，在构造时设置一次，线程池中每个子进程只用一个OpenMP线程；
+            # 之后启动的其他子进程同样会继承，用户已经设置时不覆盖
+            os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+        # 模型是进程内单例，没有显式的销毁时机，退出时释放线程池和各线程的PyTessBaseAPI
+        atexit.register(self.close)
+
+    def __get_api(self):
+        api = getattr(self.__local, "api", None)
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(lang=self.lang)
+            self.__local.api = api
+            with self.__apis_lock:
+                self.__apis.append(api)
+        return api
+
+    def __ocr_by_api(self, image):
+        api = self.__get_api()
+        api.SetImage(image)
+        api.Recognize()
+        lines = []
+        level = tesserocr.RIL.TEXTLINE
+        iterator = api.GetIterator()
+        if iterator is None:
+            return lines
+        for line in tesserocr.iterate_level(iterator, level):
+            text = line.GetUTF8Text(level)
+            bbox = line.BoundingBox(level)
+            if bbox is None or not text or not text.strip():
+                continue
+            lines.append({
+                'bbox': list(bbox),
+                'text': text.strip(),
+                'score': round(line.Confidence(level) / 100, 2),
+            })
+        return lines
+
+    def __ocr_by_subprocess(self, image):
+        data = pytesseract.image_to_data(image, lang=self.lang, output_type=pytesseract.Output.DICT)
+        # image_to_data 输出的是词，按 (block_num, par_num, line_num) 合并成行
+        lines = {}
+        for i in range(len(data["text"])):
+            text = data["text"][i]
+            conf = float(data["conf"][i])
+            if conf < 0 or not text.strip():
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            x0, y0 = data["left"][i], data["top"][i]
+            x1, y1 = x0 + data["width"][i], y0 + data["height"][i]
+            line = lines.get(key)
+            if line is None:
+                lines[key] = {'bbox': [x0, y0, x1, y1], 'words': [text], 'confs': [conf]}
+            else:
+                line['bbox'] = [min(line['bbox'][0], x0), min(line['bbox'][1], y0),
+                                max(line['bbox'][2], x1), max(line['bbox'][3], y1)]
+                line['words'].append(text)
+                line['confs'].append(conf)
+        return [{
+            'bbox': line['bbox'],
+            'text': ' '.join(line['words']),
+            'score': round(sum(line['confs']) / len(line['confs']) / 100, 2),
+        } for line in lines.values()]
+
+    def ocr(self, image):
+        """识别一张PIL图片，返回文本行列表"""
+        if tesserocr is not None:
+            return self.__ocr_by_api(image)
+        return self.__ocr_by_subprocess(image)
+
+    def ocr_regions(self, images):
+        """识别多张区域图片，返回与images顺序一致的结果"""
+        if self.__executor is None or len(images) <= 1:
+            return [self.ocr(image) for image in images]
+        return list(self.__executor.map(self.ocr, images))
+
+    def close(self):
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+        with self.__apis_lock:
+            for api in self.__apis:
+                api.End()
+            self.__apis.clear()
+
+
+def ocr_lines_to_layout_res(lines, offset_x, offset_y):
+    """把区域截图坐标的文本行加上截图左上角在整页中的偏移，转换成整页坐标的OCR结果(category_id 15)"""
+    layout_res = []
+    for line in lines:
+        x0, y0, x1, y1 = line['bbox']
+        x0, x1 = x0 + offset_x, x1 + offset_x
+        y0, y1 = y0 + offset_y, y1 + offset_y
+        layout_res.append({
+            'category_id': 15,
+            'poly': [x0, y0, x1, y0, x1, y1, x0, y1],
+            'score': line['score'],
+            'text': line['text'],
+        })
+    return layout_res
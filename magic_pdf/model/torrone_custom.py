@@ -1,8 +1,9 @@
 from loguru import logger
 import os
 import time
+from magic_pdf.model.mfr_cache import FormulaRecognitionCache
+from magic_pdf.model.mfr_queue import FormulaRecognitionQueue
 try:
-    import cv2
     import yaml
     import argparse
     import numpy as np
@@ -18,7 +19,8 @@ try:
     from unimernet.processors import load_processor
 
     from magic_pdf.model.pek_sub_modules.layoutlmv3.model_init import Layoutlmv3_Predictor
-    from magic_pdf.model.pek_sub_modules.post_process import get_croped_image, latex_rm_whitespace
+    from magic_pdf.model.pek_sub_modules.post_process import (crop_ndarray, det_boxes_union_poly,
+                                                              latex_rm_whitespace, pad_crop_ndarray)
     from magic_pdf.model.pek_sub_modules.self_modify import ModifiedPaddleOCR
 
     from torrone.postprocessing import markdown_compatible
@@ -26,7 +28,6 @@ try:
     from torrone.utils.device import move_to_device
     import re
     from huggingface_hub import login
-    from torch.utils.data import ConcatDataset
     #albumentations 1.4.11
     #pip install timm==0.5.4 transformers==4.38.2
 
@@ -100,6 +101,9 @@ class CustomTorroneModel:
         self.apply_layout = kwargs.get("apply_layout", self.configs["config"]["layout"])
         self.apply_formula = kwargs.get("apply_formula", self.configs["config"]["formula"])
         self.apply_ocr = ocr
+        # torrone每次推理的区域数
+        self.ocr_config = kwargs.get("ocr_config", {})
+        self.torrone_batch_size = self.ocr_config.get("torrone_batch_size", 10)
         logger.info(
             "DocAnalysis init, this may take some times. apply_layout: {}, apply_formula: {}, apply_ocr: {}".format(
                 self.apply_layout, self.apply_formula, self.apply_ocr
@@ -121,6 +125,9 @@ class CustomTorroneModel:
             mfr_cfg_path = str(os.path.join(model_config_dir, "UniMERNet", "demo.yaml"))
             self.mfr_model, mfr_vis_processors = mfr_model_init(mfr_weight_dir, mfr_cfg_path, _device_=self.device)
             self.mfr_transform = transforms.Compose([mfr_vis_processors, ])
+            # 文档级公式识别队列，内容相同的公式截图直接复用缓存的识别结果
+            self.mfr_queue = FormulaRecognitionQueue(self.__mfr_predict,
+                                                     cache=FormulaRecognitionCache.from_config(mfr_weight_dir))
 
         # 初始化layout模型
         self.layout_model = Layoutlmv3_Predictor(
@@ -140,19 +147,70 @@ class CustomTorroneModel:
 
         logger.info('DocAnalysis init done!')
 
-    def __call__(self, image):
+    def __mfr_predict(self, mf_image_list):
+        mf_img = torch.stack([self.mfr_transform(raw_image) for raw_image in mf_image_list]).to(self.device)
+        output = self.mfr_model.generate({'image': mf_img})
+        return [latex_rm_whitespace(latex) for latex in output['pred_str']]
 
-        latex_filling_list = []
-        mf_image_list = []
+    def flush_mfr(self):
+        """
+        识别公式队列中积压的所有公式，结果写回对应的layout_res条目
+        """
+        if not self.apply_formula:
+            return
+        mfr_start = time.time()
+        formula_nums = self.mfr_queue.flush()
+        if formula_nums > 0:
+            mfr_cost = round(time.time() - mfr_start, 2)
+            logger.info(f"formula nums: {formula_nums}, mfr time: {mfr_cost}")
 
-        # layout检测
+    def clear_mfr(self):
+        """
+        丢弃公式队列中积压的公式，文档处理失败时调用，避免被下一篇文档的flush_mfr识别
+        """
+        if not self.apply_formula:
+            return
+        formula_nums = self.mfr_queue.clear()
+        if formula_nums > 0:
+            logger.warning(f"drop {formula_nums} pending formulas")
+
+    def batch(self, images, defer_mfr=False):
+        """
+        多页图片一起做layout检测和公式检测(各一次前向推理)，其余步骤仍逐页处理，返回与images顺序一致的结果
+        defer_mfr为True时公式识别留在队列中，由调用方在合适的时机调用flush_mfr
+        """
         layout_start = time.time()
-        layout_res = self.layout_model(image, ignore_catids=[])
+        layout_res_list = self.layout_model.batch(images, ignore_catids=[])
         layout_cost = round(time.time() - layout_start, 2)
-        logger.info(f"layout detection cost: {layout_cost}")
+        logger.info(f"layout detection batch size: {len(images)}, cost: {layout_cost}")
+
+        # 公式检测，ultralytics对图片列表一次推理，返回逐页的结果
+        mfd_start = time.time()
+        mfd_res_list = self.mfd_model.predict(images, imgsz=1888, conf=0.25, iou=0.45, verbose=True)
+        mfd_cost = round(time.time() - mfd_start, 2)
+        logger.info(f"formula detection batch size: {len(images)}, cost: {mfd_cost}")
+
+        results = [self(image, layout_res=layout_res, mfd_res=mfd_res, defer_mfr=True)
+                   for image, layout_res, mfd_res in zip(images, layout_res_list, mfd_res_list)]
+        if not defer_mfr:
+            self.flush_mfr()
+        return results
+
+    def __call__(self, image, layout_res=None, mfd_res=None, defer_mfr=False):
 
-        # 公式检测
-        mfd_res = self.mfd_model.predict(image, imgsz=1888, conf=0.25, iou=0.45, verbose=True)[0]
+        latex_filling_list = []
+        mf_image_list = []
+
+        # layout检测，batch模式下已经提前算好
+        if layout_res is None:
+            layout_start = time.time()
+            layout_res = self.layout_model(image, ignore_catids=[])
+            layout_cost = round(time.time() - layout_start, 2)
+            logger.info(f"layout detection cost: {layout_cost}")
+
+        # 公式检测，batch模式下已经提前算好
+        if mfd_res is None:
+            mfd_res = self.mfd_model.predict(image, imgsz=1888, conf=0.25, iou=0.45, verbose=True)[0]
         for xyxy, conf, cla in zip(mfd_res.boxes.xyxy.cpu(), mfd_res.boxes.conf.cpu(), mfd_res.boxes.cls.cpu()):
             xmin, ymin, xmax, ymax = [int(p.item()) for p in xyxy]
             new_item = {
@@ -163,27 +221,21 @@ class CustomTorroneModel:
             }
             layout_res.append(new_item)
             latex_filling_list.append(new_item)
-            bbox_img = get_croped_image(Image.fromarray(image), [xmin, ymin, xmax, ymax])
+            # 公式截图要在队列中保留到整篇文档识别完，所以复制一份，不持有整页数组
+            bbox_img = Image.fromarray(crop_ndarray(image, [xmin, ymin, xmax, ymax]))
             mf_image_list.append(bbox_img)
 
-        # 公式识别
-        mfr_start = time.time()
-        dataset = MathDataset(mf_image_list, transform=self.mfr_transform)
-        dataloader = DataLoader(dataset, batch_size=64, num_workers=0)
-        mfr_res = []
-        for mf_img in dataloader:
-            mf_img = mf_img.to(self.device)
-            output = self.mfr_model.generate({'image': mf_img})
-            mfr_res.extend(output['pred_str'])
-        for res, latex in zip(latex_filling_list, mfr_res):
-            res['latex'] = latex_rm_whitespace(latex)
-        mfr_cost = round(time.time() - mfr_start, 2)
-        logger.info(f"formula nums: {len(mf_image_list)}, mfr time: {mfr_cost}")
+        # 公式识别，公式截图放入文档级队列，按尺寸分桶后批量识别，结果写回latex_filling_list中的条目
+        for res, bbox_img in zip(latex_filling_list, mf_image_list):
+            self.mfr_queue.put(bbox_img, res)
+        if not defer_mfr:
+            self.flush_mfr()
 
         # ocr识别
         if self.apply_ocr:
             ocr_start = time.time()
-            pil_img = Image.fromarray(image)
+            # 整页只做一次通道翻转(视图)，文本检测的留白截图直接得到BGR数组
+            image_bgr = image[:, :, ::-1]
             single_page_mfdetrec_res = []
             
             for res in layout_res:
@@ -193,89 +245,64 @@ class CustomTorroneModel:
                     single_page_mfdetrec_res.append({
                         "bbox": [xmin, ymin, xmax, ymax],
                     })
-                    
+
+            # 只用区域的截图准备输入，不再为每个区域构造整页大小的画布
+            paste_x, paste_y = 50, 50
             torrone_samples = []
-            counter = 0
             box_list = []
-            for res in layout_res: #could use torrone in batch
+            for res in layout_res:
                 if int(res['category_id']) in [0, 1, 2, 4, 6, 7]:  # 需要进行ocr的类别
                     xmin, ymin = int(res['poly'][0]), int(res['poly'][1])
                     xmax, ymax = int(res['poly'][4]), int(res['poly'][5])
                     crop_box = (xmin, ymin, xmax, ymax)
-                    cropped_img = Image.new('RGB', pil_img.size, 'white')
-                    cropped_img.paste(pil_img.crop(crop_box), crop_box)
-                    cropped_img = cv2.cvtColor(np.asarray(cropped_img), cv2.COLOR_RGB2BGR)
-                    ocr_res = self.ocr_model.ocr(cropped_img, mfd_res=single_page_mfdetrec_res,rec=False)[0]
-                    # logger.info('First OCR res')
-                    #output torrone
-                    # logger.info(f"shape of image {image.shape}")
-                    new_image = image#cv2.cvtColor(image, cv2.COLOR_RGB2RGBA)
-                    # logger.info(f"shape of new_image {new_image.shape}")
-                    mask = np.zeros(image.shape[:2], dtype="uint8")
-                    cv2.rectangle(mask, (xmin, ymin), (xmax, ymax), 255, -1)
-                    # pil_img_array  = np.asarray(pil_img)
-                    # pil_img_array = cv2.cvtColor(pil_img_array, cv2.COLOR_RGB2RGBA)
-                    masked_img = cv2.bitwise_and(new_image, new_image, mask=mask)
-                    # masked_img = cv2.cvtColor(np.asarray(masked_img), cv2.COLOR_RGB2BGR)
-                    # logger.info(f"shape of masked_img {masked_img.shape}")
-                    
-                    data = Image.fromarray(cropped_img) #test if i can pass the cropped or if I should mask the input
-                    # logger.info('Image masked')
-                    sample = self.torrone_model.encoder.prepare_input(data)
-                    # logger.info(f"sample shape {sample.shape}")
-                    counter+=1
 
-                    if ocr_res:
-                        torrone_samples.append(torch.utils.data.TensorDataset(sample[None,...]))
-                        box_list.append(ocr_res[0])
-
-                        
+                    # 文本检测用四周留白50的截图，公式区域坐标换算到截图坐标系
+                    det_img = pad_crop_ndarray(image_bgr, crop_box, paste_x, paste_y)
+                    det_height, det_width = det_img.shape[:2]
+                    adjusted_mfdetrec_res = []
+                    for mf_res in single_page_mfdetrec_res:
+                        mf_xmin, mf_ymin, mf_xmax, mf_ymax = mf_res["bbox"]
+                        x0, y0 = mf_xmin - xmin + paste_x, mf_ymin - ymin + paste_y
+                        x1, y1 = mf_xmax - xmin + paste_x, mf_ymax - ymin + paste_y
+                        if any([x1 < 0, y1 < 0]) or any([x0 > det_width, y0 > det_height]):
+                            continue
+                        adjusted_mfdetrec_res.append({
+                            "bbox": [x0, y0, x1, y1],
+                        })
+                    ocr_res = self.ocr_model.ocr(det_img, mfd_res=adjusted_mfdetrec_res, rec=False)[0]
 
-            dataloader = torch.utils.data.DataLoader(
-                ConcatDataset(torrone_samples),
-                batch_size=10,
-                shuffle=False,
-            )
+                    if ocr_res:
+                        region_img = Image.fromarray(crop_ndarray(image, crop_box))
+                        sample = self.torrone_model.encoder.prepare_input(region_img)
+                        torrone_samples.append(sample)
+                        # 整个区域只有一段Torrone输出，用所有文本行检测框的外接矩形，转换回整页坐标
+                        box_list.append(det_boxes_union_poly(ocr_res, xmin - paste_x, ymin - paste_y))
 
             predictions = []
-            for i, sample in enumerate((dataloader)):
-                # print(sample)
-                # logger.info(f"sample shape {sample[0].shape}")
-                model_output = self.torrone_model.inference(
-                    image_tensors=sample[0], early_stopping=False
+            if torrone_samples:
+                dataloader = DataLoader(
+                    torch.utils.data.TensorDataset(torch.stack(torrone_samples)),
+                    batch_size=self.torrone_batch_size,
+                    shuffle=False,
                 )
-                predictions+=(model_output["predictions"])
-
+                for sample in dataloader:
+                    model_output = self.torrone_model.inference(
+                        image_tensors=sample[0], early_stopping=False
+                    )
+                    predictions += model_output["predictions"]
 
-            for j, box_ocr_res in enumerate(ocr_res):
-                output = predictions[j]
+            for poly, output in zip(box_list, predictions):
                 if output.strip() == "[MISSING_PAGE_POST]":
                     # uncaught repetitions -- most likely empty page
                     output_torrone = f"\n\n[MISSING_PAGE_EMPTY]\n\n"
-                # elif skipping and model_output["repeats"][j] is not None:
-                # elif False and model_output["repeats"][j] is not None:
-                #     if model_output["repeats"][j] > 0:
-                #         # If we end up here, it means the output is most likely not complete and was truncated.
-                #         output_torrone = f"\n\n[MISSING_PAGE_FAIL]\n\n"
-                #     else:
-                #         # If we end up here, it means the document page is too different from the training domain.
-                #         # This can happen e.g. for cover pages.
-                #         output_torrone = f"\n\n[MISSING_PAGE_EMPTY]\n\n"
                 else:
-                    # if markdown:
-                    if True:
-                        output = markdown_compatible(output)
-                    output_torrone = output
+                    output_torrone = markdown_compatible(output)
 
-                
                 output_torrone = re.sub(r"\n{3,}", "\n\n", output_torrone).strip()
-                print(output_torrone)
-                
-                p1, p2, p3, p4 = box_ocr_res
-                # text, score = box_ocr_res[1]
+
                 layout_res.append({
                     'category_id': 15,
-                    'poly': p1 + p2 + p3 + p4,
+                    'poly': poly,
                     'score': round(1, 2),
                     'text': output_torrone,
                 })
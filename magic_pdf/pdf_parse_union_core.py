@@ -1,13 +1,19 @@
+import copy
+import multiprocessing
+import pickle
 import time
+from concurrent.futures import ProcessPoolExecutor
 
 from loguru import logger
 
-from magic_pdf.libs.commons import fitz, get_delta_time
+from magic_pdf.libs.commons import fitz, fitz_lock, get_delta_time
+from magic_pdf.libs.config_reader import get_parse_config
 from magic_pdf.layout.layout_sort import get_bboxes_layout, LAYOUT_UNPROC, get_columns_cnt_of_layout
 from magic_pdf.libs.convert_utils import dict_to_list
 from magic_pdf.libs.drop_reason import DropReason
 from magic_pdf.libs.hash_utils import compute_md5
 from magic_pdf.libs.local_math import float_equal
+from magic_pdf.libs.prefetch_utils import prefetch_iter
 from magic_pdf.libs.ocr_content_type import ContentType
 from magic_pdf.model.magic_model import MagicModel
 from magic_pdf.para.para_split_v2 import para_split
@@ -15,7 +21,7 @@ from magic_pdf.pre_proc.citationmarker_remove import remove_citation_marker
 from magic_pdf.pre_proc.construct_page_dict import ocr_construct_page_component_v2
 from magic_pdf.pre_proc.cut_image import ocr_cut_image_and_table
 from magic_pdf.pre_proc.equations_replace import remove_chars_in_text_blocks, replace_equations_in_textblock, \
-    combine_chars_to_pymudict
+    fill_span_text_from_chars
 from magic_pdf.pre_proc.ocr_detect_all_bboxes import ocr_prepare_bboxes_for_layout_split
 from magic_pdf.pre_proc.ocr_dict_merge import sort_blocks_by_layout, fill_spans_in_blocks, fix_block_spans, \
     fix_discarded_block
@@ -59,11 +65,11 @@ Drawback: This issue is only observed in English text; it has not been found in
 
 
 def txt_spans_extract(pdf_page, inline_equations, interline_equations):
-    text_raw_blocks = pdf_page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]
+    # 只取一次rawdict，span的text由chars拼出，省掉一遍dict的解析
     char_level_text_blocks = pdf_page.get_text("rawdict", flags=fitz.TEXTFLAGS_TEXT)[
         "blocks"
     ]
-    text_blocks = combine_chars_to_pymudict(text_raw_blocks, char_level_text_blocks)
+    text_blocks = fill_span_text_from_chars(char_level_text_blocks)
     text_blocks = replace_equations_in_textblock(
         text_blocks, inline_equations, interline_equations
     )
@@ -207,6 +213,48 @@ def parse_page_core(pdf_docs, magic_model, page_id, pdf_bytes_md5, imageWriter,
     return page_info
 
 
+# 多进程解析时每个worker进程自己持有的pdf文档和magic_model
+_parse_worker_state = {}
+
+
+def _init_parse_worker(pdf_bytes, model_list, pdf_bytes_md5, imageWriter, parse_mode):
+    pdf_docs = fitz.open("pdf", pdf_bytes)
+    _parse_worker_state.update(
+        pdf_docs=pdf_docs,
+        magic_model=MagicModel(model_list, pdf_docs),
+        pdf_bytes_md5=pdf_bytes_md5,
+        imageWriter=imageWriter,
+        parse_mode=parse_mode,
+    )
+
+
+def _parse_page_in_worker(page_id):
+    state = _parse_worker_state
+    return parse_page_core(state["pdf_docs"], state["magic_model"], page_id, state["pdf_bytes_md5"],
+                           state["imageWriter"], state["parse_mode"])
+
+
+def _is_picklable(obj):
+    try:
+        pickle.dumps(obj)
+        return True
+    except Exception:
+        return False
+
+
+def parse_pages_parallel(pdf_bytes, model_list, page_ids, pdf_bytes_md5, imageWriter, parse_mode, parse_workers):
+    """用进程池并行执行parse_page_core，返回与page_ids顺序一致的page_info列表.
+
+    每个worker进程从pdf_bytes重新打开文档并构造自己的MagicModel，页面之间互不依赖，所以结果与顺序解析一致。
+    """
+    # spawn启动的worker不会继承父进程中模型推理、渲染等线程的状态
+    mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(parse_workers, len(page_ids)), mp_context=mp_context,
+                             initializer=_init_parse_worker,
+                             initargs=(pdf_bytes, model_list, pdf_bytes_md5, imageWriter, parse_mode)) as executor:
+        return list(executor.map(_parse_page_in_worker, page_ids))
+
+
 def pdf_parse_union(pdf_bytes,
                     model_list,
                     imageWriter,
@@ -214,6 +262,7 @@ def pdf_parse_union(pdf_bytes,
                     start_page_id=0,
                     end_page_id=None,
                     debug_mode=False,
+                    parse_workers=None,
                     ):
     pdf_bytes_md5 = compute_md5(pdf_bytes)
     pdf_docs = fitz.open("pdf", pdf_bytes)
@@ -221,9 +270,6 @@ def pdf_parse_union(pdf_bytes,
     '''初始化空的pdf_info_dict'''
     pdf_info_dict = {}
 
-    '''用model_list和docs对象初始化magic_model'''
-    magic_model = MagicModel(model_list, pdf_docs)
-
     '''根据输入的起始范围解析pdf'''
     # end_page_id = end_page_id if end_page_id else len(pdf_docs) - 1
     end_page_id = end_page_id if end_page_id is not None and end_page_id >= 0 else len(pdf_docs) - 1
@@ -232,12 +278,32 @@ def pdf_parse_union(pdf_bytes,
         logger.warning("end_page_id is out of range, use pdf_docs length")
         end_page_id = len(pdf_docs) - 1
 
+    '''parse_workers大于1时用多进程并行解析页面'''
+    if parse_workers is None:
+        parse_workers = get_parse_config().get("parse_workers", 0)
+    parse_page_ids = [page_id for page_id in range(len(pdf_docs)) if start_page_id <= page_id <= end_page_id]
+    use_parallel = parse_workers > 1 and len(parse_page_ids) > 1
+    if use_parallel and not _is_picklable(imageWriter):
+        logger.warning(f"{type(imageWriter).__name__} can not be pickled, fall back to sequential page parsing")
+        use_parallel = False
+
     '''初始化启动时间'''
     start_time = time.time()
 
+    if use_parallel:
+        parsed_page_infos = dict(zip(parse_page_ids, parse_pages_parallel(
+            pdf_bytes, model_list, parse_page_ids, pdf_bytes_md5, imageWriter, parse_mode, parse_workers)))
+        if debug_mode:
+            logger.info(f"parse {len(parse_page_ids)} pages with {parse_workers} workers, "
+                        f"cost_time: {get_delta_time(start_time)}")
+    else:
+        '''用model_list和docs对象初始化magic_model'''
+        magic_model = MagicModel(model_list, pdf_docs)
+        parsed_page_infos = None
+
     for page_id, page in enumerate(pdf_docs):
         '''debug时输出每页解析的耗时'''
-        if debug_mode:
+        if debug_mode and not use_parallel:
             time_now = time.time()
             logger.info(
                 f"page_id: {page_id}, last_page_cost_time: {get_delta_time(start_time)}"
@@ -246,15 +312,26 @@ def pdf_parse_union(pdf_bytes,
 
         '''解析pdf中的每一页'''
         if start_page_id <= page_id <= end_page_id:
-            page_info = parse_page_core(pdf_docs, magic_model, page_id, pdf_bytes_md5, imageWriter, parse_mode)
+            if use_parallel:
+                page_info = parsed_page_infos[page_id]
+            else:
+                page_info = parse_page_core(pdf_docs, magic_model, page_id, pdf_bytes_md5, imageWriter, parse_mode)
         else:
-            page_w = page.rect.width
-            page_h = page.rect.height
-            page_info = ocr_construct_page_component_v2([], [], page_id, page_w, page_h, [],
-                                                [], [], [], [],
-                                                True, "skip page")
+            page_info = construct_skip_page_info(page, page_id)
         pdf_info_dict[f"page_{page_id}"] = page_info
 
+    return finish_pdf_info(pdf_info_dict, debug_mode)
+
+
+def construct_skip_page_info(page, page_id):
+    page_w = page.rect.width
+    page_h = page.rect.height
+    return ocr_construct_page_component_v2([], [], page_id, page_w, page_h, [],
+                                           [], [], [], [],
+                                           True, "skip page")
+
+
+def finish_pdf_info(pdf_info_dict, debug_mode=False):
     """分段"""
     para_split(pdf_info_dict, debug_mode=debug_mode)
 
@@ -267,5 +344,61 @@ def pdf_parse_union(pdf_bytes,
     return new_pdf_info_dict
 
 
+def pdf_parse_union_pipelined(pdf_bytes,
+                              model_pages,
+                              imageWriter,
+                              parse_mode,
+                              start_page_id=0,
+                              end_page_id=None,
+                              debug_mode=False,
+                              queue_size=2,
+                              ):
+    """流水线解析，结果与 pdf_parse_union 一致.
+
+    model_pages 是按页码顺序产出整篇文档每一页模型结果的迭代器(如 iter_doc_analyze 的输出)，
+    在后台线程中消费，最多领先解析 queue_size 页；每页的模型结果一到就单独构造该页的MagicModel并解析，
+    所有页面解析完之后再跨页分段。返回 (pdf_info_dict, model_list)，model_list 是被解析修改之前的模型结果。
+    页面按到达顺序在一个线程中逐页解析，与 parse_workers 多进程解析互斥，不读取 parse-config.parse_workers。
+    解析和 model_pages 中的页面渲染在不同线程中，所有fitz调用都要持有fitz_lock。
+    """
+    pdf_bytes_md5 = compute_md5(pdf_bytes)
+    with fitz_lock:
+        pdf_docs = fitz.open("pdf", pdf_bytes)
+    pages = prefetch_iter(model_pages, queue_size)
+    try:
+        end_page_id = end_page_id if end_page_id is not None and end_page_id >= 0 else len(pdf_docs) - 1
+        if end_page_id > len(pdf_docs) - 1:
+            logger.warning("end_page_id is out of range, use pdf_docs length")
+            end_page_id = len(pdf_docs) - 1
+
+        pdf_info_dict = {}
+        model_list = []
+        start_time = time.time()
+        for page_dict in pages:
+            page_id = page_dict['page_info']['page_no']
+            # MagicModel会原地修改模型结果，保留一份原始结果
+            model_list.append(copy.deepcopy(page_dict))
+            with fitz_lock:
+                if start_page_id <= page_id <= end_page_id:
+                    '''MagicModel的修正都是按页进行的，只用这一页的模型结果构造'''
+                    magic_model = MagicModel([page_dict], pdf_docs)
+                    page_info = parse_page_core(pdf_docs, magic_model, page_id, pdf_bytes_md5, imageWriter,
+                                                parse_mode)
+                    del magic_model
+                    if debug_mode:
+                        logger.info(f"page_id: {page_id}, parse cost_time: {get_delta_time(start_time)}")
+                        start_time = time.time()
+                else:
+                    page_info = construct_skip_page_info(pdf_docs[page_id], page_id)
+            pdf_info_dict[f"page_{page_id}"] = page_info
+    finally:
+        # 解析失败时立即停止推理并关闭model_pages，不等异常的traceback释放后才由GC回收
+        pages.close()
+        with fitz_lock:
+            pdf_docs.close()
+
+    return finish_pdf_info(pdf_info_dict, debug_mode), model_list
+
+
 if __name__ == '__main__':
     pass
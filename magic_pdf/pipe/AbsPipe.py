@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 
-from magic_pdf.dict2md.ocr_mkcontent import union_make
+from magic_pdf.dict2md.ocr_mkcontent import union_make, union_make_markdown_and_content_list
 from magic_pdf.filter.pdf_classify_by_type import classify
 from magic_pdf.filter.pdf_meta_scan import pdf_meta_scan
 from magic_pdf.libs.MakeContentConfig import MakeMode, DropMode
@@ -50,14 +50,31 @@ class AbsPipe(ABC):
         """
         raise NotImplementedError
 
+    def pipe_analyze_and_parse(self):
+        """
+        有状态的跑模型分析并解析，默认依次执行，子类可以让推理和解析流水线执行
+        """
+        self.pipe_analyze()
+        self.pipe_parse()
+
     def pipe_mk_uni_format(self, img_parent_path: str, drop_mode=DropMode.WHOLE_PDF):
-        content_list = AbsPipe.mk_uni_format(self.get_compress_pdf_mid_data(), img_parent_path, drop_mode)
+        # 进程内直接使用pdf_mid_data，不需要先压缩再解压(union_make不会修改pdf_info)
+        content_list = union_make(self.pdf_mid_data["pdf_info"], MakeMode.STANDARD_FORMAT, drop_mode, img_parent_path)
         return content_list
 
     def pipe_mk_markdown(self, img_parent_path: str, drop_mode=DropMode.WHOLE_PDF, md_make_mode=MakeMode.MM_MD):
-        md_content = AbsPipe.mk_markdown(self.get_compress_pdf_mid_data(), img_parent_path, drop_mode, md_make_mode)
+        md_content = union_make(self.pdf_mid_data["pdf_info"], md_make_mode, drop_mode, img_parent_path)
         return md_content
 
+    def pipe_mk_markdown_and_uni_format(self, img_parent_path: str, drop_mode=DropMode.WHOLE_PDF,
+                                        md_make_mode=MakeMode.MM_MD):
+        """
+        一次遍历pdf_info同时生成markdown和content_list
+        """
+        md_content, content_list = union_make_markdown_and_content_list(
+            self.pdf_mid_data["pdf_info"], md_make_mode, drop_mode, img_parent_path)
+        return md_content, content_list
+
     @staticmethod
     def classify(pdf_bytes: bytes) -> str:
         """
@@ -91,6 +108,7 @@ class AbsPipe(ABC):
     def mk_uni_format(compressed_pdf_mid_data: str, img_buket_path: str, drop_mode=DropMode.WHOLE_PDF) -> list:
         """
         根据pdf类型，生成统一格式content_list
+        输入为压缩后的中间数据，用于跨进程/序列化传递的场景，进程内请使用pipe_mk_uni_format
         """
         pdf_mid_data = JsonCompressor.decompress_json(compressed_pdf_mid_data)
         pdf_info_list = pdf_mid_data["pdf_info"]
@@ -101,6 +119,7 @@ class AbsPipe(ABC):
     def mk_markdown(compressed_pdf_mid_data: str, img_buket_path: str, drop_mode=DropMode.WHOLE_PDF, md_make_mode=MakeMode.MM_MD) -> list:
         """
         根据pdf类型，markdown
+        输入为压缩后的中间数据，用于跨进程/序列化传递的场景，进程内请使用pipe_mk_markdown
         """
         pdf_mid_data = JsonCompressor.decompress_json(compressed_pdf_mid_data)
         pdf_info_list = pdf_mid_data["pdf_info"]
@@ -4,7 +4,7 @@ from magic_pdf.libs.MakeContentConfig import DropMode, MakeMode
 from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze
 from magic_pdf.rw.AbsReaderWriter import AbsReaderWriter
 from magic_pdf.pipe.AbsPipe import AbsPipe
-from magic_pdf.user_api import parse_ocr_pdf
+from magic_pdf.user_api import parse_ocr_pdf, analyze_and_parse_pdf, PARSE_TYPE_OCR
 
 
 class OCRPipe(AbsPipe):
@@ -24,6 +24,12 @@ class OCRPipe(AbsPipe):
         self.pdf_mid_data = parse_ocr_pdf(self.pdf_bytes, self.model_list, self.image_writer, is_debug=self.is_debug,
                                           start_page_id=self.start_page_id, end_page_id=self.end_page_id)
 
+    def pipe_analyze_and_parse(self):
+        # 渲染、推理、解析流水线执行
+        self.pdf_mid_data, self.model_list = analyze_and_parse_pdf(
+            self.pdf_bytes, self.image_writer, PARSE_TYPE_OCR, is_debug=self.is_debug,
+            start_page_id=self.start_page_id, end_page_id=self.end_page_id)
+
     def pipe_mk_uni_format(self, img_parent_path: str, drop_mode=DropMode.WHOLE_PDF):
         result = super().pipe_mk_uni_format(img_parent_path, drop_mode)
         logger.info("ocr_pipe mk content list finished")
@@ -33,3 +39,9 @@ class OCRPipe(AbsPipe):
         result = super().pipe_mk_markdown(img_parent_path, drop_mode, md_make_mode)
         logger.info(f"ocr_pipe mk {md_make_mode} finished")
         return result
+
+    def pipe_mk_markdown_and_uni_format(self, img_parent_path: str, drop_mode=DropMode.WHOLE_PDF,
+                                        md_make_mode=MakeMode.MM_MD):
+        result = super().pipe_mk_markdown_and_uni_format(img_parent_path, drop_mode, md_make_mode)
+        logger.info(f"ocr_pipe mk {md_make_mode} and content list finished")
+        return result
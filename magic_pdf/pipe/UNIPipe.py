@@ -8,7 +8,8 @@ from magic_pdf.rw.AbsReaderWriter import AbsReaderWriter
 from magic_pdf.rw.DiskReaderWriter import DiskReaderWriter
 from magic_pdf.libs.commons import join_path
 from magic_pdf.pipe.AbsPipe import AbsPipe
-from magic_pdf.user_api import parse_union_pdf, parse_ocr_pdf
+from magic_pdf.user_api import parse_union_pdf, parse_ocr_pdf, analyze_and_parse_union_pdf, analyze_and_parse_pdf, \
+    PARSE_TYPE_OCR
 
 
 class UNIPipe(AbsPipe):
@@ -43,6 +44,18 @@ class UNIPipe(AbsPipe):
                                               is_debug=self.is_debug,
                                               start_page_id=self.start_page_id, end_page_id=self.end_page_id)
 
+    def pipe_analyze_and_parse(self):
+        # 渲染、推理、解析流水线执行。txt模式解析失败回退到ocr模式时，self.model_list 是ocr模式重新推理的结果，
+        # 而依次调用pipe_analyze和pipe_parse时 self.model_list 仍是txt模式的推理结果，这种情况下两者不一致
+        if self.pdf_type == self.PIP_TXT:
+            self.pdf_mid_data, self.model_list = analyze_and_parse_union_pdf(
+                self.pdf_bytes, self.image_writer, is_debug=self.is_debug,
+                start_page_id=self.start_page_id, end_page_id=self.end_page_id)
+        elif self.pdf_type == self.PIP_OCR:
+            self.pdf_mid_data, self.model_list = analyze_and_parse_pdf(
+                self.pdf_bytes, self.image_writer, PARSE_TYPE_OCR, is_debug=self.is_debug,
+                start_page_id=self.start_page_id, end_page_id=self.end_page_id)
+
     def pipe_mk_uni_format(self, img_parent_path: str, drop_mode=DropMode.WHOLE_PDF):
         result = super().pipe_mk_uni_format(img_parent_path, drop_mode)
         logger.info("uni_pipe mk content list finished")
@@ -53,6 +66,12 @@ class UNIPipe(AbsPipe):
         logger.info(f"uni_pipe mk {md_make_mode} finished")
         return result
 
+    def pipe_mk_markdown_and_uni_format(self, img_parent_path: str, drop_mode=DropMode.WHOLE_PDF,
+                                        md_make_mode=MakeMode.MM_MD):
+        result = super().pipe_mk_markdown_and_uni_format(img_parent_path, drop_mode, md_make_mode)
+        logger.info(f"uni_pipe mk {md_make_mode} and content list finished")
+        return result
+
 
 if __name__ == '__main__':
     # 测试
@@ -40,6 +40,18 @@ def combine_chars_to_pymudict(block_dict, char_dict):
     return block_dict
 
 
+def fill_span_text_from_chars(char_level_blocks):
+    """
+    给rawdict结构的span补上text字段，得到与combine_chars_to_pymudict相同的结构(dict的字段 + chars)
+    dict和rawdict出自同一个TextPage，span的text就是chars拼接起来的结果，不必再解析一次dict
+    """
+    for block in char_level_blocks:
+        for line in block["lines"]:
+            for span in line["spans"]:
+                span["text"] = "".join(char["c"] for char in span["chars"])
+    return char_level_blocks
+
+
 def calculate_overlap_area_2_minbox_area_ratio(bbox1, min_bbox):
     """
     计算box1和box2的重叠面积占最小面积的box的比例
@@ -1,7 +1,8 @@
+import numpy as np
 from loguru import logger
 
-from magic_pdf.libs.boxbase import get_minbox_if_overlap_by_ratio, calculate_overlap_area_in_bbox1_area_ratio, \
-    calculate_iou
+from magic_pdf.libs.boxbase import get_minbox_if_overlap_by_ratio
+from magic_pdf.libs.boxbase_batch import batch_iou, batch_overlap_area_in_bbox1_area_ratio
 from magic_pdf.libs.drop_tag import DropTag
 from magic_pdf.libs.ocr_content_type import BlockType
 from magic_pdf.pre_proc.remove_bbox_overlap import remove_overlap_between_bbox_for_block
@@ -73,13 +74,11 @@ def fix_interline_equation_overlap_text_blocks_with_hi_iou(all_bboxes):
 
     need_remove = []
 
-    for interline_equation_block in interline_equation_blocks:
-        for text_block in text_blocks:
-            interline_equation_block_bbox = interline_equation_block[:4]
-            text_block_bbox = text_block[:4]
-            if calculate_iou(interline_equation_block_bbox, text_block_bbox) > 0.8:
-                if text_block not in need_remove:
-                    need_remove.append(text_block)
+    iou_matrix = batch_iou([block[:4] for block in interline_equation_blocks], [block[:4] for block in text_blocks])
+    for _, j in zip(*np.nonzero(iou_matrix > 0.8)):
+        text_block = text_blocks[j]
+        if text_block not in need_remove:
+            need_remove.append(text_block)
 
     if len(need_remove) > 0:
         for block in need_remove:
@@ -101,13 +100,11 @@ def fix_text_overlap_title_blocks(all_bboxes):
 
     need_remove = []
 
-    for text_block in text_blocks:
-        for title_block in title_blocks:
-            text_block_bbox = text_block[:4]
-            title_block_bbox = title_block[:4]
-            if calculate_iou(text_block_bbox, title_block_bbox) > 0.8:
-                if title_block not in need_remove:
-                    need_remove.append(title_block)
+    iou_matrix = batch_iou([block[:4] for block in text_blocks], [block[:4] for block in title_blocks])
+    for _, j in zip(*np.nonzero(iou_matrix > 0.8)):
+        title_block = title_blocks[j]
+        if title_block not in need_remove:
+            need_remove.append(title_block)
 
     if len(need_remove) > 0:
         for block in need_remove:
@@ -118,13 +115,11 @@ def fix_text_overlap_title_blocks(all_bboxes):
 
 def remove_need_drop_blocks(all_bboxes, discarded_blocks):
     need_remove = []
-    for block in all_bboxes:
-        for discarded_block in discarded_blocks:
-            block_bbox = block[:4]
-            if calculate_overlap_area_in_bbox1_area_ratio(block_bbox, discarded_block['bbox']) > 0.6:
-                if block not in need_remove:
-                    need_remove.append(block)
-                    break
+    discarded_bboxes = [discarded_block['bbox'] for discarded_block in discarded_blocks]
+    overlap_ratio = batch_overlap_area_in_bbox1_area_ratio([block[:4] for block in all_bboxes], discarded_bboxes)
+    for block, overlap_discarded in zip(all_bboxes, (overlap_ratio > 0.6).any(axis=1)):
+        if overlap_discarded and block not in need_remove:
+            need_remove.append(block)
 
     if len(need_remove) > 0:
         for block in need_remove:
@@ -135,6 +130,7 @@ def remove_need_drop_blocks(all_bboxes, discarded_blocks):
 def remove_overlaps_min_blocks(all_bboxes):
     #  重叠block，小的不能直接删除，需要和大的那个合并成一个更大的。
     #  删除重叠blocks中较小的那些
+    #  合并会在遍历过程中修改block的bbox，后续比较依赖修改后的结果，所以这里保持逐对比较
     need_remove = []
     for block1 in all_bboxes:
         for block2 in all_bboxes:
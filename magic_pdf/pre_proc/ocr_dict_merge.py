@@ -1,8 +1,12 @@
+from loguru import logger
+
 from magic_pdf.libs.boxbase import (__is_overlaps_y_exceeds_threshold,
                                     _is_in_or_part_overlap_with_area_ratio,
                                     calculate_overlap_area_in_bbox1_area_ratio)
+from magic_pdf.libs.Constants import TABLE_TIMEOUT
 from magic_pdf.libs.drop_tag import DropTag
 from magic_pdf.libs.ocr_content_type import BlockType, ContentType
+from magic_pdf.libs.spatial_index import BboxGridIndex
 
 
 # 将每一个line中的span从左到右排序
@@ -68,20 +72,22 @@ def merge_spans_to_line_by_layout(spans, layout_bboxes):
     lines = []
     new_spans = []
     dropped_spans = []
-    for item in layout_bboxes:
-        layout_bbox = item['layout_bbox']
-        # 遍历spans,将每个span放入对应的layout中
-        layout_sapns = []
-        for span in spans:
-            if calculate_overlap_area_in_bbox1_area_ratio(
-                    span['bbox'], layout_bbox) > 0.6:
-                layout_sapns.append(span)
-        # 如果layout_sapns不为空，则放入new_spans中
+    # 每个span放入第一个与之重叠比例 > 0.6 的layout中
+    layout_index = BboxGridIndex([item['layout_bbox'] for item in layout_bboxes])
+    span_layout_idx = layout_index.first_containers_by_overlap_ratio([span['bbox'] for span in spans], 0.6)
+    layout_spans_list = [[] for _ in layout_bboxes]
+    not_in_layout_spans = []
+    for span, layout_idx in zip(spans, span_layout_idx):
+        if layout_idx >= 0:
+            layout_spans_list[layout_idx].append(span)
+        else:
+            not_in_layout_spans.append(span)
+    # 如果layout_sapns不为空，则放入new_spans中
+    for layout_sapns in layout_spans_list:
         if len(layout_sapns) > 0:
             new_spans.append(layout_sapns)
-            # 从spans删除已经放入layout_sapns中的span
-            for layout_sapn in layout_sapns:
-                spans.remove(layout_sapn)
+    # 从spans删除已经放入layout中的span
+    spans[:] = not_in_layout_spans
 
     if len(new_spans) > 0:
         for layout_sapns in new_spans:
@@ -112,26 +118,23 @@ def merge_lines_to_block(lines):
 def sort_blocks_by_layout(all_bboxes, layout_bboxes):
     new_blocks = []
     sort_blocks = []
-    for item in layout_bboxes:
-        layout_bbox = item['layout_bbox']
-
-        # 遍历blocks,将每个blocks放入对应的layout中
-        layout_blocks = []
-        for block in all_bboxes:
-            # 如果是footnote则跳过
-            if block[7] == BlockType.Footnote:
-                continue
-            block_bbox = block[:4]
-            if calculate_overlap_area_in_bbox1_area_ratio(
-                    block_bbox, layout_bbox) > 0.8:
-                layout_blocks.append(block)
-
-        # 如果layout_blocks不为空，则放入new_blocks中
+    # 每个block(footnote除外)放入第一个与之重叠比例 > 0.8 的layout中
+    layout_index = BboxGridIndex([item['layout_bbox'] for item in layout_bboxes])
+    candidate_blocks = [block for block in all_bboxes if block[7] != BlockType.Footnote]
+    block_layout_idx = layout_index.first_containers_by_overlap_ratio([block[:4] for block in candidate_blocks], 0.8)
+    layout_blocks_list = [[] for _ in layout_bboxes]
+    assigned_block_ids = set()
+    for block, layout_idx in zip(candidate_blocks, block_layout_idx):
+        if layout_idx >= 0:
+            layout_blocks_list[layout_idx].append(block)
+            assigned_block_ids.add(id(block))
+
+    # 如果layout_blocks不为空，则放入new_blocks中
+    for layout_blocks in layout_blocks_list:
         if len(layout_blocks) > 0:
             new_blocks.append(layout_blocks)
-            # 从all_bboxes删除已经放入layout_blocks中的block
-            for layout_block in layout_blocks:
-                all_bboxes.remove(layout_block)
+    # 从all_bboxes删除已经放入layout_blocks中的block
+    all_bboxes[:] = [block for block in all_bboxes if id(block) not in assigned_block_ids]
 
     # 如果new_blocks不为空，则对new_blocks中每个block进行排序
     if len(new_blocks) > 0:
@@ -147,19 +150,24 @@ def sort_blocks_by_layout(all_bboxes, layout_bboxes):
 def fill_spans_in_blocks(blocks, spans, radio):
     """将allspans中的span按位置关系，放入blocks中."""
     block_with_spans = []
-    for block in blocks:
+    # 每个span放入第一个与之重叠比例 > radio 的block中
+    block_index = BboxGridIndex([block[0:4] for block in blocks])
+    span_block_idx = block_index.first_containers_by_overlap_ratio([span['bbox'] for span in spans], radio)
+    block_spans_list = [[] for _ in blocks]
+    not_in_block_spans = []
+    for span, block_idx in zip(spans, span_block_idx):
+        if block_idx >= 0:
+            block_spans_list[block_idx].append(span)
+        else:
+            not_in_block_spans.append(span)
+
+    for block, block_spans in zip(blocks, block_spans_list):
         block_type = block[7]
         block_bbox = block[0:4]
         block_dict = {
             'type': block_type,
             'bbox': block_bbox,
         }
-        block_spans = []
-        for span in spans:
-            span_bbox = span['bbox']
-            if calculate_overlap_area_in_bbox1_area_ratio(
-                    span_bbox, block_bbox) > radio:
-                block_spans.append(span)
         '''行内公式调整, 高度调整至与同行文字高度一致(优先左侧, 其次右侧)'''
         # displayed_list = []
         # text_inline_lines = []
@@ -172,10 +180,8 @@ def fill_spans_in_blocks(blocks, spans, radio):
         block_dict['spans'] = block_spans
         block_with_spans.append(block_dict)
 
-        # 从spans删除已经放入block_spans中的span
-        if len(block_spans) > 0:
-            for span in block_spans:
-                spans.remove(span)
+    # 从spans删除已经放入block_spans中的span
+    spans[:] = not_in_block_spans
 
     return block_with_spans, spans
 
@@ -282,6 +288,11 @@ def fix_table_block(block, table_blocks):
             for span in block['spans']:
                 if span['type'] == ContentType.Table and table_block[
                         'table_body_bbox'] == span['bbox']:
+                    if span.get(TABLE_TIMEOUT, False):
+                        # 表格识别超时，不使用可能不完整的识别结果，表格只输出截图
+                        span.pop('latex', None)
+                        span.pop('html', None)
+                        logger.warning(f"table recognition timed out, use image only, bbox: {span['bbox']}")
                     # 创建table_body_block
                     table_body_block = make_body_block(
                         span, table_block['table_body_bbox'],
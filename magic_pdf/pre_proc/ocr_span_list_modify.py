@@ -1,7 +1,9 @@
 from loguru import logger
 
-from magic_pdf.libs.boxbase import calculate_overlap_area_in_bbox1_area_ratio, get_minbox_if_overlap_by_ratio, \
-    __is_overlaps_y_exceeds_threshold, calculate_iou
+from magic_pdf.libs.boxbase import __is_overlaps_y_exceeds_threshold
+from magic_pdf.libs.boxbase_batch import batch_box_area, batch_overlap_area_in_bbox1_area_ratio, bboxes_to_array, \
+    paired_iou, paired_minbox_if_overlap_by_ratio
+from magic_pdf.libs.spatial_index import overlapping_bbox_pairs, ordered_overlapping_bbox_pairs
 from magic_pdf.libs.drop_tag import DropTag
 from magic_pdf.libs.ocr_content_type import ContentType, BlockType
 
@@ -9,20 +11,23 @@ from magic_pdf.libs.ocr_content_type import ContentType, BlockType
 def remove_overlaps_low_confidence_spans(spans):
     dropped_spans = []
     #  删除重叠spans中置信度低的的那些
-    for span1 in spans:
-        for span2 in spans:
-            if span1 != span2:
-                # span1 或 span2 任何一个都不应该在 dropped_spans 中
-                if span1 in dropped_spans or span2 in dropped_spans:
-                    continue
+    #  先用扫描线找出几何上相交的span对，只对其中iou>0.9的按原双重循环的顺序做判断
+    bboxes = bboxes_to_array([span['bbox'] for span in spans])
+    first_idx, second_idx = overlapping_bbox_pairs(bboxes)
+    hi_iou = paired_iou(bboxes[first_idx], bboxes[second_idx]) > 0.9
+    for i, j in zip(*ordered_overlapping_bbox_pairs(first_idx[hi_iou], second_idx[hi_iou])):
+        span1, span2 = spans[i], spans[j]
+        if span1 != span2:
+            # span1 或 span2 任何一个都不应该在 dropped_spans 中
+            if span1 in dropped_spans or span2 in dropped_spans:
+                continue
+            else:
+                if span1['score'] < span2['score']:
+                    span_need_remove = span1
                 else:
-                    if calculate_iou(span1['bbox'], span2['bbox']) > 0.9:
-                        if span1['score'] < span2['score']:
-                            span_need_remove = span1
-                        else:
-                            span_need_remove = span2
-                        if span_need_remove is not None and span_need_remove not in dropped_spans:
-                            dropped_spans.append(span_need_remove)
+                    span_need_remove = span2
+                if span_need_remove is not None and span_need_remove not in dropped_spans:
+                    dropped_spans.append(span_need_remove)
 
     if len(dropped_spans) > 0:
         for span_need_remove in dropped_spans:
@@ -35,14 +40,22 @@ def remove_overlaps_low_confidence_spans(spans):
 def remove_overlaps_min_spans(spans):
     dropped_spans = []
     #  删除重叠spans中较小的那些
-    for span1 in spans:
-        for span2 in spans:
-            if span1 != span2:
-                overlap_box = get_minbox_if_overlap_by_ratio(span1['bbox'], span2['bbox'], 0.65)
-                if overlap_box is not None:
-                    span_need_remove = next((span for span in spans if span['bbox'] == overlap_box), None)
-                    if span_need_remove is not None and span_need_remove not in dropped_spans:
-                        dropped_spans.append(span_need_remove)
+    #  先用扫描线找出几何上相交的span对，只对其中重叠比例>0.65的按原双重循环的顺序做判断
+    bboxes = bboxes_to_array([span['bbox'] for span in spans])
+    first_idx, second_idx = overlapping_bbox_pairs(bboxes)
+    overlap_mask, _ = paired_minbox_if_overlap_by_ratio(bboxes[first_idx], bboxes[second_idx], 0.65)
+    box_areas = batch_box_area(bboxes)
+    # 与 next(span for span in spans if span['bbox'] == overlap_box) 一致，取bbox相同的第一个span
+    first_span_idx_of_bbox = {}
+    for idx, span in enumerate(spans):
+        first_span_idx_of_bbox.setdefault(tuple(span['bbox']), idx)
+    for i, j in zip(*ordered_overlapping_bbox_pairs(first_idx[overlap_mask], second_idx[overlap_mask])):
+        span1, span2 = spans[i], spans[j]
+        if span1 != span2:
+            overlap_box = span1['bbox'] if box_areas[i] <= box_areas[j] else span2['bbox']
+            span_need_remove = spans[first_span_idx_of_bbox[tuple(overlap_box)]]
+            if span_need_remove is not None and span_need_remove not in dropped_spans:
+                dropped_spans.append(span_need_remove)
 
     if len(dropped_spans) > 0:
         for span_need_remove in dropped_spans:
@@ -56,12 +69,12 @@ def remove_spans_by_bboxes(spans, need_remove_spans_bboxes):
     # 遍历spans, 判断是否在removed_span_block_bboxes中
     # 如果是, 则删除该span 否则, 保留该span
     need_remove_spans = []
-    for span in spans:
-        for removed_bbox in need_remove_spans_bboxes:
-            if calculate_overlap_area_in_bbox1_area_ratio(span['bbox'], removed_bbox) > 0.5:
-                if span not in need_remove_spans:
-                    need_remove_spans.append(span)
-                    break
+    overlap_ratio = batch_overlap_area_in_bbox1_area_ratio([span['bbox'] for span in spans],
+                                                           need_remove_spans_bboxes)
+    need_remove_mask = (overlap_ratio > 0.5).any(axis=1)
+    for span, need_remove in zip(spans, need_remove_mask):
+        if need_remove and span not in need_remove_spans:
+            need_remove_spans.append(span)
 
     if len(need_remove_spans) > 0:
         for span in need_remove_spans:
@@ -74,18 +87,18 @@ def remove_spans_by_bboxes_dict(spans, need_remove_spans_bboxes_dict):
     dropped_spans = []
     for drop_tag, removed_bboxes in need_remove_spans_bboxes_dict.items():
         # logger.info(f"remove spans by bbox dict, drop_tag: {drop_tag}, removed_bboxes: {removed_bboxes}")
-        need_remove_spans = []
-        for span in spans:
-            # 通过判断span的bbox是否在removed_bboxes中, 判断是否需要删除该span
-            for removed_bbox in removed_bboxes:
-                if calculate_overlap_area_in_bbox1_area_ratio(span['bbox'], removed_bbox) > 0.5:
-                    need_remove_spans.append(span)
-                    break
-                # 当drop_tag为DropTag.FOOTNOTE时, 判断span是否在removed_bboxes中任意一个的下方，如果是,则删除该span
-                elif drop_tag == DropTag.FOOTNOTE and (span['bbox'][1] + span['bbox'][3]) / 2 > removed_bbox[3] and \
-                        removed_bbox[0] < (span['bbox'][0] + span['bbox'][2]) / 2 < removed_bbox[2]:
-                    need_remove_spans.append(span)
-                    break
+        span_bboxes = bboxes_to_array([span['bbox'] for span in spans])
+        removed_bboxes = bboxes_to_array(removed_bboxes)
+        # 通过判断span的bbox是否在removed_bboxes中, 判断是否需要删除该span
+        need_remove_mask = batch_overlap_area_in_bbox1_area_ratio(span_bboxes, removed_bboxes) > 0.5
+        # 当drop_tag为DropTag.FOOTNOTE时, 判断span是否在removed_bboxes中任意一个的下方，如果是,则删除该span
+        if drop_tag == DropTag.FOOTNOTE:
+            span_center_x = (span_bboxes[:, 0] + span_bboxes[:, 2]) / 2
+            span_center_y = (span_bboxes[:, 1] + span_bboxes[:, 3]) / 2
+            need_remove_mask |= ((span_center_y[:, None] > removed_bboxes[None, :, 3]) &
+                                 (removed_bboxes[None, :, 0] < span_center_x[:, None]) &
+                                 (span_center_x[:, None] < removed_bboxes[None, :, 2]))
+        need_remove_spans = [span for span, need_remove in zip(spans, need_remove_mask.any(axis=1)) if need_remove]
 
         for span in need_remove_spans:
             spans.remove(span)
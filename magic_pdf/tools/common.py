@@ -6,6 +6,7 @@ import click
 from loguru import logger
 
 import magic_pdf.model as model_config
+from magic_pdf.libs.config_reader import get_parse_config
 from magic_pdf.libs.draw_bbox import (draw_layout_bbox, draw_span_bbox,
                                       drow_model_bbox)
 from magic_pdf.libs.MakeContentConfig import DropMode, MakeMode
@@ -76,13 +77,23 @@ def do_parse(
 
     if len(model_list) == 0:
         if model_config.__use_inside_model__:
-            pipe.pipe_analyze()
-            orig_model_list = copy.deepcopy(pipe.model_list)
+            parse_config = get_parse_config()
+            if parse_config.get('pipeline', False):
+                # 渲染、推理、解析流水线执行，pipe.model_list 是解析修改之前的模型结果
+                if parse_config.get('parse_workers', 0) > 1:
+                    logger.warning('parse-config.pipeline and parse_workers are mutually exclusive, '
+                                   'pipeline parses pages one by one as inference finishes, parse_workers is ignored')
+                pipe.pipe_analyze_and_parse()
+                orig_model_list = copy.deepcopy(pipe.model_list)
+            else:
+                pipe.pipe_analyze()
+                orig_model_list = copy.deepcopy(pipe.model_list)
+                pipe.pipe_parse()
         else:
             logger.error('need model list input')
             exit(2)
-
-    pipe.pipe_parse()
+    else:
+        pipe.pipe_parse()
     pdf_info = pipe.pdf_mid_data['pdf_info']
     if f_draw_layout_bbox:
         draw_layout_bbox(pdf_info, pdf_bytes, local_md_dir, pdf_file_name)
@@ -91,9 +102,9 @@ def do_parse(
     if f_draw_model_bbox:
         drow_model_bbox(copy.deepcopy(orig_model_list), pdf_bytes, local_md_dir, pdf_file_name)
 
-    md_content = pipe.pipe_mk_markdown(image_dir,
-                                       drop_mode=DropMode.NONE,
-                                       md_make_mode=f_make_md_mode)
+    md_content, content_list = pipe.pipe_mk_markdown_and_uni_format(image_dir,
+                                                                    drop_mode=DropMode.NONE,
+                                                                    md_make_mode=f_make_md_mode)
     if f_dump_md:
         md_writer.write(
             content=md_content,
@@ -126,7 +137,6 @@ def do_parse(
             mode=AbsReaderWriter.MODE_BIN,
         )
 
-    content_list = pipe.pipe_mk_uni_format(image_dir, drop_mode=DropMode.NONE)
     if f_dump_content_list:
         md_writer.write(
             content=json_parse.dumps(content_list,
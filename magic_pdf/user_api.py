@@ -16,10 +16,11 @@ import re
 from loguru import logger
 
 from magic_pdf.libs.version import __version__
-from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze
+from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze, iter_doc_analyze
 from magic_pdf.rw import AbsReaderWriter
 from magic_pdf.pdf_parse_by_ocr import parse_pdf_by_ocr
 from magic_pdf.pdf_parse_by_txt import parse_pdf_by_txt
+from magic_pdf.pdf_parse_union_core import pdf_parse_union_pipelined
 
 PARSE_TYPE_TXT = "txt"
 PARSE_TYPE_OCR = "ocr"
@@ -109,3 +110,57 @@ def parse_union_pdf(pdf_bytes: bytes, pdf_models: list, imageWriter: AbsReaderWr
     pdf_info_dict["_version_name"] = __version__
 
     return pdf_info_dict
+
+
+def analyze_and_parse_pdf(pdf_bytes: bytes, imageWriter: AbsReaderWriter, parse_type: str, is_debug=False,
+                          start_page_id=0, end_page_id=None,
+                          *args, **kwargs):
+    """
+    渲染、模型推理、页面解析流水线执行，每页推理完就开始解析，所有页面解析完后再分段
+    返回 (pdf_info_dict, model_list)，model_list 是解析修改之前的模型结果
+    """
+    model_pages = iter_doc_analyze(pdf_bytes, ocr=parse_type == PARSE_TYPE_OCR,
+                                   start_page_id=start_page_id, end_page_id=end_page_id,
+                                   flush_per_batch=True)
+    pdf_info_dict, model_list = pdf_parse_union_pipelined(
+        pdf_bytes,
+        model_pages,
+        imageWriter,
+        parse_type,
+        start_page_id=start_page_id,
+        end_page_id=end_page_id,
+        debug_mode=is_debug,
+    )
+
+    pdf_info_dict["_parse_type"] = parse_type
+
+    pdf_info_dict["_version_name"] = __version__
+
+    return pdf_info_dict, model_list
+
+
+def analyze_and_parse_union_pdf(pdf_bytes: bytes, imageWriter: AbsReaderWriter, is_debug=False,
+                                start_page_id=0, end_page_id=None,
+                                *args, **kwargs):
+    """
+    ocr和文本混合的pdf，流水线执行
+    与 parse_union_pdf 一样先按文本模式解析，失败时用ocr模式重新推理和解析，
+    此时返回的 model_list 是ocr模式的推理结果，而不是文本模式的推理结果
+    """
+
+    def analyze_and_parse(parse_type):
+        try:
+            return analyze_and_parse_pdf(pdf_bytes, imageWriter, parse_type, is_debug=is_debug,
+                                         start_page_id=start_page_id, end_page_id=end_page_id)
+        except Exception as e:
+            logger.exception(e)
+            return None, None
+
+    pdf_info_dict, model_list = analyze_and_parse(PARSE_TYPE_TXT)
+    if pdf_info_dict is None or pdf_info_dict.get("_need_drop", False):
+        logger.warning(f"parse_pdf_by_txt drop or error, switch to parse_pdf_by_ocr")
+        pdf_info_dict, model_list = analyze_and_parse(PARSE_TYPE_OCR)
+        if pdf_info_dict is None:
+            raise Exception("Both parse_pdf_by_txt and parse_pdf_by_ocr failed.")
+
+    return pdf_info_dict, model_list
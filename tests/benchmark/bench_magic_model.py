@@ -0,0 +1,69 @@
+"""
+MagicModel 区块查询基准: 文档页数从 10 增加到 2000 时，每页的查询耗时应保持平稳
+
+python -m tests.benchmark.bench_magic_model
+"""
+import copy
+import json
+import time
+
+from magic_pdf.libs.commons import fitz
+from magic_pdf.model.magic_model import MagicModel
+
+pdf_path = 'demo/demo2.pdf'
+model_path = 'demo/demo2.json'
+
+
+def build_doc(page_count):
+    """把 demo 文档循环拼接成 page_count 页，model_list 同步拼接并修正 page_no"""
+    with open(pdf_path, 'rb') as f:
+        src_doc = fitz.open('pdf', f.read())
+    with open(model_path, 'r', encoding='utf-8') as f:
+        src_model_list = json.load(f)
+
+    doc = fitz.open()
+    model_list = []
+    while len(model_list) < page_count:
+        for index in range(len(src_doc)):
+            if len(model_list) >= page_count:
+                break
+            doc.insert_pdf(src_doc, from_page=index, to_page=index)
+            page_dict = copy.deepcopy(src_model_list[index])
+            page_dict['page_info']['page_no'] = len(model_list)
+            model_list.append(page_dict)
+    return doc, model_list
+
+
+def parse_page_getters(magic_model, page_id):
+    magic_model.get_imgs(page_id)
+    magic_model.get_tables(page_id)
+    magic_model.get_discarded(page_id)
+    magic_model.get_text_blocks(page_id)
+    magic_model.get_title_blocks(page_id)
+    magic_model.get_equations(page_id)
+    magic_model.get_page_size(page_id)
+    magic_model.get_all_spans(page_id)
+
+
+def bench(page_count):
+    doc, model_list = build_doc(page_count)
+    init_start = time.perf_counter()
+    magic_model = MagicModel(model_list, doc)
+    init_cost = time.perf_counter() - init_start
+
+    query_start = time.perf_counter()
+    for page_id in range(page_count):
+        parse_page_getters(magic_model, page_id)
+    query_cost = time.perf_counter() - query_start
+    return init_cost, query_cost
+
+
+def main():
+    print(f"{'pages':>6} {'init(s)':>9} {'query(s)':>9} {'ms/page':>8}")
+    for page_count in [10, 100, 500, 2000]:
+        init_cost, query_cost = bench(page_count)
+        print(f'{page_count:>6} {init_cost:>9.3f} {query_cost:>9.3f} {query_cost / page_count * 1000:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
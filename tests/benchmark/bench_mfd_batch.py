@@ -0,0 +1,60 @@
+"""
+公式检测(MFD)批量推理基准: 比较 batch size 为 1/4/8 时的吞吐(pages/sec)
+
+需要安装 magic-pdf[full] 并在 magic-pdf.json 中配置 models-dir
+python -m tests.benchmark.bench_mfd_batch
+"""
+import os
+import time
+
+import yaml
+
+from magic_pdf.libs.config_reader import get_local_models_dir
+from magic_pdf.model.doc_analyze_by_custom_model import load_images_from_pdf
+from magic_pdf.model.pdf_extract_kit import mfd_model_init
+
+pdf_path = 'demo/demo1.pdf'
+page_count = 16
+batch_sizes = [1, 4, 8]
+
+
+def load_mfd_model():
+    import magic_pdf.model.pdf_extract_kit as pdf_extract_kit
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(pdf_extract_kit.__file__)))
+    config_path = os.path.join(root_dir, 'resources', 'model_config', 'model_configs.yaml')
+    with open(config_path, 'r', encoding='utf-8') as f:
+        configs = yaml.load(f, Loader=yaml.FullLoader)
+    return mfd_model_init(str(os.path.join(get_local_models_dir(), configs['weights']['mfd'])))
+
+
+def load_pages():
+    """把 demo 文档的页面循环使用，凑够 page_count 页"""
+    with open(pdf_path, 'rb') as f:
+        images = [img_dict['img'] for img_dict in load_images_from_pdf(f.read())]
+    return [images[index % len(images)] for index in range(page_count)]
+
+
+def bench(mfd_model, images, batch_size):
+    start = time.perf_counter()
+    formula_count = 0
+    for index in range(0, len(images), batch_size):
+        mfd_res_list = mfd_model.predict(images[index:index + batch_size], imgsz=1888, conf=0.25, iou=0.45,
+                                         verbose=False)
+        formula_count += sum(len(mfd_res.boxes) for mfd_res in mfd_res_list)
+    return time.perf_counter() - start, formula_count
+
+
+def main():
+    mfd_model = load_mfd_model()
+    images = load_pages()
+    # 预热，排除模型首次推理的初始化开销
+    mfd_model.predict(images[0], imgsz=1888, conf=0.25, iou=0.45, verbose=False)
+
+    print(f"{'batch':>6} {'total(s)':>9} {'pages/sec':>10} {'formulas':>9}")
+    for batch_size in batch_sizes:
+        cost, formula_count = bench(mfd_model, images, batch_size)
+        print(f'{batch_size:>6} {cost:>9.3f} {len(images) / cost:>10.2f} {formula_count:>9}')
+
+
+if __name__ == '__main__':
+    main()
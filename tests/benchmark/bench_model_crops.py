@@ -0,0 +1,106 @@
+"""
+模型阶段截图基准: 在 demo/demo1.pdf 的页面上比较 旧的PIL截图流程 与 基于ndarray视图的截图流程 每页新分配的像素内存和耗时
+
+不需要模型，公式框、OCR区域和表格区域是按页面尺寸生成的固定区域。
+PIL图片的像素内存不经过Python的分配器，tracemalloc统计不到，这里按每一步产生的新图片/数组的像素字节数累加:
+PIL图片按 宽*高*通道数，ndarray 只统计自己持有数据的数组(视图不计)。
+python -m tests.benchmark.bench_model_crops
+"""
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from magic_pdf.model.doc_analyze_by_custom_model import load_images_from_pdf
+from magic_pdf.model.pek_sub_modules.post_process import (crop_ndarray,
+                                                          get_croped_image,
+                                                          pad_crop_ndarray)
+
+pdf_path = 'demo/demo1.pdf'
+formulas_per_page = 20
+bands_per_page = 8
+paste = 50
+repeat = 5
+
+
+def make_boxes(image):
+    height, width = image.shape[:2]
+    formula_boxes = []
+    for index in range(formulas_per_page):
+        x0 = (index % 4) * width // 4 + 10
+        y0 = (index // 4) * height // (formulas_per_page // 4) + 10
+        formula_boxes.append([x0, y0, x0 + width // 6, y0 + 40])
+    band_height = height // bands_per_page
+    ocr_boxes = [[0, band * band_height, width, (band + 1) * band_height] for band in range(bands_per_page)]
+    table_boxes = [[width // 8, height // 3, width * 7 // 8, height * 2 // 3]]
+    return formula_boxes, ocr_boxes, table_boxes
+
+
+def buffer_bytes(obj):
+    if isinstance(obj, Image.Image):
+        return obj.width * obj.height * len(obj.getbands())
+    return obj.nbytes if obj.flags.owndata else 0
+
+
+def legacy_crops(image, formula_boxes, ocr_boxes, table_boxes):
+    """修改前 pdf_extract_kit 中的截图方式"""
+    allocated = 0
+    for bbox in formula_boxes:
+        page_img = Image.fromarray(image)
+        bbox_img = get_croped_image(page_img, bbox)
+        allocated += buffer_bytes(page_img) + buffer_bytes(bbox_img)
+    pil_img = Image.fromarray(image)
+    allocated += buffer_bytes(pil_img)
+    for xmin, ymin, xmax, ymax in ocr_boxes:
+        return_image = Image.new('RGB', (xmax - xmin + paste * 2, ymax - ymin + paste * 2), 'white')
+        cropped_img = pil_img.crop((xmin, ymin, xmax, ymax))
+        return_image.paste(cropped_img, (paste, paste))
+        rgb = np.asarray(return_image)
+        bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        allocated += buffer_bytes(return_image) + buffer_bytes(cropped_img) + rgb.nbytes + buffer_bytes(bgr)
+    for xmin, ymin, xmax, ymax in table_boxes:
+        return_image = Image.new('RGB', (xmax - xmin, ymax - ymin), 'white')
+        cropped_img = pil_img.crop((xmin, ymin, xmax, ymax))
+        return_image.paste(cropped_img, (0, 0))
+        allocated += buffer_bytes(return_image) + buffer_bytes(cropped_img)
+    return allocated
+
+
+def ndarray_crops(image, formula_boxes, ocr_boxes, table_boxes):
+    """现在的截图方式: 截图是页面数组的视图，只有进入队列的截图和留白截图分配新内存"""
+    allocated = 0
+    for bbox in formula_boxes:
+        bbox_img = Image.fromarray(crop_ndarray(image, bbox))
+        allocated += buffer_bytes(bbox_img)
+    image_bgr = image[:, :, ::-1]
+    for bbox in ocr_boxes:
+        allocated += buffer_bytes(pad_crop_ndarray(image_bgr, bbox, paste, paste))
+    for bbox in table_boxes:
+        allocated += buffer_bytes(Image.fromarray(crop_ndarray(image, bbox)))
+    return allocated
+
+
+def bench(crop_fn, pages):
+    allocated = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for image, boxes in pages:
+            allocated += crop_fn(image, *boxes)
+    cost = time.perf_counter() - start
+    page_count = len(pages) * repeat
+    return cost / page_count * 1000, allocated / page_count / 1024 / 1024
+
+
+def main():
+    with open(pdf_path, 'rb') as f:
+        images = [img_dict['img'] for img_dict in load_images_from_pdf(f.read())]
+    pages = [(image, make_boxes(image)) for image in images]
+    print(f"{'method':>8} {'ms/page':>9} {'MB/page':>9}")
+    for name, crop_fn in [('pil', legacy_crops), ('ndarray', ndarray_crops)]:
+        cost, allocated = bench(crop_fn, pages)
+        print(f'{name:>8} {cost:>9.2f} {allocated:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
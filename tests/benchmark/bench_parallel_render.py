@@ -0,0 +1,36 @@
+"""
+多进程页面渲染基准: 比较 进程内渲染(iter_images_from_pdf) 与 ParallelPageRenderer 在不同worker数下的吞吐(pages/sec)
+
+使用 bench_render_buffers 中由 demo/demo1.pdf 生成的200页扫描件，加速比受机器核数限制
+python -m tests.benchmark.bench_parallel_render
+"""
+import os
+import time
+
+from magic_pdf.model.doc_analyze_by_custom_model import iter_images_from_pdf
+from magic_pdf.model.parallel_render import iter_images_from_pdf_parallel
+from tests.benchmark.bench_render_buffers import make_scanned_pdf, page_count
+
+
+def bench(images):
+    start = time.perf_counter()
+    checksum = 0
+    for img_dict in images:
+        checksum += int(img_dict['img'][::97, ::97].sum())
+    return time.perf_counter() - start, checksum
+
+
+def main():
+    pdf_bytes = make_scanned_pdf()
+    print(f'cpu count: {os.cpu_count()}')
+    print(f"{'workers':>8} {'total(s)':>9} {'pages/sec':>10}")
+    cost, expected_checksum = bench(iter_images_from_pdf(pdf_bytes))
+    print(f"{'-':>8} {cost:>9.2f} {page_count / cost:>10.2f}")
+    for workers in sorted({2, 4, os.cpu_count() or 1} - {1}):
+        cost, checksum = bench(iter_images_from_pdf_parallel(pdf_bytes, workers))
+        assert checksum == expected_checksum, 'rendered pages differ from sequential render'
+        print(f'{workers:>8} {cost:>9.2f} {page_count / cost:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
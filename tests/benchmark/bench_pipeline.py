@@ -0,0 +1,79 @@
+"""
+流水线执行基准: 比较 先doc_analyze再pdf_parse_union 的分阶段执行 与 渲染、推理、解析流水线执行 的总耗时
+
+不需要模型，推理阶段用 demo/demo1.json 中的模型结果回放，每页sleep infer_seconds 模拟推理耗时(与真实推理一样释放GIL)。
+分阶段执行的耗时约为各阶段之和，流水线执行应接近最慢的一个阶段。
+python -m tests.benchmark.bench_pipeline
+"""
+import copy
+import json
+import tempfile
+import time
+
+from magic_pdf.model.doc_analyze_by_custom_model import (ModelSingleton,
+                                                         doc_analyze,
+                                                         iter_doc_analyze,
+                                                         load_images_from_pdf)
+from magic_pdf.pdf_parse_union_core import (pdf_parse_union,
+                                            pdf_parse_union_pipelined)
+from magic_pdf.rw.DiskReaderWriter import DiskReaderWriter
+
+pdf_path = 'demo/demo1.pdf'
+model_path = 'demo/demo1.json'
+infer_seconds = 0.5
+
+
+class ReplayModel:
+    """按调用顺序返回已有的模型结果"""
+
+    def __init__(self, model_list):
+        self.__layout_dets = [page['layout_dets'] for page in model_list]
+        self.__index = 0
+
+    def __call__(self, image):
+        time.sleep(infer_seconds)
+        layout_dets = copy.deepcopy(self.__layout_dets[self.__index])
+        self.__index += 1
+        return layout_dets
+
+
+def bench_staged(pdf_bytes, model_list, image_writer):
+    ModelSingleton._models[(False, False)] = ReplayModel(model_list)
+    start = time.perf_counter()
+    analyzed = doc_analyze(pdf_bytes, ocr=False, prefetch_pages=2, batch_size=1, buffer_pool_size=0,
+                           render_workers=0)
+    analyze_cost = time.perf_counter() - start
+    pdf_info = pdf_parse_union(pdf_bytes, analyzed, image_writer, 'txt', parse_workers=0)
+    return time.perf_counter() - start, analyze_cost, pdf_info
+
+
+def bench_pipelined(pdf_bytes, model_list, image_writer):
+    ModelSingleton._models[(False, False)] = ReplayModel(model_list)
+    start = time.perf_counter()
+    model_pages = iter_doc_analyze(pdf_bytes, ocr=False, prefetch_pages=2, batch_size=1, buffer_pool_size=0,
+                                   render_workers=0, flush_per_batch=True)
+    pdf_info, _ = pdf_parse_union_pipelined(pdf_bytes, model_pages, image_writer, 'txt')
+    return time.perf_counter() - start, pdf_info
+
+
+def main():
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    with open(model_path, 'r', encoding='utf-8') as f:
+        model_list = json.load(f)
+    page_count = len(load_images_from_pdf(pdf_bytes))
+    image_writer = DiskReaderWriter(tempfile.mkdtemp())
+
+    staged_cost, analyze_cost, staged_info = bench_staged(pdf_bytes, model_list, image_writer)
+    pipelined_cost, pipelined_info = bench_pipelined(pdf_bytes, model_list, image_writer)
+    assert json.dumps(pipelined_info, ensure_ascii=False) == json.dumps(staged_info, ensure_ascii=False)
+
+    print(f'pages: {page_count}, simulated inference: {infer_seconds * page_count:.2f}s')
+    print(f"{'mode':>10} {'total(s)':>9}")
+    print(f"{'staged':>10} {staged_cost:>9.2f}  "
+          f"(render+infer {analyze_cost:.2f}s, parse {staged_cost - analyze_cost:.2f}s)")
+    print(f"{'pipelined':>10} {pipelined_cost:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+页面渲染基准: 在200页的扫描件上比较 旧的 Image.frombytes + np.array 转换、直接包装pixmap缓冲区、复用渲染缓冲区池 三种方式的耗时和峰值内存
+
+扫描件由 demo/demo1.pdf 的页面以 jpeg 图片的形式循环插入生成，每种方式在独立的子进程中运行，峰值内存取子进程的 ru_maxrss。
+消费端处理完一页就释放(或归还)该页，和 doc_analyze 中的用法一致。
+python -m tests.benchmark.bench_render_buffers
+"""
+import multiprocessing
+import resource
+import time
+
+import fitz
+import numpy as np
+
+from magic_pdf.model.doc_analyze_by_custom_model import (RenderBufferPool,
+                                                         get_page_render_matrix,
+                                                         iter_images_from_pdf)
+
+source_pdf_path = 'demo/demo1.pdf'
+page_count = 200
+scan_dpi = 150
+
+
+def make_scanned_pdf():
+    scanned = fitz.open()
+    with fitz.open(source_pdf_path) as source:
+        scans = [page.get_pixmap(matrix=fitz.Matrix(scan_dpi / 72, scan_dpi / 72)).tobytes('jpeg')
+                 for page in source]
+        rects = [page.rect for page in source]
+    for index in range(page_count):
+        page = scanned.new_page(width=rects[index % len(rects)].width, height=rects[index % len(rects)].height)
+        page.insert_image(page.rect, stream=scans[index % len(scans)])
+    pdf_bytes = scanned.tobytes()
+    scanned.close()
+    return pdf_bytes
+
+
+def iter_legacy(pdf_bytes):
+    """修改前 load_images_from_pdf 的转换方式"""
+    from PIL import Image
+    with fitz.open('pdf', pdf_bytes) as doc:
+        for page in doc:
+            pm = page.get_pixmap(matrix=get_page_render_matrix(page), alpha=False)
+            img = Image.frombytes('RGB', (pm.width, pm.height), pm.samples)
+            yield np.array(img)
+
+
+def run(method, pdf_bytes, result_queue):
+    pool = RenderBufferPool(max_buffers=2) if method == 'pool' else None
+    if method == 'legacy':
+        images = iter_legacy(pdf_bytes)
+    else:
+        images = (img_dict['img'] for img_dict in iter_images_from_pdf(pdf_bytes, buffer_pool=pool))
+    start = time.perf_counter()
+    checksum = 0
+    for img in images:
+        checksum += int(img[::97, ::97].sum())
+        if pool is not None:
+            pool.release(img)
+    cost = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    result_queue.put((cost, peak_mb, checksum))
+
+
+def main():
+    pdf_bytes = make_scanned_pdf()
+    mp_context = multiprocessing.get_context('spawn')
+    print(f"{'method':>9} {'total(s)':>9} {'ms/page':>8} {'peak rss(MB)':>13}")
+    checksums = set()
+    for method in ['legacy', 'zero-copy', 'pool']:
+        result_queue = mp_context.Queue()
+        process = mp_context.Process(target=run, args=(method, pdf_bytes, result_queue))
+        process.start()
+        cost, peak_mb, checksum = result_queue.get()
+        process.join()
+        checksums.add(checksum)
+        print(f'{method:>9} {cost:>9.2f} {cost / page_count * 1000:>8.1f} {peak_mb:>13.1f}')
+    assert len(checksums) == 1, 'rendered pages differ between methods'
+
+
+if __name__ == '__main__':
+    main()
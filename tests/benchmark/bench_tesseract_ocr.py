@@ -0,0 +1,65 @@
+"""
+tesseract 区域OCR基准: 在 demo/small_ocr.pdf 上比较 每个区域启动一次 pytesseract 子进程 与 常驻引擎(TesseractOCR) 的耗时
+
+需要安装 tesseract 的 por 语言包，以及 tesserocr(常驻引擎) 和/或 pytesseract(子进程)
+python -m tests.benchmark.bench_tesseract_ocr
+"""
+import os
+import time
+
+from PIL import Image
+
+from magic_pdf.model.doc_analyze_by_custom_model import load_images_from_pdf
+from magic_pdf.model.tesseract_ocr import TesseractOCR
+
+pdf_path = 'demo/small_ocr.pdf'
+# 没有layout模型时把每页切成若干横条，模拟layout检测出的文本区域
+bands_per_page = 8
+lang = 'por'
+
+
+def load_regions():
+    with open(pdf_path, 'rb') as f:
+        images = [Image.fromarray(img_dict['img']) for img_dict in load_images_from_pdf(f.read())]
+    regions = []
+    for image in images:
+        band_height = image.height // bands_per_page
+        for band in range(bands_per_page):
+            regions.append(image.crop((0, band * band_height, image.width, (band + 1) * band_height)))
+    return regions
+
+
+def bench_subprocess(regions):
+    import pytesseract
+    start = time.perf_counter()
+    for region in regions:
+        pytesseract.image_to_string(region, lang=lang)
+    return time.perf_counter() - start
+
+
+def bench_engine(regions, workers):
+    engine = TesseractOCR(lang=lang, workers=workers)
+    # 预热，各线程的引擎第一次识别时加载traineddata
+    engine.ocr_regions(regions[:workers])
+    start = time.perf_counter()
+    line_count = sum(len(lines) for lines in engine.ocr_regions(regions))
+    cost = time.perf_counter() - start
+    engine.close()
+    return cost, line_count
+
+
+def main():
+    regions = load_regions()
+    print(f"{'method':>22} {'total(s)':>9} {'ms/region':>10} {'lines':>6}")
+    try:
+        cost = bench_subprocess(regions)
+        print(f"{'pytesseract':>22} {cost:>9.3f} {cost / len(regions) * 1000:>10.1f} {'-':>6}")
+    except ImportError:
+        print('pytesseract not installed, skip')
+    for workers in sorted({1, os.cpu_count() or 1}):
+        cost, line_count = bench_engine(regions, workers)
+        print(f"{f'engine workers={workers}':>22} {cost:>9.3f} {cost / len(regions) * 1000:>10.1f} {line_count:>6}")
+
+
+if __name__ == '__main__':
+    main()
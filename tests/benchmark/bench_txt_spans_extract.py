@@ -0,0 +1,53 @@
+"""
+txt 模式文本层提取基准: 300 页文本 pdf 上，dict + rawdict 两次提取与只提取一次 rawdict 的耗时对比
+
+python -m tests.benchmark.bench_txt_spans_extract
+"""
+import time
+
+from magic_pdf.libs.commons import fitz
+from magic_pdf.pre_proc.equations_replace import (combine_chars_to_pymudict,
+                                                  fill_span_text_from_chars)
+
+pdf_path = 'demo/demo1.pdf'
+page_count = 300
+
+
+def build_doc():
+    """把 demo 文档循环拼接成 page_count 页"""
+    with open(pdf_path, 'rb') as f:
+        src_doc = fitz.open('pdf', f.read())
+    doc = fitz.open()
+    while len(doc) < page_count:
+        doc.insert_pdf(src_doc, to_page=min(len(src_doc), page_count - len(doc)) - 1)
+    return doc
+
+
+def extract_dict_and_rawdict(page):
+    text_raw_blocks = page.get_text('dict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
+    char_level_text_blocks = page.get_text('rawdict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
+    return combine_chars_to_pymudict(text_raw_blocks, char_level_text_blocks)
+
+
+def extract_rawdict_only(page):
+    char_level_text_blocks = page.get_text('rawdict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
+    return fill_span_text_from_chars(char_level_text_blocks)
+
+
+def bench(doc, extract_fn):
+    start = time.perf_counter()
+    for page in doc:
+        extract_fn(page)
+    return time.perf_counter() - start
+
+
+def main():
+    doc = build_doc()
+    print(f"{'method':>26} {'total(s)':>9} {'ms/page':>8}")
+    for extract_fn in [extract_dict_and_rawdict, extract_rawdict_only]:
+        cost = bench(doc, extract_fn)
+        print(f'{extract_fn.__name__:>26} {cost:>9.3f} {cost / len(doc) * 1000:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
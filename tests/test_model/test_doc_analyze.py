@@ -0,0 +1,341 @@
+import threading
+
+import numpy as np
+import pytest
+
+from magic_pdf import pdf_parse_union_core
+from magic_pdf.model import doc_analyze_by_custom_model
+from magic_pdf.libs.prefetch_utils import prefetch_iter
+from magic_pdf.model.doc_analyze_by_custom_model import (ModelSingleton,
+                                                         RenderBufferPool,
+                                                         doc_analyze,
+                                                         iter_doc_analyze,
+                                                         iter_images_from_pdf,
+                                                         load_images_from_pdf)
+from magic_pdf.model.parallel_render import iter_images_from_pdf_parallel
+from magic_pdf.pdf_parse_union_core import pdf_parse_union_pipelined
+from magic_pdf.rw.DiskReaderWriter import DiskReaderWriter
+
+pdf_path = 'demo/demo2.pdf'
+
+
+def test_iter_images_from_pdf_is_lazy():
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    images = iter_images_from_pdf(pdf_bytes)
+    first = next(images)
+    assert first['img'].shape == (first['height'], first['width'], 3)
+    images.close()
+
+
+@pytest.mark.parametrize('prefetch_pages', [0, 1, 3])
+def test_prefetched_images_match_eager_render(prefetch_pages):
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    expected = load_images_from_pdf(pdf_bytes)
+    actual = list(prefetch_iter(iter_images_from_pdf(pdf_bytes), prefetch_pages))
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert (a['width'], a['height']) == (e['width'], e['height'])
+        assert np.array_equal(a['img'], e['img'])
+
+
+def test_prefetch_iter_propagates_producer_error():
+    def gen():
+        yield 1
+        raise ValueError('render failed')
+
+    it = prefetch_iter(gen(), 2)
+    assert next(it) == 1
+    with pytest.raises(ValueError):
+        next(it)
+
+
+def test_prefetch_iter_stops_producer_on_early_exit():
+    consumed = []
+    closed = []
+
+    def gen():
+        try:
+            for i in range(1000):
+                consumed.append(i)
+                yield i
+        finally:
+            closed.append(True)
+
+    upstream = gen()
+    it = prefetch_iter(upstream, 2)
+    assert next(it) == 0
+    it.close()
+    # 生产者最多领先 depth 个元素(加上正在放入队列的那一个)
+    assert len(consumed) <= 5
+    # 上游生成器还被引用着也会被立即关闭，清理逻辑不依赖GC
+    assert closed == [True]
+
+
+def test_iter_images_from_pdf_only_renders_page_range():
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    expected = load_images_from_pdf(pdf_bytes)
+    actual = list(iter_images_from_pdf(pdf_bytes, start_page_id=1, end_page_id=2))
+    assert len(actual) == len(expected)
+    for index, (a, e) in enumerate(zip(actual, expected)):
+        # 范围外的页面只有宽高占位，且与实际渲染的尺寸一致
+        assert (a['width'], a['height']) == (e['width'], e['height'])
+        if 1 <= index <= 2:
+            assert np.array_equal(a['img'], e['img'])
+        else:
+            assert a['img'] is None
+
+
+def test_iter_images_from_pdf_matches_pil_render():
+    import fitz
+    from PIL import Image
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    with fitz.open('pdf', pdf_bytes) as doc:
+        expected = []
+        for page in doc:
+            pm = page.get_pixmap(matrix=fitz.Matrix(200 / 72, 200 / 72), alpha=False)
+            expected.append(np.array(Image.frombytes('RGB', (pm.width, pm.height), pm.samples)))
+    actual = load_images_from_pdf(pdf_bytes)
+    for a, e in zip(actual, expected):
+        assert np.array_equal(a['img'], e)
+
+
+def test_buffer_pool_reuses_released_pages():
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    expected = load_images_from_pdf(pdf_bytes)
+    pool = RenderBufferPool(max_buffers=2)
+    buffers = set()
+    for a, e in zip(iter_images_from_pdf(pdf_bytes, buffer_pool=pool), expected):
+        assert np.array_equal(a['img'], e['img'])
+        buffers.add(id(a['img']))
+        pool.release(a['img'])
+    # 尺寸相同的页面用完即归还，只需要申请一个缓冲区
+    assert pool.allocated == len(buffers) == 1
+    assert pool.reused == len(expected) - 1
+
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_parallel_render_matches_sequential_render(workers):
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    expected = list(iter_images_from_pdf(pdf_bytes, start_page_id=1, end_page_id=2))
+    actual = list(iter_images_from_pdf_parallel(pdf_bytes, workers, start_page_id=1, end_page_id=2))
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert (a['width'], a['height']) == (e['width'], e['height'])
+        if e['img'] is None:
+            assert a['img'] is None
+        else:
+            assert np.array_equal(a['img'], e['img'])
+
+
+class FakeBatchModel:
+    """按图片内容生成确定的结果，并记录每次batch的大小"""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, image):
+        return [{'category_id': 1, 'score': float(image.mean())}]
+
+    def batch(self, images):
+        self.batch_sizes.append(len(images))
+        return [self(image) for image in images]
+
+
+@pytest.mark.parametrize('start_page_id, end_page_id', [(0, None), (1, 2)])
+def test_doc_analyze_batch_same_as_single_page(monkeypatch, start_page_id, end_page_id):
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    fake_model = FakeBatchModel()
+    monkeypatch.setattr(ModelSingleton, 'get_model', lambda self, ocr, show_log: fake_model)
+
+    expected = doc_analyze(pdf_bytes, start_page_id=start_page_id, end_page_id=end_page_id,
+                           prefetch_pages=0, batch_size=1, buffer_pool_size=0, render_workers=0)
+    assert fake_model.batch_sizes == []
+    actual = doc_analyze(pdf_bytes, start_page_id=start_page_id, end_page_id=end_page_id,
+                         prefetch_pages=0, batch_size=2, buffer_pool_size=0, render_workers=0)
+    assert actual == expected
+    assert [page['page_info']['page_no'] for page in actual] == list(range(len(actual)))
+    assert sum(fake_model.batch_sizes) == len([page for page in expected if page['layout_dets']])
+    assert max(fake_model.batch_sizes) <= 2
+
+    # 多进程渲染、复用渲染缓冲区时，页面在模型处理完之后才归还，结果不变
+    pooled = doc_analyze(pdf_bytes, start_page_id=start_page_id, end_page_id=end_page_id,
+                         prefetch_pages=2, batch_size=2, buffer_pool_size=2, render_workers=2)
+    assert pooled == expected
+
+
+class FakeDeferredMfrModel(FakeBatchModel):
+    """公式识别结果在flush_mfr时才写回"""
+
+    def __init__(self, fail_on_call=None):
+        super().__init__()
+        self.pending = []
+        self.flushed = []
+        self.cleared = 0
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def __call__(self, image, defer_mfr=False):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError('model failed')
+        result = [{'category_id': 13, 'latex': ''}]
+        self.pending.append((result[0], str(image.shape)))
+        if not defer_mfr:
+            self.flush_mfr()
+        return result
+
+    def batch(self, images, defer_mfr=False):
+        self.batch_sizes.append(len(images))
+        return [self(image, defer_mfr=defer_mfr) for image in images]
+
+    def flush_mfr(self):
+        self.flushed.append(len(self.pending))
+        for res, latex in self.pending:
+            res['latex'] = latex
+        self.pending.clear()
+
+    def clear_mfr(self):
+        self.cleared += 1
+        self.pending.clear()
+
+
+class FakeDeferredTableModel(FakeDeferredMfrModel):
+    """公式和表格的识别结果都在flush时才写回"""
+
+    def __init__(self, fail_on_call=None):
+        super().__init__(fail_on_call)
+        self.table_pending = []
+        self.table_flushed = []
+
+    def __call__(self, image, defer_mfr=False, defer_table=False):
+        result = super().__call__(image, defer_mfr=defer_mfr)
+        table_res = {'category_id': 5}
+        self.table_pending.append((table_res, str(image.shape)))
+        if not defer_table:
+            self.flush_table()
+        return result + [table_res]
+
+    def batch(self, images, defer_mfr=False, defer_table=False):
+        self.batch_sizes.append(len(images))
+        return [self(image, defer_mfr=defer_mfr, defer_table=defer_table) for image in images]
+
+    def flush_table(self):
+        self.table_flushed.append(len(self.table_pending))
+        for res, html in self.table_pending:
+            res['html'] = html
+        self.table_pending.clear()
+
+    def clear_table(self):
+        self.table_pending.clear()
+
+
+@pytest.mark.parametrize('batch_size', [1, 2])
+def test_doc_analyze_flushes_deferred_mfr(monkeypatch, batch_size):
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    fake_model = FakeDeferredMfrModel()
+    monkeypatch.setattr(ModelSingleton, 'get_model', lambda self, ocr, show_log: fake_model)
+
+    model_json = doc_analyze(pdf_bytes, prefetch_pages=0, batch_size=batch_size, buffer_pool_size=0, render_workers=0)
+    assert fake_model.pending == []
+    for page in model_json:
+        page_info = page['page_info']
+        assert page['layout_dets'][0]['latex'] == str((page_info['height'], page_info['width'], 3))
+
+
+def test_doc_analyze_failure_drops_pending_formulas(monkeypatch):
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    fake_model = FakeDeferredMfrModel(fail_on_call=3)
+    monkeypatch.setattr(ModelSingleton, 'get_model', lambda self, ocr, show_log: fake_model)
+
+    with pytest.raises(RuntimeError):
+        doc_analyze(pdf_bytes, prefetch_pages=0, batch_size=1, buffer_pool_size=0, render_workers=0)
+    # 失败文档积压的公式被丢弃，不会在下一篇文档中识别
+    assert fake_model.pending == []
+    model_json = doc_analyze(pdf_bytes, prefetch_pages=0, batch_size=1, buffer_pool_size=0, render_workers=0)
+    assert fake_model.flushed == [len(model_json)]
+
+
+def test_doc_analyze_failure_drops_pending_tables(monkeypatch):
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    fake_model = FakeDeferredTableModel(fail_on_call=3)
+    monkeypatch.setattr(ModelSingleton, 'get_model', lambda self, ocr, show_log: fake_model)
+
+    with pytest.raises(RuntimeError):
+        doc_analyze(pdf_bytes, prefetch_pages=0, batch_size=1, buffer_pool_size=0, render_workers=0)
+    assert fake_model.pending == []
+    assert fake_model.table_pending == []
+    model_json = doc_analyze(pdf_bytes, prefetch_pages=0, batch_size=1, buffer_pool_size=0, render_workers=0)
+    assert fake_model.table_flushed == [len(model_json)]
+    for page in model_json:
+        page_info = page['page_info']
+        assert page['layout_dets'][1]['html'] == str((page_info['height'], page_info['width'], 3))
+
+
+def test_iter_doc_analyze_clears_queues_when_pipelined_parse_fails(monkeypatch, tmp_path):
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    fake_model = FakeDeferredMfrModel()
+    monkeypatch.setattr(ModelSingleton, 'get_model', lambda self, ocr, show_log: fake_model)
+
+    def parse_page_core(pdf_docs, magic_model, page_id, *args):
+        if page_id == 1:
+            raise RuntimeError('parse failed')
+        return {}
+
+    monkeypatch.setattr(pdf_parse_union_core, 'MagicModel', lambda model_list, docs: None)
+    monkeypatch.setattr(pdf_parse_union_core, 'parse_page_core', parse_page_core)
+    model_pages = iter_doc_analyze(pdf_bytes, prefetch_pages=2, batch_size=1, buffer_pool_size=0, render_workers=0,
+                                   flush_per_batch=True)
+    with pytest.raises(RuntimeError) as excinfo:
+        pdf_parse_union_pipelined(pdf_bytes, model_pages, DiskReaderWriter(str(tmp_path)), 'txt')
+    # 异常(及其traceback)还在时，推理和渲染已经停止，队列已经清空
+    assert excinfo.value is not None
+    assert fake_model.cleared == 1
+    assert fake_model.pending == []
+    assert fake_model.calls < len(load_images_from_pdf(pdf_bytes))
+    assert not any(thread.name == 'prefetch_iter' for thread in threading.enumerate())
+
+
+@pytest.mark.parametrize('batch_size', [1, 2])
+def test_iter_doc_analyze_flush_per_batch_yields_final_pages(monkeypatch, batch_size):
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    fake_model = FakeDeferredMfrModel()
+    monkeypatch.setattr(ModelSingleton, 'get_model', lambda self, ocr, show_log: fake_model)
+
+    pages = iter_doc_analyze(pdf_bytes, prefetch_pages=0, batch_size=batch_size, buffer_pool_size=0,
+                             render_workers=0, flush_per_batch=True)
+    page_count = 0
+    for page in pages:
+        # 产出时公式识别结果已经写回，不需要等整篇文档结束
+        page_info = page['page_info']
+        assert page['layout_dets'][0]['latex'] == str((page_info['height'], page_info['width'], 3))
+        page_count += 1
+    assert page_count == len(load_images_from_pdf(pdf_bytes))
+
+
+def test_iter_doc_analyze_reads_render_config_once(monkeypatch):
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    fake_model = FakeDeferredMfrModel()
+    monkeypatch.setattr(ModelSingleton, 'get_model', lambda self, ocr, show_log: fake_model)
+    calls = []
+
+    def get_render_config():
+        calls.append(1)
+        return {'prefetch_pages': 0, 'buffer_pool_size': 0, 'render_workers': 0}
+
+    monkeypatch.setattr(doc_analyze_by_custom_model, 'get_render_config', get_render_config)
+    pages = list(iter_doc_analyze(pdf_bytes, batch_size=1, flush_per_batch=True))
+    assert len(pages) == len(load_images_from_pdf(pdf_bytes))
+    assert len(calls) == 1
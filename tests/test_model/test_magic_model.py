@@ -0,0 +1,37 @@
+import copy
+import json
+
+from magic_pdf.libs.commons import fitz
+from magic_pdf.model.magic_model import MagicModel
+
+pdf_path = 'demo/demo2.pdf'
+model_path = 'demo/demo2.json'
+
+
+def load_magic_model(reverse=False):
+    with open(pdf_path, 'rb') as f:
+        pdf_docs = fitz.open('pdf', f.read())
+    with open(model_path, 'r', encoding='utf-8') as f:
+        model_list = json.load(f)
+    if reverse:
+        model_list = list(reversed(model_list))
+    return MagicModel(copy.deepcopy(model_list), pdf_docs), len(pdf_docs)
+
+
+def test_getters_follow_page_no_not_list_position():
+    magic_model, page_count = load_magic_model()
+    reversed_magic_model, _ = load_magic_model(reverse=True)
+    for page_no in range(page_count):
+        assert magic_model.get_imgs(page_no) == reversed_magic_model.get_imgs(page_no)
+        assert magic_model.get_tables(page_no) == reversed_magic_model.get_tables(page_no)
+        assert magic_model.get_equations(page_no) == reversed_magic_model.get_equations(page_no)
+        assert magic_model.get_text_blocks(page_no) == reversed_magic_model.get_text_blocks(page_no)
+        assert magic_model.get_title_blocks(page_no) == reversed_magic_model.get_title_blocks(page_no)
+        assert magic_model.get_discarded(page_no) == reversed_magic_model.get_discarded(page_no)
+        assert magic_model.get_all_spans(page_no) == reversed_magic_model.get_all_spans(page_no)
+
+
+def test_getters_return_empty_list_for_unknown_page():
+    magic_model, page_count = load_magic_model()
+    assert magic_model.get_text_blocks(page_count + 10) == []
+    assert magic_model.get_all_spans(page_count + 10) == []
@@ -0,0 +1,88 @@
+from PIL import Image
+
+from magic_pdf.model.mfr_cache import FormulaRecognitionCache
+from magic_pdf.model.mfr_queue import FormulaRecognitionQueue
+
+
+class FakeRecognizer:
+    """把图片尺寸当作识别结果，并记录每批的图片尺寸"""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, images):
+        self.batches.append([image.size for image in images])
+        return [f'{image.size[0]}x{image.size[1]}' for image in images]
+
+
+def make_items():
+    sizes = [(300, 20), (40, 40), (120, 30), (35, 40), (310, 20), (90, 30), (45, 40)]
+    return [(Image.new('RGB', size), {'category_id': 13}) for size in sizes]
+
+
+def test_flush_scatters_latex_back_to_res():
+    recognizer = FakeRecognizer()
+    queue = FormulaRecognitionQueue(recognizer, batch_size=3)
+    items = make_items()
+    for image, res in items:
+        queue.put(image, res)
+    assert len(queue) == len(items)
+    assert queue.flush() == len(items)
+    assert len(queue) == 0
+    for image, res in items:
+        assert res['latex'] == f'{image.size[0]}x{image.size[1]}'
+    # 按宽高比分桶，满批次在前，同一批内的公式尺寸接近
+    assert [len(batch) for batch in recognizer.batches] == [3, 3, 1]
+    assert recognizer.batches[0] == [(35, 40), (40, 40), (45, 40)]
+    assert recognizer.batches[-1] == [(310, 20)]
+    assert queue.flush() == 0
+
+
+def test_put_flushes_when_max_pending_reached():
+    recognizer = FakeRecognizer()
+    queue = FormulaRecognitionQueue(recognizer, batch_size=64, max_pending=4)
+    items = make_items()
+    for image, res in items:
+        queue.put(image, res)
+    assert len(recognizer.batches) == 1
+    assert len(queue) == len(items) - 4
+    queue.flush()
+    assert all('latex' in res for _, res in items)
+
+
+def test_cache_skips_recognized_formulas(tmp_path):
+    recognizer = FakeRecognizer()
+    cache = FormulaRecognitionCache('v1', max_items=2, cache_dir=str(tmp_path))
+    queue = FormulaRecognitionQueue(recognizer, batch_size=64, cache=cache)
+    items = make_items() + make_items()
+    for image, res in items:
+        queue.put(image, res)
+    queue.flush()
+    # 同一次flush中重复的公式只识别一次
+    assert sum(len(batch) for batch in recognizer.batches) == len(items) // 2
+    assert all(res['latex'] == f'{image.size[0]}x{image.size[1]}' for image, res in items)
+
+    # 内存中只保留2条，其余从磁盘读取
+    second_items = make_items()
+    for image, res in second_items:
+        queue.put(image, res)
+    queue.flush()
+    assert len(recognizer.batches) == 1
+    assert all(res['latex'] == f'{image.size[0]}x{image.size[1]}' for image, res in second_items)
+    assert cache.hits == len(second_items)
+
+    # 模型版本不同时不复用结果
+    other_cache = FormulaRecognitionCache('v2', max_items=2, cache_dir=str(tmp_path))
+    assert other_cache.get(other_cache.key(second_items[0][0])) is None
+    assert other_cache.misses == 1
+
+
+def test_clear_drops_pending():
+    recognizer = FakeRecognizer()
+    queue = FormulaRecognitionQueue(recognizer, batch_size=3)
+    for image, res in make_items():
+        queue.put(image, res)
+    assert queue.clear() == len(make_items())
+    assert len(queue) == 0
+    assert queue.flush() == 0
+    assert recognizer.batches == []
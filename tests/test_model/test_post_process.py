@@ -0,0 +1,134 @@
+import numpy as np
+from PIL import Image
+
+from magic_pdf.model.pek_sub_modules.post_process import (
+    assign_det_boxes_to_regions, crop_ndarray, det_boxes_union_poly,
+    get_croped_image, ocr_layout_regions, pad_crop_ndarray,
+    split_region_rec_res)
+
+# 页面内、整页、越过左上/右下边界、空区域
+bboxes = [(10, 20, 50, 80), (0, 0, 200, 300), (-10, -5, 30, 40), (150, 250, 230, 320), (190, 10, 260, 20), (5, 5, 5, 9)]
+
+
+def make_page():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 255, (300, 200, 3), dtype=np.uint8)
+
+
+def test_crop_ndarray_matches_pil_crop():
+    page = make_page()
+    pil_page = Image.fromarray(page)
+    for bbox in bboxes:
+        expected = np.asarray(get_croped_image(pil_page, bbox))
+        assert np.array_equal(crop_ndarray(page, bbox), expected), bbox
+
+
+def test_crop_ndarray_inside_page_is_view():
+    page = make_page()
+    assert np.shares_memory(crop_ndarray(page, (10, 20, 50, 80)), page)
+    assert not np.shares_memory(crop_ndarray(page, (-10, -5, 30, 40)), page)
+
+
+def test_pad_crop_ndarray_matches_white_canvas_paste():
+    page = make_page()
+    pil_page = Image.fromarray(page)
+    for bbox in bboxes:
+        canvas = Image.new('RGB', (bbox[2] - bbox[0] + 100, bbox[3] - bbox[1] + 100), 'white')
+        canvas.paste(pil_page.crop(bbox), (50, 50))
+        expected = np.asarray(canvas)
+        assert np.array_equal(pad_crop_ndarray(page, bbox, 50, 50), expected), bbox
+        # 从BGR视图截图等价于截图后再做一次 RGB->BGR 转换，结果是连续数组
+        bgr = pad_crop_ndarray(page[:, :, ::-1], bbox, 50, 50)
+        assert np.array_equal(bgr, expected[:, :, ::-1]) and bgr.flags.c_contiguous, bbox
+
+
+def test_split_region_rec_res_skips_regions_without_boxes():
+    region_dt_boxes = [None, [0, 1], [], None, [2, 3, 4]]
+    rec_res = [('a', 0.9), ('b', 0.8), ('c', 0.7), ('d', 0.6), ('e', 0.5)]
+    assert split_region_rec_res(region_dt_boxes, rec_res) == [None, rec_res[:2], [], None, rec_res[2:]]
+    assert split_region_rec_res([None, None], []) == [None, None]
+
+
+def quad(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+
+def test_assign_det_boxes_to_regions():
+    region_bboxes = [[0, 0, 100, 100], [100, 0, 200, 100], [0, 200, 200, 300]]
+    dt_boxes = np.array([
+        quad(10, 10, 90, 20),  # 只在区域0内
+        quad(80, 30, 180, 40),  # 跨区域0和1，大部分在区域1
+        quad(10, 120, 90, 130),  # 不在任何区域内
+        quad(20, 220, 180, 230),  # 区域2
+        quad(60, 50, 140, 60),  # 两个区域各占一半，不超过overlap_ratio
+    ], dtype=np.float32)
+    region_dt_boxes = assign_det_boxes_to_regions(dt_boxes, region_bboxes, overlap_ratio=0.5)
+    assert len(region_dt_boxes) == len(region_bboxes)
+    assert np.array_equal(region_dt_boxes[0], dt_boxes[[0]])
+    assert np.array_equal(region_dt_boxes[1], dt_boxes[[1]])
+    assert np.array_equal(region_dt_boxes[2], dt_boxes[[3]])
+    assert assign_det_boxes_to_regions(dt_boxes[[2]], region_bboxes) == [None, None, None]
+
+
+class FakeOcrModel:
+    """记录调用参数，每个区域返回一个覆盖整个输入图片的文本行"""
+
+    def __init__(self):
+        self.calls = []
+
+    def ocr_page(self, img, region_bboxes, mfd_res=None):
+        self.calls.append(('ocr_page', img, region_bboxes, mfd_res))
+        return [[[quad(*bbox), ('page', 0.9)]] for bbox in region_bboxes]
+
+    def ocr_regions(self, imgs, mfd_res_list):
+        self.calls.append(('ocr_regions', imgs, mfd_res_list))
+        return [[[quad(0, 0, img.shape[1], img.shape[0]), ('region', 0.9)]] for img in imgs]
+
+    def ocr(self, img, mfd_res=None):
+        self.calls.append(('ocr', img, mfd_res))
+        return [[[quad(0, 0, img.shape[1], img.shape[0]), ('region', 0.9)]]]
+
+
+ocr_res_list = [{'poly': [10, 20, 110, 20, 110, 60, 10, 60]}, {'poly': [20, 100, 180, 100, 180, 200, 20, 200]}]
+mfd_res = [{'bbox': [30, 30, 50, 40]}, {'bbox': [150, 250, 190, 290]}]
+
+
+def test_ocr_layout_regions_page_det_in_page_coordinates():
+    ocr_model = FakeOcrModel()
+    image_bgr = make_page()[:, :, ::-1]
+    page_ocr_res, offsets = ocr_layout_regions(ocr_model, image_bgr, ocr_res_list, mfd_res, page_det=True)
+    (name, img, region_bboxes, page_mfd_res), = ocr_model.calls
+    assert name == 'ocr_page'
+    assert img.flags.c_contiguous and np.array_equal(img, image_bgr)
+    assert region_bboxes == [[10, 20, 110, 60], [20, 100, 180, 200]]
+    # 整页检测时公式区域保持整页坐标，返回的文本行也是整页坐标，不需要偏移
+    assert page_mfd_res == mfd_res
+    assert offsets == [(0, 0), (0, 0)]
+    assert [ocr_res[0][0] for ocr_res in page_ocr_res] == [quad(*bbox) for bbox in region_bboxes]
+
+
+def test_ocr_layout_regions_crops_with_paste():
+    image_bgr = make_page()[:, :, ::-1]
+    for batch_rec in [False, True]:
+        ocr_model = FakeOcrModel()
+        page_ocr_res, offsets = ocr_layout_regions(ocr_model, image_bgr, ocr_res_list, mfd_res, batch_rec=batch_rec)
+        if batch_rec:
+            (name, imgs, mfd_res_list), = ocr_model.calls
+            assert name == 'ocr_regions'
+        else:
+            assert [call[0] for call in ocr_model.calls] == ['ocr', 'ocr']
+            imgs = [call[1] for call in ocr_model.calls]
+            mfd_res_list = [call[2] for call in ocr_model.calls]
+        assert offsets == [(10 - 50, 20 - 50), (20 - 50, 100 - 50)]
+        assert np.array_equal(imgs[0], pad_crop_ndarray(image_bgr, (10, 20, 110, 60), 50, 50))
+        # 公式区域转换到截图坐标，截图外的公式丢弃
+        assert mfd_res_list == [[{'bbox': [70, 60, 90, 70]}], [{'bbox': [180, 200, 220, 240]}]]
+        assert len(page_ocr_res) == len(ocr_res_list)
+
+
+def test_det_boxes_union_poly_covers_all_lines():
+    # 区域截图四周留白50，区域左上角在整页的 (40, 60)
+    ocr_res = [quad(55, 52, 150, 70), quad(52, 80, 120, 98), quad(60, 105, 140, 120)]
+    poly = det_boxes_union_poly(ocr_res, 40 - 50, 60 - 50)
+    assert poly == [42, 62, 140, 62, 140, 130, 42, 130]
+    assert det_boxes_union_poly(ocr_res[:1]) == [55, 52, 150, 52, 150, 70, 55, 70]
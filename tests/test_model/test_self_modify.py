@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip('paddleocr')
+
+from magic_pdf.model.pek_sub_modules.post_process import ocr_layout_regions  # noqa: E402
+from magic_pdf.model.pek_sub_modules.self_modify import ModifiedPaddleOCR  # noqa: E402
+
+
+def fake_text_detector(img):
+    """把图片中的黑色矩形当作文本行，返回四点检测框，没有文本行时与PaddleOCR一样返回None"""
+    mask = (img.min(axis=2) < 128).astype(np.uint8)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if len(contours) == 0:
+        return None, 0
+    boxes = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        boxes.append([[x, y], [x + w, y], [x + w, y + h], [x, y + h]])
+    return np.array(boxes, dtype=np.float32), 0
+
+
+def fake_text_recognizer(img_crop_list):
+    """识别结果为截图的宽度，宽度小于40的文本行置信度低于drop_score"""
+    return [(str(crop.shape[1]), 0.9 if crop.shape[1] >= 40 else 0.1) for crop in img_crop_list], 0
+
+
+def make_ocr():
+    ocr = ModifiedPaddleOCR.__new__(ModifiedPaddleOCR)
+    ocr.use_angle_cls = False
+    ocr.drop_score = 0.5
+    ocr.page_num = 0
+    ocr.args = SimpleNamespace(det_box_type='quad', save_crop_res=False)
+    ocr.text_detector = fake_text_detector
+    ocr.text_recognizer = fake_text_recognizer
+    return ocr
+
+
+def make_region(lines, shape=(200, 300, 3)):
+    img = np.full(shape, 255, dtype=np.uint8)
+    for x0, y0, x1, y1 in lines:
+        img[y0:y1, x0:x1] = 0
+    return img
+
+
+def test_ocr_regions_same_as_ocr():
+    ocr = make_ocr()
+    imgs = [
+        make_region([(10, 10, 120, 30), (10, 60, 200, 80)]),
+        make_region([]),
+        make_region([(10, 10, 30, 30)]),
+        make_region([(20, 100, 280, 120), (20, 150, 60, 170), (100, 150, 260, 170)]),
+        make_region([]),
+        make_region([(50, 20, 250, 40)]),
+    ]
+    mfd_res_list = [[], [], [], [{'bbox': [140, 145, 180, 175]}], [], []]
+    expected = [ocr.ocr(img, mfd_res=mfd_res)[0] for img, mfd_res in zip(imgs, mfd_res_list)]
+    # 没有检测结果和检测结果都被过滤的区域为None，其余区域的文本行要和各自的截图对应
+    assert expected[1] is None and expected[2] is None and expected[4] is None
+    assert ocr.ocr_regions(imgs, mfd_res_list) == expected
+
+
+page_lines = [(20, 20, 180, 40), (20, 60, 120, 80), (220, 20, 380, 40), (20, 300, 380, 320), (200, 200, 300, 220)]
+page_region_bboxes = [[10, 10, 190, 100], [210, 10, 390, 100], [10, 280, 390, 340]]
+
+
+def line_bboxes(ocr_res):
+    return [[min(x for x, _ in box), min(y for _, y in box), max(x for x, _ in box), max(y for _, y in box)]
+            for box, _ in ocr_res]
+
+
+def test_ocr_page_assigns_lines_in_page_coordinates():
+    ocr = make_ocr()
+    img = make_region(page_lines, shape=(400, 400, 3))
+    page_ocr_res = ocr.ocr_page(img, page_region_bboxes)
+    assert len(page_ocr_res) == len(page_region_bboxes)
+    # 每个文本行只属于一个区域，坐标为整页坐标，不在任何区域内的 (200, 200, 300, 220) 被丢弃
+    assert line_bboxes(page_ocr_res[0]) == [[20, 20, 180, 40], [20, 60, 120, 80]]
+    assert line_bboxes(page_ocr_res[1]) == [[220, 20, 380, 40]]
+    assert line_bboxes(page_ocr_res[2]) == [[20, 300, 380, 320]]
+    assert ocr.ocr_page(make_region([], shape=(400, 400, 3)), page_region_bboxes) == [None, None, None]
+
+
+def test_ocr_page_splits_lines_by_page_mfd_res():
+    ocr = make_ocr()
+    img = make_region(page_lines, shape=(400, 400, 3))
+    # 公式区域为整页坐标，把第三个区域的文本行切成两段
+    mfd_res = [{'bbox': [180, 295, 220, 325]}]
+    page_ocr_res = ocr.ocr_page(img, page_region_bboxes, mfd_res=mfd_res)
+    assert page_ocr_res[:2] == ocr.ocr_page(img, page_region_bboxes)[:2]
+    split_bboxes = line_bboxes(page_ocr_res[2])
+    assert len(split_bboxes) == 2
+    assert split_bboxes[0][2] <= 180 and split_bboxes[1][0] >= 220
+
+
+def test_ocr_layout_regions_page_det_with_paddle():
+    ocr = make_ocr()
+    img = make_region(page_lines, shape=(400, 400, 3))
+    ocr_res_list = [{'poly': [x0, y0, x1, y0, x1, y1, x0, y1]} for x0, y0, x1, y1 in page_region_bboxes]
+    page_ocr_res, offsets = ocr_layout_regions(ocr, img[:, :, ::-1], ocr_res_list, [], page_det=True)
+    assert offsets == [(0, 0)] * len(ocr_res_list)
+    assert page_ocr_res == ocr.ocr_page(np.ascontiguousarray(img[:, :, ::-1]), page_region_bboxes)
@@ -0,0 +1,106 @@
+import time
+
+from magic_pdf.libs.Constants import TABLE_MASTER, TABLE_TIMEOUT
+from magic_pdf.model.table_recognizer import (TableRecognitionQueue,
+                                              TableRecognizer)
+
+
+class FakeTableModel:
+    def img2html(self, image):
+        if image == 'slow':
+            time.sleep(60)
+        if image == 'bad':
+            raise ValueError('bad table')
+        return f'<table>{image}</table>'
+
+
+class FakeBatchRecognizer:
+    """按 TableRecognizer.recognize_batch 的格式返回结果，并记录每次调用的batch大小"""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def recognize_batch(self, images):
+        self.batch_sizes.append(len(images))
+        return [('truncated' if image == 'bad' else f'\\begin{{tabular}}{image}\\end{{tabular}}', None, image == 'slow')
+                for image in images]
+
+
+def fake_table_model_init(*args):
+    return FakeTableModel()
+
+
+def failing_table_model_init(*args):
+    raise RuntimeError('no table model')
+
+
+def slow_table_model_init(*args):
+    time.sleep(60)
+    return FakeTableModel()
+
+
+def test_table_recognizer_in_process():
+    recognizer = TableRecognizer(TABLE_MASTER, 10, table_model=FakeTableModel())
+    assert recognizer.recognize('a') == (None, '<table>a</table>', False)
+
+
+def test_table_recognizer_enforces_max_time():
+    recognizer = TableRecognizer(TABLE_MASTER, 3, init_fn=fake_table_model_init)
+    try:
+        assert recognizer.recognize('a') == (None, '<table>a</table>', False)
+        start = time.time()
+        assert recognizer.recognize('slow') == (None, None, True)
+        assert time.time() - start < 30
+        # 超时后重新拉起子进程，后续表格不受影响
+        assert recognizer.recognize('b') == (None, '<table>b</table>', False)
+        assert recognizer.recognize('bad') == (None, None, False)
+        assert recognizer.recognize('c') == (None, '<table>c</table>', False)
+    finally:
+        recognizer.close()
+
+
+def test_table_recognizer_falls_back_when_worker_fails_to_load():
+    recognizer = TableRecognizer(TABLE_MASTER, 3, init_fn=failing_table_model_init)
+    try:
+        assert recognizer.recognize_batch(['a', 'b']) == [(None, None, False)] * 2
+    finally:
+        recognizer.close()
+
+    recognizer = TableRecognizer(TABLE_MASTER, 3, init_fn=slow_table_model_init, load_timeout=2)
+    try:
+        start = time.time()
+        assert recognizer.recognize('a') == (None, None, False)
+        assert time.time() - start < 30
+    finally:
+        recognizer.close()
+
+
+def test_table_queue_batches_and_writes_back():
+    recognizer = FakeBatchRecognizer()
+    queue = TableRecognitionQueue(recognizer, batch_size=2)
+    items = [(image, {'category_id': 5}) for image in ['a', 'bad', 'c', 'slow', 'e']]
+    for image, res in items:
+        queue.put(image, res)
+    assert queue.flush() == len(items)
+    assert recognizer.batch_sizes == [2, 2, 1]
+    for image, res in items:
+        if image == 'bad':
+            # 没有正常结束的latex不写回
+            assert 'latex' not in res
+        elif image == 'slow':
+            assert res == {'category_id': 5, TABLE_TIMEOUT: True}
+        else:
+            assert res['latex'] == f'\\begin{{tabular}}{image}\\end{{tabular}}'
+    assert len(queue) == 0
+
+
+def test_table_queue_clear_drops_pending():
+    recognizer = FakeBatchRecognizer()
+    queue = TableRecognitionQueue(recognizer, batch_size=2)
+    items = [(image, {'category_id': 5}) for image in ['a', 'b', 'c']]
+    for image, res in items:
+        queue.put(image, res)
+    assert queue.clear() == len(items)
+    assert queue.flush() == 0
+    assert recognizer.batch_sizes == []
+    assert all('latex' not in res for _, res in items)
@@ -0,0 +1,88 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+from magic_pdf.model import tesseract_ocr
+from magic_pdf.model.pek_sub_modules.post_process import pad_crop_ndarray
+from magic_pdf.model.tesseract_ocr import TesseractOCR, ocr_lines_to_layout_res
+
+# pytesseract.image_to_data(output_type=DICT) 的词级别输出，conf为-1的是block/par/line本身的记录
+image_data = {
+    'block_num': [1, 1, 1, 1, 1, 1, 2, 2],
+    'par_num': [0, 1, 1, 1, 1, 1, 1, 1],
+    'line_num': [0, 1, 1, 1, 2, 2, 1, 1],
+    'left': [0, 10, 60, 200, 10, 50, 300, 330],
+    'top': [0, 12, 10, 14, 40, 42, 80, 78],
+    'width': [400, 40, 50, 30, 30, 20, 20, 40],
+    'height': [100, 20, 24, 10, 20, 20, 15, 20],
+    'conf': ['-1', '90', '80', '-1', '70', '50', '95', '85'],
+    'text': ['', 'Hello', 'world', '', 'foo', ' ', 'bar', 'baz'],
+}
+
+
+def fake_pytesseract(calls):
+    def image_to_data(image, lang=None, output_type=None):
+        calls.append((image, lang, output_type))
+        return image_data
+
+    return SimpleNamespace(image_to_data=image_to_data, Output=SimpleNamespace(DICT='dict'))
+
+
+def test_ocr_by_subprocess_groups_words_into_lines(monkeypatch):
+    calls = []
+    monkeypatch.setattr(tesseract_ocr, 'tesserocr', None)
+    monkeypatch.setattr(tesseract_ocr, 'pytesseract', fake_pytesseract(calls))
+    ocr = TesseractOCR(lang='por')
+    image = Image.new('RGB', (400, 100), 'white')
+    lines = ocr.ocr(image)
+    ocr.close()
+    assert calls == [(image, 'por', 'dict')]
+    # 按 (block_num, par_num, line_num) 合并，bbox取并集，置信度取平均，跳过conf<0和空白的词
+    assert lines == [
+        {'bbox': [10, 10, 110, 34], 'text': 'Hello world', 'score': 0.85},
+        {'bbox': [10, 40, 40, 60], 'text': 'foo', 'score': 0.7},
+        {'bbox': [300, 78, 370, 98], 'text': 'bar baz', 'score': 0.9},
+    ]
+
+
+def test_ocr_regions_limits_omp_threads_of_subprocess(monkeypatch):
+    limits = []
+
+    def image_to_data(image, lang=None, output_type=None):
+        limits.append(os.environ.get('OMP_THREAD_LIMIT'))
+        return image_data
+
+    # 先setenv再delenv，测试结束后恢复成原来的环境变量
+    monkeypatch.setenv('OMP_THREAD_LIMIT', '4')
+    monkeypatch.delenv('OMP_THREAD_LIMIT')
+    monkeypatch.setattr(tesseract_ocr, 'tesserocr', None)
+    monkeypatch.setattr(tesseract_ocr, 'pytesseract',
+                        SimpleNamespace(image_to_data=image_to_data, Output=SimpleNamespace(DICT='dict')))
+    ocr = TesseractOCR(lang='por', workers=2)
+    # 构造时设置一次，识别过程中不再修改环境变量
+    assert os.environ['OMP_THREAD_LIMIT'] == '1'
+    images = [Image.new('RGB', (400, 100), 'white') for _ in range(3)]
+    assert len(ocr.ocr_regions(images)) == len(images)
+    ocr.close()
+    assert limits == ['1'] * len(images)
+    assert os.environ['OMP_THREAD_LIMIT'] == '1'
+
+    # 用户已经设置时不覆盖
+    monkeypatch.setenv('OMP_THREAD_LIMIT', '2')
+    TesseractOCR(lang='por', workers=2).close()
+    assert os.environ['OMP_THREAD_LIMIT'] == '2'
+
+
+def test_ocr_lines_to_layout_res_maps_crop_to_page():
+    page = np.random.default_rng(0).integers(0, 255, (300, 200, 3), dtype=np.uint8)
+    xmin, ymin, paste = 40, 60, 50
+    crop = pad_crop_ndarray(page, (xmin, ymin, 150, 200), paste, paste)
+    lines = [{'bbox': [55, 52, 90, 70], 'text': 'a', 'score': 0.9}]
+    layout_res = ocr_lines_to_layout_res(lines, xmin - paste, ymin - paste)
+    assert layout_res == [{'category_id': 15, 'poly': [45, 62, 80, 62, 80, 80, 45, 80], 'score': 0.9, 'text': 'a'}]
+    # 截图中文本行的像素与整页对应位置一致
+    x0, y0, x1, y1 = lines[0]['bbox']
+    page_x0, page_y0, page_x1, _, _, page_y1 = layout_res[0]['poly'][:6]
+    assert np.array_equal(crop[y0:y1, x0:x1], page[page_y0:page_y1, page_x0:page_x1])
@@ -0,0 +1,59 @@
+import copy
+import json
+
+import pytest
+
+from magic_pdf.model.doc_analyze_by_custom_model import iter_images_from_pdf
+from magic_pdf.pdf_parse_union_core import (pdf_parse_union,
+                                              pdf_parse_union_pipelined)
+from magic_pdf.rw.DiskReaderWriter import DiskReaderWriter
+
+
+@pytest.mark.parametrize('parse_mode', ['txt', 'ocr'])
+def test_parallel_parse_same_as_sequential(tmp_path, parse_mode):
+    with open('demo/demo2.pdf', 'rb') as f:
+        pdf_bytes = f.read()
+    with open('demo/demo2.json', 'r', encoding='utf-8') as f:
+        model_list = json.load(f)
+    image_writer = DiskReaderWriter(str(tmp_path))
+
+    sequential = pdf_parse_union(pdf_bytes, copy.deepcopy(model_list), image_writer, parse_mode,
+                                 end_page_id=1, parse_workers=0)
+    parallel = pdf_parse_union(pdf_bytes, copy.deepcopy(model_list), image_writer, parse_mode,
+                               end_page_id=1, parse_workers=2)
+    assert json.dumps(parallel, ensure_ascii=False) == json.dumps(sequential, ensure_ascii=False)
+
+
+@pytest.mark.parametrize('parse_mode', ['txt', 'ocr'])
+def test_pipelined_parse_same_as_staged(tmp_path, parse_mode):
+    with open('demo/demo2.pdf', 'rb') as f:
+        pdf_bytes = f.read()
+    with open('demo/demo2.json', 'r', encoding='utf-8') as f:
+        model_list = json.load(f)
+    image_writer = DiskReaderWriter(str(tmp_path))
+
+    staged = pdf_parse_union(pdf_bytes, copy.deepcopy(model_list), image_writer, parse_mode,
+                             start_page_id=1, parse_workers=0)
+    pipelined, pipelined_model_list = pdf_parse_union_pipelined(pdf_bytes, iter(copy.deepcopy(model_list)),
+                                                                image_writer, parse_mode, start_page_id=1)
+    assert json.dumps(pipelined, ensure_ascii=False) == json.dumps(staged, ensure_ascii=False)
+    # 返回的是解析修改之前的模型结果
+    assert pipelined_model_list == model_list
+
+
+def test_pipelined_parse_with_background_render(tmp_path):
+    with open('demo/demo2.pdf', 'rb') as f:
+        pdf_bytes = f.read()
+    with open('demo/demo2.json', 'r', encoding='utf-8') as f:
+        model_list = json.load(f)
+    image_writer = DiskReaderWriter(str(tmp_path))
+
+    def model_pages():
+        # 和 iter_doc_analyze 一样在后台线程中渲染页面，同时主线程在解析
+        for page_dict, img_dict in zip(copy.deepcopy(model_list), iter_images_from_pdf(pdf_bytes)):
+            assert img_dict['img'] is not None
+            yield page_dict
+
+    staged = pdf_parse_union(pdf_bytes, copy.deepcopy(model_list), image_writer, 'txt', parse_workers=0)
+    pipelined, _ = pdf_parse_union_pipelined(pdf_bytes, model_pages(), image_writer, 'txt')
+    assert json.dumps(pipelined, ensure_ascii=False) == json.dumps(staged, ensure_ascii=False)
@@ -0,0 +1,36 @@
+import copy
+import json
+
+import pytest
+
+from magic_pdf.libs.MakeContentConfig import DropMode, MakeMode
+from magic_pdf.pipe.AbsPipe import AbsPipe
+from magic_pdf.pipe.OCRPipe import OCRPipe
+from magic_pdf.rw.DiskReaderWriter import DiskReaderWriter
+
+
+@pytest.fixture(scope='module')
+def parsed_pipe(tmp_path_factory):
+    with open('demo/demo2.pdf', 'rb') as f:
+        pdf_bytes = f.read()
+    with open('demo/demo2.json', 'r', encoding='utf-8') as f:
+        model_list = json.load(f)
+    pipe = OCRPipe(pdf_bytes, model_list, DiskReaderWriter(str(tmp_path_factory.mktemp('images'))))
+    pipe.pipe_parse()
+    return pipe
+
+
+@pytest.mark.parametrize('md_make_mode', [MakeMode.MM_MD, MakeMode.NLP_MD])
+def test_in_process_make_same_as_compressed(parsed_pipe, md_make_mode):
+    pdf_mid_data = copy.deepcopy(parsed_pipe.pdf_mid_data)
+    compressed_pdf_mid_data = parsed_pipe.get_compress_pdf_mid_data()
+    expected_md = AbsPipe.mk_markdown(compressed_pdf_mid_data, 'images', DropMode.NONE, md_make_mode)
+    expected_content_list = AbsPipe.mk_uni_format(compressed_pdf_mid_data, 'images', DropMode.NONE)
+
+    assert parsed_pipe.pipe_mk_markdown('images', DropMode.NONE, md_make_mode) == expected_md
+    assert parsed_pipe.pipe_mk_uni_format('images', DropMode.NONE) == expected_content_list
+    md_content, content_list = parsed_pipe.pipe_mk_markdown_and_uni_format('images', DropMode.NONE, md_make_mode)
+    assert md_content == expected_md
+    assert content_list == expected_content_list
+    # 生成markdown和content_list不能修改中间数据
+    assert parsed_pipe.pdf_mid_data == pdf_mid_data
@@ -0,0 +1,27 @@
+import pytest
+
+from magic_pdf.libs.commons import fitz
+from magic_pdf.libs.pdf_textpage import TextPageCache
+from magic_pdf.pre_proc.equations_replace import (combine_chars_to_pymudict,
+                                                  fill_span_text_from_chars)
+
+
+@pytest.mark.parametrize('demo_name', ['demo1', 'demo2'])
+def test_fill_span_text_from_chars_same_as_combine(demo_name):
+    doc = fitz.open(f'demo/{demo_name}.pdf')
+    for page in doc:
+        text_raw_blocks = page.get_text('dict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
+        char_level_text_blocks = page.get_text('rawdict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
+        expected = combine_chars_to_pymudict(text_raw_blocks, char_level_text_blocks)
+        rawdict_blocks = page.get_text('rawdict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
+        assert fill_span_text_from_chars(rawdict_blocks) == expected
+
+
+def test_text_page_cache_same_as_get_text():
+    doc = fitz.open('demo/demo1.pdf')
+    text_pages = TextPageCache(max_cached_pages=1)
+    for _ in range(2):
+        # 第二轮遍历拿到的是新的Page对象，缓存的TextPage仍然可用
+        for page in doc:
+            assert text_pages.get_text(page, 'text') == page.get_text('text')
+            assert text_pages.get_text(page, 'rawdict') == page.get_text('rawdict', flags=fitz.TEXTFLAGS_TEXT)
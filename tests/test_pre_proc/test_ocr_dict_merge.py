@@ -0,0 +1,112 @@
+import copy
+import random
+
+import pytest
+
+from magic_pdf.libs.boxbase import calculate_overlap_area_in_bbox1_area_ratio
+from magic_pdf.libs.ocr_content_type import BlockType
+from magic_pdf.libs.spatial_index import BboxGridIndex
+from magic_pdf.pre_proc.ocr_dict_merge import (fill_spans_in_blocks,
+                                               sort_blocks_by_layout)
+
+
+def legacy_fill_spans_in_blocks(blocks, spans, radio):
+    """基于双重循环的原始实现，作为对照."""
+    block_with_spans = []
+    for block in blocks:
+        block_spans = []
+        for span in spans:
+            if calculate_overlap_area_in_bbox1_area_ratio(span['bbox'], block[0:4]) > radio:
+                block_spans.append(span)
+        block_with_spans.append({'type': block[7], 'bbox': block[0:4], 'spans': block_spans})
+        for span in block_spans:
+            spans.remove(span)
+    return block_with_spans, spans
+
+
+def legacy_sort_blocks_by_layout(all_bboxes, layout_bboxes):
+    """基于双重循环的原始实现，作为对照."""
+    sort_blocks = []
+    for item in layout_bboxes:
+        layout_blocks = []
+        for block in all_bboxes:
+            if block[7] == BlockType.Footnote:
+                continue
+            if calculate_overlap_area_in_bbox1_area_ratio(block[:4], item['layout_bbox']) > 0.8:
+                layout_blocks.append(block)
+        for block in layout_blocks:
+            all_bboxes.remove(block)
+        layout_blocks.sort(key=lambda x: x[1])
+        sort_blocks.extend(layout_blocks)
+    return sort_blocks
+
+
+def random_bboxes(rng, count, max_xy, max_w, max_h):
+    bboxes = []
+    for _ in range(count):
+        x0, y0 = rng.randint(0, max_xy), rng.randint(0, max_xy)
+        bboxes.append([x0, y0, x0 + rng.randint(0, max_w), y0 + rng.randint(0, max_h)])
+    return bboxes
+
+
+def random_page(seed):
+    rng = random.Random(seed)
+    block_types = [BlockType.Text, BlockType.Title, BlockType.Image, BlockType.Footnote]
+    blocks = [bbox + [None, None, None, rng.choice(block_types)]
+              for bbox in random_bboxes(rng, 40, 400, 150, 80)]
+    spans = [{'bbox': bbox, 'type': 'text'} for bbox in random_bboxes(rng, 500, 500, 30, 10)]
+    spans.extend(copy.deepcopy(rng.sample(spans, 10)))
+    rng.shuffle(spans)
+    layouts = [{'layout_bbox': bbox} for bbox in random_bboxes(rng, 6, 300, 300, 300)]
+    return blocks, spans, layouts
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_fill_spans_in_blocks_same_as_legacy(seed):
+    blocks, spans, _ = random_page(seed)
+    for radio in [0.3, 0.4]:
+        new_spans, legacy_spans = copy.deepcopy(spans), copy.deepcopy(spans)
+        new_result = fill_spans_in_blocks(blocks, new_spans, radio)
+        assert new_result == legacy_fill_spans_in_blocks(blocks, legacy_spans, radio)
+        # 未放入block的span需要在原列表上删除
+        assert new_result[1] is new_spans
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_sort_blocks_by_layout_same_as_legacy(seed):
+    blocks, _, layouts = random_page(seed)
+    new_blocks, legacy_blocks = copy.deepcopy(blocks), copy.deepcopy(blocks)
+    assert sort_blocks_by_layout(new_blocks, layouts) == legacy_sort_blocks_by_layout(legacy_blocks, layouts)
+    assert new_blocks == legacy_blocks
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_bbox_grid_index_finds_all_overlaps(seed):
+    rng = random.Random(seed)
+    boxes = random_bboxes(rng, 50, 100, 40, 40) + [[10, 10, 5, 5]]
+    queries = random_bboxes(rng, 200, 150, 20, 20)
+    query_idx, box_idx = BboxGridIndex(boxes).query_pairs(queries)
+    expected = [(q, b) for q, query in enumerate(queries) for b, box in enumerate(boxes)
+                if max(query[0], box[0]) <= min(query[2], box[2]) and max(query[1], box[1]) <= min(query[3], box[3])]
+    assert list(zip(query_idx.tolist(), box_idx.tolist())) == expected
+
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_bbox_grid_index_best_containers(seed):
+    rng = random.Random(seed)
+    boxes = random_bboxes(rng, 30, 100, 60, 60)
+    queries = random_bboxes(rng, 200, 150, 20, 20)
+    best = BboxGridIndex(boxes).best_containers_by_overlap_ratio(queries, 0.5)
+    for query, box_idx in zip(queries, best.tolist()):
+        ratios = [calculate_overlap_area_in_bbox1_area_ratio(query, box) for box in boxes]
+        if max(ratios) > 0.5:
+            assert box_idx == ratios.index(max(ratios))
+        else:
+            assert box_idx == -1
+
+def test_fill_spans_in_blocks_empty():
+    assert fill_spans_in_blocks([], [], 0.3) == ([], [])
+    spans = [{'bbox': [0, 0, 1, 1]}]
+    assert fill_spans_in_blocks([], spans, 0.3) == ([], spans)
+    assert sort_blocks_by_layout([], []) == []
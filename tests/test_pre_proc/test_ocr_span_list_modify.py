@@ -0,0 +1,128 @@
+import copy
+import json
+import random
+
+import pytest
+
+from magic_pdf.libs.boxbase import (calculate_iou,
+                                    get_minbox_if_overlap_by_ratio)
+from magic_pdf.libs.commons import fitz
+from magic_pdf.libs.drop_tag import DropTag
+from magic_pdf.model.magic_model import MagicModel
+from magic_pdf.pdf_parse_union_core import (replace_text_span,
+                                            txt_spans_extract)
+from magic_pdf.pre_proc.ocr_span_list_modify import (
+    remove_overlaps_low_confidence_spans, remove_overlaps_min_spans)
+
+
+def legacy_remove_overlaps_low_confidence_spans(spans):
+    """基于双重循环的原始实现，作为对照."""
+    dropped_spans = []
+    for span1 in spans:
+        for span2 in spans:
+            if span1 != span2:
+                if span1 in dropped_spans or span2 in dropped_spans:
+                    continue
+                else:
+                    if calculate_iou(span1['bbox'], span2['bbox']) > 0.9:
+                        if span1['score'] < span2['score']:
+                            span_need_remove = span1
+                        else:
+                            span_need_remove = span2
+                        if span_need_remove is not None and span_need_remove not in dropped_spans:
+                            dropped_spans.append(span_need_remove)
+
+    if len(dropped_spans) > 0:
+        for span_need_remove in dropped_spans:
+            spans.remove(span_need_remove)
+            span_need_remove['tag'] = DropTag.SPAN_OVERLAP
+
+    return spans, dropped_spans
+
+
+def legacy_remove_overlaps_min_spans(spans):
+    """基于双重循环的原始实现，作为对照."""
+    dropped_spans = []
+    for span1 in spans:
+        for span2 in spans:
+            if span1 != span2:
+                overlap_box = get_minbox_if_overlap_by_ratio(span1['bbox'], span2['bbox'], 0.65)
+                if overlap_box is not None:
+                    span_need_remove = next((span for span in spans if span['bbox'] == overlap_box), None)
+                    if span_need_remove is not None and span_need_remove not in dropped_spans:
+                        dropped_spans.append(span_need_remove)
+
+    if len(dropped_spans) > 0:
+        for span_need_remove in dropped_spans:
+            spans.remove(span_need_remove)
+            span_need_remove['tag'] = DropTag.SPAN_OVERLAP
+
+    return spans, dropped_spans
+
+
+def demo_page_spans(demo_name, parse_mode, max_pages):
+    with open(f'demo/{demo_name}.pdf', 'rb') as f:
+        pdf_docs = fitz.open('pdf', f.read())
+    with open(f'demo/{demo_name}.json', 'r', encoding='utf-8') as f:
+        model_list = json.load(f)
+    magic_model = MagicModel(model_list, pdf_docs)
+    pages_spans = []
+    for page_id in range(min(len(pdf_docs), max_pages)):
+        spans = magic_model.get_all_spans(page_id)
+        if parse_mode == 'txt':
+            inline_equations, interline_equations, _ = magic_model.get_equations(page_id)
+            pymu_spans = txt_spans_extract(pdf_docs[page_id], inline_equations, interline_equations)
+            spans = replace_text_span(pymu_spans, spans)
+        pages_spans.append(spans)
+    return pages_spans
+
+
+def random_dense_spans(seed, span_count=300):
+    rng = random.Random(seed)
+    spans = []
+    for _ in range(span_count):
+        x0, y0 = rng.randint(0, 200), rng.randint(0, 200)
+        spans.append({
+            'bbox': [x0, y0, x0 + rng.randint(1, 30), y0 + rng.randint(1, 10)],
+            'score': rng.choice([0.5, 0.9, 1.0]),
+            'type': 'text',
+        })
+    # 加入近似重复、完全重复的span
+    for span in rng.sample(spans, 30):
+        near_dup = copy.deepcopy(span)
+        near_dup['bbox'][2] += 1
+        spans.append(near_dup)
+    spans.extend(copy.deepcopy(rng.sample(spans, 10)))
+    rng.shuffle(spans)
+    return spans
+
+
+def assert_same_result(new_fn, legacy_fn, spans):
+    new_spans, new_dropped = new_fn(copy.deepcopy(spans))
+    legacy_spans, legacy_dropped = legacy_fn(copy.deepcopy(spans))
+    assert new_spans == legacy_spans
+    assert new_dropped == legacy_dropped
+    assert all(span['tag'] == DropTag.SPAN_OVERLAP for span in new_dropped)
+
+
+@pytest.mark.parametrize('demo_name', ['demo1', 'demo2'])
+@pytest.mark.parametrize('parse_mode', ['txt', 'ocr'])
+def test_remove_overlap_spans_same_as_legacy_on_demo_pdfs(demo_name, parse_mode):
+    # txt模式下每页有上千个span，原始实现太慢，只取第一页
+    max_pages = 1 if parse_mode == 'txt' else 100
+    for spans in demo_page_spans(demo_name, parse_mode, max_pages):
+        assert_same_result(remove_overlaps_low_confidence_spans, legacy_remove_overlaps_low_confidence_spans, spans)
+        spans, _ = legacy_remove_overlaps_low_confidence_spans(copy.deepcopy(spans))
+        assert_same_result(remove_overlaps_min_spans, legacy_remove_overlaps_min_spans, spans)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_remove_overlap_spans_same_as_legacy_on_dense_spans(seed):
+    spans = random_dense_spans(seed)
+    assert_same_result(remove_overlaps_low_confidence_spans, legacy_remove_overlaps_low_confidence_spans, spans)
+    assert_same_result(remove_overlaps_min_spans, legacy_remove_overlaps_min_spans, spans)
+
+
+def test_remove_overlap_spans_empty():
+    assert remove_overlaps_low_confidence_spans([]) == ([], [])
+    assert remove_overlaps_min_spans([]) == ([], [])
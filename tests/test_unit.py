@@ -1,5 +1,7 @@
 import os
+import random
 
+import numpy as np
 import pytest
 
 from magic_pdf.libs.boxbase import (__is_overlaps_y_exceeds_threshold,
@@ -9,7 +11,7 @@ from magic_pdf.libs.boxbase import (__is_overlaps_y_exceeds_threshold,
                                     _is_left_overlap, _is_part_overlap,
                                     _is_vertical_full_overlap, _left_intersect,
                                     _right_intersect, bbox_distance,
-                                    bbox_relative_pos, calculate_iou,
+                                    bbox_relative_pos, box_area, calculate_iou,
                                     calculate_overlap_area_2_minbox_area_ratio,
                                     calculate_overlap_area_in_bbox1_area_ratio,
                                     find_bottom_nearest_text_bbox,
@@ -17,9 +19,16 @@ from magic_pdf.libs.boxbase import (__is_overlaps_y_exceeds_threshold,
                                     find_right_nearest_text_bbox,
                                     find_top_nearest_text_bbox,
                                     get_bbox_in_boundary,
-                                    get_minbox_if_overlap_by_ratio)
+                                    get_minbox_if_overlap_by_ratio,
+                                    get_overlap_area)
+from magic_pdf.libs.boxbase_batch import (
+    batch_iou, batch_is_in, batch_minbox_if_overlap_by_ratio,
+    batch_overlap_area_2_minbox_area_ratio,
+    batch_overlap_area_in_bbox1_area_ratio, paired_iou,
+    paired_minbox_if_overlap_by_ratio, paired_overlap_area_in_bbox1_area_ratio)
 from magic_pdf.libs.commons import get_top_percent_list, join_path, mymax
 from magic_pdf.libs.config_reader import get_s3_config
+from magic_pdf.libs.language import detect_lang, detect_line_lang
 from magic_pdf.libs.path_utils import parse_s3path
 
 
@@ -527,6 +536,55 @@ def test_bbox_distance(box1: tuple, box2: tuple, target_num: float) -> None:
     assert target_num - bbox_distance(box1, box2) < 1
 
 
+# 批量版本的几何函数与标量版本结果一致
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_boxbase_batch_matches_scalar(seed) -> None:
+    rng = random.Random(seed)
+
+    def rand_box():
+        x0, y0 = rng.randint(0, 300), rng.randint(0, 300)
+        # 混合整数和浮点坐标，并包含零宽/零高的bbox
+        return [x0, y0, x0 + rng.choice([0, rng.randint(1, 120), rng.uniform(0.5, 120)]), y0 + rng.randint(0, 120)]
+
+    boxes1 = [rand_box() for _ in range(40)]
+    boxes2 = [rand_box() for _ in range(30)] + boxes1[:5]
+
+    iou = batch_iou(boxes1, boxes2)
+    in_ratio = batch_overlap_area_in_bbox1_area_ratio(boxes1, boxes2)
+    minbox_ratio = batch_overlap_area_2_minbox_area_ratio(boxes1, boxes2)
+    overlap_mask, bbox1_is_min = batch_minbox_if_overlap_by_ratio(boxes1, boxes2, 0.65)
+    is_in = batch_is_in(boxes1, boxes2)
+    for i, box1 in enumerate(boxes1):
+        for j, box2 in enumerate(boxes2):
+            if box_area(box1) + box_area(box2) - get_overlap_area(box1, box2) != 0:
+                assert iou[i, j] == calculate_iou(box1, box2)
+            assert in_ratio[i, j] == calculate_overlap_area_in_bbox1_area_ratio(box1, box2)
+            assert minbox_ratio[i, j] == calculate_overlap_area_2_minbox_area_ratio(box1, box2)
+            minbox = get_minbox_if_overlap_by_ratio(box1, box2, 0.65)
+            if overlap_mask[i, j]:
+                assert minbox == (box1 if bbox1_is_min[i, j] else box2)
+            else:
+                assert minbox is None
+            assert is_in[i, j] == _is_in(box1, box2)
+
+    paired_boxes2 = boxes2[:len(boxes1)]
+    paired_boxes1 = boxes1[:len(paired_boxes2)]
+    np.testing.assert_array_equal(paired_iou(paired_boxes1, paired_boxes2), np.diag(iou))
+    np.testing.assert_array_equal(paired_overlap_area_in_bbox1_area_ratio(paired_boxes1, paired_boxes2),
+                                  np.diag(in_ratio))
+    paired_mask, paired_bbox1_is_min = paired_minbox_if_overlap_by_ratio(paired_boxes1, paired_boxes2, 0.65)
+    np.testing.assert_array_equal(paired_mask, np.diag(overlap_mask))
+    np.testing.assert_array_equal(paired_bbox1_is_min, np.diag(bbox1_is_min))
+
+
+# 带缓存的逐行语言判断与detect_lang结果一致，重复的行只判断一次
+def test_detect_line_lang_cached() -> None:
+    lines = ['This is a test.', '这个是中文测试。', '', 'This is a test.']
+    misses_before = detect_line_lang.cache_info().misses
+    assert [detect_line_lang(line) for line in lines] == [detect_lang(line) for line in lines]
+    assert detect_line_lang.cache_info().misses - misses_before <= 3
+
+
 @pytest.mark.skip(reason='skip')
 # 根据bucket_name获取s3配置ak,sk,endpoint
 def test_get_s3_config() -> None: